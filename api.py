@@ -5,22 +5,51 @@ Author: Jan Kühnemund
 Description: API for controlling the microcontroller via UART and WebSocket.
 """
 
-from utils import setup_logging
+from utils import load_config, setup_logging
+load_config()
 setup_logging()
 
 from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+import json
 import logging
-from uart_comm import UARTCommunication
+import os
 import asyncio
+import time
+from contextlib import asynccontextmanager
+from telemetry_history import DECIMATION_METHODS
+from ws_protocol import SUBPROTOCOL
+from devices import DeviceRegistry
+from metrics import REGISTRY, PROFILER, GAMEPAD_FRAMES, merge, render
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the devices without waiting for their UARTs, which attach in the
+    background (see hotplug.py), so requests are served right away.
+    """
+    await registry.start()
+    start_joystick()
+    if production:
+        background_tasks.add(asyncio.get_running_loop().create_task(follow_input_mapping()))
+    try:
+        yield
+    finally:
+        if joystick_loop:
+            joystick_loop.stop()
+        for task in background_tasks:
+            task.cancel()
+        PROFILER.stop()
+        registry.stop()
 
 app = FastAPI(
     title="Tracking Groundstation",
     description="API to control the microcontroller via UART",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Allow CORS for all origins (adjust as needed)
@@ -36,108 +65,261 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Initialize UARTCommunication and USBController
-uart_comm = UARTCommunication()
-if not uart_comm.is_connected():
-    logging.error("UARTCommunication is not connected. UART port might be unavailable.")
+# Rotators from DEVICES_FILE, all on this event loop; production workers (main.py --production)
+# get proxies instead, as another process owns the UARTs (see uart_owner.py)
+registry = DeviceRegistry.from_config(owner_socket=os.getenv('UART_OWNER_SOCKET'))
+production = bool(os.getenv('UART_OWNER_SOCKET'))
 
-# Store connected WebSocket clients
-connected_clients = set()
+# The first device also answers the original single-device routes
+default_device = registry.default
+uart_comm = default_device.uart
+setpoint_streamer = default_device.streamer
+position_hub = default_device.hub
+input_mapper = default_device.input_mapper
+REGISTRY.gauge('ws_clients', "Connected WebSocket clients.", lambda: sum(len(device.hub.subscribers) for device in registry))
+REGISTRY.gauge('uart_connected', "UART ports currently open.",
+               lambda: sum(device.uart.is_connected() for device in registry))
 
-# In-memory storage for mapping
-input_mapping = {}
+# Status reports younger than STATUS_CACHE_TTL seconds are served without a round trip
+status_ttl = float(os.getenv('STATUS_CACHE_TTL', '1'))
+
+background_tasks = set()
+
+# Locally attached joystick sampled at a fixed rate (JOYSTICK_BACKEND=pygame|dummy), started on startup
+joystick_loop = None
+
+def get_device(name: str):
+    """
+    Looks up a device by name for the per-device routes.
+    """
+    try:
+        return registry[name]
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown device: {name}")
 
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
     """
     Serves the main page.
     """
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {"request": request,
+                                                     "devices": [device.name for device in registry]})
+
+@app.get("/devices")
+async def get_devices():
+    """
+    Lists the devices with their link state and latest position.
+    """
+    devices = []
+    for device in registry:
+        connected = device.uart.is_connected()
+        devices.append({"name": device.name, "connected": connected,
+                        "position": device.uart.get_current_position() if connected else None})
+    return devices
 
 @app.post("/save-mapping")
 async def save_mapping(mapping: dict):
     """
-    Saves the user-defined input mapping.
+    Compiles, applies and persists the user-defined input mapping for all devices.
     """
-    global input_mapping
-    input_mapping = mapping
-    # Optionally, save to a file or database
-    logging.info(f"Input mapping saved: {input_mapping}")
+    try:
+        for device in registry:
+            device.input_mapper.compile(mapping)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        input_mapper.save()
+    except OSError as e:
+        logging.error("Failed to persist input mapping: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to persist input mapping: {e}")
+    for device in registry:
+        device.input_mapper.mtime = input_mapper.mtime  # Same file, already applied
+    logging.info("Input mapping saved: %s", mapping)
     return {"status": "success"}
 
+@app.get("/mapping")
+async def get_mapping():
+    """
+    Returns the active input mapping.
+    """
+    return input_mapper.mapping
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    await serve_websocket(websocket, default_device)
+
+@app.websocket("/devices/{name}/ws")
+async def device_websocket_endpoint(websocket: WebSocket, name: str):
+    if name not in registry.devices:
+        await websocket.close(code=1008)
+        return
+    await serve_websocket(websocket, registry[name])
+
+async def serve_websocket(websocket: WebSocket, device):
+    """
+    Streams the device's positions to the client and applies its gamepad frames to the device.
+    """
+    # Clients offering the binary subprotocol exchange struct frames, all others JSON
+    binary = SUBPROTOCOL in websocket.scope.get('subprotocols', ())
+    await websocket.accept(subprotocol=SUBPROTOCOL if binary else None)
+    subscriber = device.hub.subscribe(websocket, binary)
+    session = device.input_mapper.session()  # Edge and change detection for this client's gamepad
     try:
         while True:
-            data = await websocket.receive_json()
-            # Process data as needed
-            # For example, send commands via UART based on input
-            buttons = data.get('buttons', {})
-            axes = data.get('axes', {})
-            # Implement action handling based on buttons and axes
-            # Example:
-            if buttons.get('arm'):
-                uart_comm.send_command(0x01, b'')  # Command to arm
-            if axes.get('move_x'):
-                # Process movement on X-axis
-                pass
-            # Additional processing...
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+            if message.get('bytes') is not None:
+                GAMEPAD_FRAMES.inc()
+                session.apply_frame(message['bytes'])
+            elif message.get('text') is not None:
+                GAMEPAD_FRAMES.inc()
+                try:
+                    session.apply_json(json.loads(message['text']))
+                except ValueError as e:  # Includes JSONDecodeError
+                    logging.warning("Ignoring malformed gamepad frame from a client of %s: %s", device.name, e)
     except WebSocketDisconnect:
-        logging.info("WebSocket disconnected")
+        logging.info("WebSocket of device %s disconnected", device.name)
+    finally:
+        device.hub.unsubscribe(subscriber)
+
+def start_joystick():
+    """
+    Starts sampling a local joystick if JOYSTICK_BACKEND is set.
 
-@app.on_event("startup")
-async def startup_event():
-    # Start the background task
-    asyncio.create_task(broadcast_position_updates())
+    Changes are handed to the event loop and go through the same compiled
+    mapping as WebSocket gamepad frames. The joystick steers the default
+    device.
+    """
+    global joystick_loop
+    backend = os.getenv('JOYSTICK_BACKEND', 'none')
+    if backend == 'none':
+        return
+    from controller import BACKENDS, JoystickLoop  # pygame is only imported when a joystick is used
+    if backend not in BACKENDS:
+        logging.error("Unknown JOYSTICK_BACKEND %s", backend)
+        return
+    loop = asyncio.get_running_loop()
+    session = input_mapper.session()
+    joystick_loop = JoystickLoop(
+        BACKENDS[backend](int(os.getenv('JOYSTICK_DEVICE', '0'))),
+        lambda buttons, axes: loop.call_soon_threadsafe(session.apply, buttons, axes.tolist()),
+        rate_hz=float(os.getenv('JOYSTICK_RATE_HZ', '100')),
+    ).start()
+    logging.info("Sampling %s joystick at %s Hz", backend, os.getenv('JOYSTICK_RATE_HZ', '100'))
 
-async def broadcast_position_updates():
+async def follow_input_mapping(interval: float = 1.0):
     """
-    Background task to broadcast position updates to all connected clients.
+    Picks up mappings saved by other workers.
     """
-    last_position = None
     while True:
-        await asyncio.sleep(0.1)  # Adjust the interval as needed
-        current_position = uart_comm.get_current_position()
-        if current_position != last_position:
-            last_position = current_position
-            # Broadcast to all connected clients
-            message = {
-                'azimuth': current_position['azimuth'],
-                'elevation': current_position['elevation']
-            }
-            if connected_clients:
-                await asyncio.gather(
-                    *[client.send_json(message) for client in connected_clients]
-                )
-                logging.debug(f"Broadcasted position: {message}")
+        await asyncio.sleep(interval)
+        for device in registry:
+            device.input_mapper.refresh()
 
 @app.get("/status")
-def get_status():
+async def get_status(fresh: bool = False):
     """
-    Retrieves the status from the microcontroller.
+    Retrieves the status from the microcontroller of the default device.
     """
-    if not uart_comm.is_connected():
-        logging.error("UART port is not connected. Cannot retrieve status.")
+    return await read_status(default_device, fresh)
+
+@app.get("/devices/{name}/status")
+async def get_device_status(name: str, fresh: bool = False):
+    """
+    Retrieves the status from the microcontroller of a device.
+    """
+    return await read_status(get_device(name), fresh)
+
+async def read_status(device, fresh: bool):
+    """
+    Serves the latest status report while it is younger than the cache TTL.
+    Otherwise, or with `fresh=1`, requests a new one; concurrent requests
+    share a single 0x07 round trip and report its latency.
+    """
+    uart = device.uart
+    if not uart.is_connected():
+        logging.error("UART port of device %s is not connected. Cannot retrieve status.", device.name)
         raise HTTPException(status_code=500, detail="UART port is not connected.")
+    age = uart.status_age()
+    if not fresh and age is not None and age <= status_ttl:
+        return {"status": uart.get_telemetry()['status'], "age": age, "cached": True}
     try:
-        uart_comm.send_command(0x07, b'')
-        return {"message": "Status requested"}
+        status, latency = await uart.request_status(uart.timeout)
+        return {"status": status, "age": uart.status_age(), "cached": False, "latency_ms": latency * 1000}
+    except (asyncio.TimeoutError, TimeoutError):
+        logging.error("No status report from device %s within %s s", device.name, uart.timeout)
+        raise HTTPException(status_code=504, detail="No status report from the microcontroller.")
     except Exception as e:
-        logging.exception(f"Error sending status request: {e}")
+        logging.exception("Error sending status request: %s", e)
         raise HTTPException(status_code=500, detail=f"Error sending status request: {str(e)}")
 
-def handle_action(action):
-    # Implement the action, e.g., send command via UART
-    if action == 'arm':
-        uart_comm.send_command(0x01, b'')  # Command to arm
-    elif action == 'disarm':
-        uart_comm.send_command(0x02, b'')  # Command to disarm
-    # Add more actions as needed
-
-def handle_axis_action(action, value):
-    # Implement axis action
-    if action == 'move_x':
-        # Convert axis value to movement command
-        pass
-    # Add more axis actions as needed
\ No newline at end of file
+@app.get("/telemetry/{channel}/history")
+async def get_telemetry_history(channel: str, start: float = None, end: float = None, points: int = 500,
+                                method: str = 'minmax'):
+    """
+    Returns a channel's history for the default device.
+    """
+    return await query_history(default_device, channel, start, end, points, method)
+
+@app.get("/devices/{name}/telemetry/{channel}/history")
+async def get_device_telemetry_history(name: str, channel: str, start: float = None, end: float = None,
+                                       points: int = 500, method: str = 'minmax'):
+    """
+    Returns a channel's history for a device.
+    """
+    return await query_history(get_device(name), channel, start, end, points, method)
+
+async def query_history(device, channel: str, start: float, end: float, points: int, method: str):
+    """
+    Returns a channel's samples between `start` and `end` (epoch seconds, default
+    the last 10 minutes), decimated to about `points` rows.
+
+    The NumPy work runs in a worker thread (or in the UART owner) instead
+    of blocking the event loop.
+    """
+    if method not in DECIMATION_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(DECIMATION_METHODS)}")
+    if not 2 <= points <= 10000:
+        raise HTTPException(status_code=400, detail="points must be between 2 and 10000")
+    end = time.time() if end is None else end
+    start = end - 600 if start is None else start
+    try:
+        result = await device.uart.query_history(channel, start, end, points, method)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown telemetry channel: {channel}")
+    return dict(result, channel=channel, method=method)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Counters and latency histograms in the Prometheus text format.
+
+    Workers in production mode add the UART owner's metrics to their own.
+    """
+    families = REGISTRY.collect()
+    if production:
+        try:
+            families = merge(families, await uart_comm.collect_metrics())
+        except Exception as e:
+            logging.error("Failed to collect metrics from the UART owner: %s", e)
+    return PlainTextResponse(render(families), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler")
+async def toggle_profiler(enabled: bool, interval_ms: float = 5.0):
+    """
+    Starts (clearing earlier samples) or stops the sampling profiler of this process.
+    """
+    if enabled:
+        PROFILER.clear()
+        PROFILER.start(interval_ms / 1000)
+    else:
+        PROFILER.stop()
+    return {"running": PROFILER.running, "samples": PROFILER.samples}
+
+@app.get("/debug/profiler", response_class=PlainTextResponse)
+async def get_profile():
+    """
+    Stack samples in the folded format of flamegraph.pl.
+    """
+    return PROFILER.folded()
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+File: async_uart.py
+Author: Jan Kühnemund
+Description: asyncio-native UART communication for use inside the FastAPI event loop.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import serial
+from uart_comm import (UARTCommunication, GET_CAPABILITIES_COMMAND_ID, CAPABILITIES_REPORT_ID,
+                       SET_PROTOCOL_COMMAND_ID, STATUS_COMMAND_ID, STATUS_REPORT_ID)
+from checksum import SCHEMES, CAP_CRC16
+from frame_trace import RX, TX
+from retransmission import SlidingWindow
+from metrics import FRAMES_SENT, RETRANSMISSIONS, ACK_TIMEOUTS, UNKNOWN_ACKS, COMMAND_RTT
+from batching import BATCH_COMMAND_ID, CAP_BATCH, CommandBatcher, encode_batch, batch_results
+from clock_sync import CAP_TIMESTAMPS
+
+UNBATCHED_COMMAND_IDS = {GET_CAPABILITIES_COMMAND_ID, SET_PROTOCOL_COMMAND_ID}  # Change the link; always sent alone
+
+
+def _resolve_all(waiters: list):
+    pending, waiters[:] = list(waiters), []
+    for waiter in pending:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+class UARTProtocol(asyncio.Protocol):
+    """
+    Feeds bytes read from the serial port into an AsyncUARTCommunication.
+    """
+    def __init__(self, uart):
+        self.uart = uart
+
+    def data_received(self, data):
+        self.uart.data_received(data)
+
+    def connection_lost(self, exc):
+        self.uart.connection_lost(exc)
+
+
+class AsyncUARTCommunication(UARTCommunication):
+    """
+    Handles UART communication on an asyncio event loop.
+
+    The serial file descriptor is registered with the loop, so framing,
+    ACK matching and message dispatch all run on the loop thread without
+    helper threads, polling or lock contention. Framing and message
+    decoding are shared with UARTCommunication.
+    """
+    def __init__(self, port: str = None, baudrate: int = None, timeout: float = None, queue_size: int = 256):
+        self.transport = None
+        self.window_waiters = []  # Futures of send_command() calls waiting for room in the window
+        self.subscribers = set()  # asyncio.Queue per messages() consumer
+        self.queue_size = queue_size
+        self.background_tasks = set()
+        self.capabilities_waiter = None  # Future resolved by the next capability report
+        self.status_request = None  # Task of the status round trip in flight, shared by request_status() callers
+        self.status_waiter = None  # Future resolved by the next status report
+        self.status_time = None  # time.monotonic() of the latest status report
+        # Seconds send_command() waits to collect concurrent commands into one batch frame, 0 to disable
+        self.batch_window = float(os.getenv('UART_BATCH_WINDOW', '0'))
+        self.batcher = None  # CommandBatcher, once the firmware confirmed CAP_BATCH
+        # Seconds commands in flight wait for a lost port to be reopened (see hotplug.UARTSupervisor)
+        # before failing; 0 fails them as soon as the port is lost
+        self.reattach_timeout = 0.0
+        self.attach_waiters = []  # Futures resolved when the port is opened
+        self.lost_waiters = []  # Futures resolved when the port is lost or closed
+        super().__init__(port, baudrate, timeout)
+        self.window = SlidingWindow(self.window_size)  # message_id -> asyncio.Future resolved by handle_ack
+
+    def initialize_uart(self):
+        """
+        Deferred to connect(), which needs a running event loop.
+        """
+
+    async def connect(self):
+        """
+        Opens the UART port and attaches it to the running event loop.
+
+        Also reopens a lost port; the link starts over with the firmware's
+        power-on framing (see reset_link).
+        """
+        logging.info("Initializing UART port...")
+        if not self.port:
+            logging.error("UART_PORT not specified in environment variables.")
+            return
+        loop = asyncio.get_running_loop()
+        self.reset_link()
+        try:
+            self.ser = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=0)
+            self.transport, _ = await loop.connect_read_pipe(lambda: UARTProtocol(self), self.ser)
+            self.connected = True
+            logging.info("UART port %s opened successfully.", self.port)
+            _resolve_all(self.attach_waiters)  # Commands in flight are sent again right away
+            if self.preferred_checksum != self.checksum.name:
+                await self.negotiate_checksum(self.preferred_checksum)
+            if self.request_timestamps:
+                await self.enable_timestamps()
+            if self.batch_window > 0:
+                await self.enable_batching(self.batch_window)
+        except serial.SerialException as e:
+            self.connected = False
+            logging.error("Failed to open UART port %s: %s", self.port, e)
+        except Exception as e:
+            self.connected = False
+            logging.exception("Unexpected error when initializing UART: %s", e)
+
+    def close(self):
+        """
+        Detaches from the event loop and closes the UART port.
+        """
+        self.connected = False
+        if self.transport:
+            self.transport.close()  # Also closes self.ser
+            self.transport = None
+        self._fail_pending(serial.SerialException("UART port closed."))
+        _resolve_all(self.lost_waiters)
+        self.batcher = None
+        if self._wakeup_w is not None:
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            self._wakeup_r = self._wakeup_w = None
+        if self.trace is not None:
+            self.trace.close()
+        if self.capture is not None:
+            self.capture.close()
+        logging.info("UART port %s closed.", self.port)
+
+    def data_received(self, data: bytes):
+        """
+        Handles bytes delivered by the event loop.
+        """
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Read %d bytes from UART", len(data))
+        if self.capture is not None:
+            self.capture.record(RX, data)
+        self.process_uart_data(data)
+
+    def connection_lost(self, exc):
+        """
+        Marks the port as disconnected.
+
+        Commands awaiting ACKs fail, unless `reattach_timeout` lets them wait
+        for the port to be reopened.
+        """
+        if self.connected:
+            logging.error("UART port %s lost: %s", self.port, exc)
+        self.connected = False
+        self.transport = None
+        if self.reattach_timeout > 0:
+            self._wake_window_waiters()  # New commands fail at once; those in flight wait in _transmit
+        else:
+            self._fail_pending(serial.SerialException("UART port is not connected."))
+        _resolve_all(self.lost_waiters)
+
+    def reset_link(self):
+        """
+        Returns to the framing the firmware starts with: XOR checksums and no
+        capabilities enabled. Reopening a lost port usually means the MCU
+        restarted too, as USB-serial adapters commonly reset it.
+        """
+        self.parser.clear()
+        if self.checksum.capability:
+            self.use_checksum(SCHEMES['xor'])
+        self.capabilities = None
+        self.protocol_flags = 0
+        self.protocol_switches.clear()
+        self.mcu_timestamps = False
+        self.clock.reset()
+        self.batcher = None
+
+    async def wait_attached(self, timeout: float):
+        """
+        Waits up to `timeout` seconds for the port to be open. Raises SerialException if it is not.
+        """
+        if self.is_connected():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.attach_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise serial.SerialException("UART port is not connected.") from None
+        finally:
+            if waiter in self.attach_waiters:
+                self.attach_waiters.remove(waiter)
+
+    async def wait_lost(self):
+        """
+        Returns once the port is lost or closed.
+        """
+        if not self.is_connected():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.lost_waiters.append(waiter)
+        await waiter
+
+    def _fail_pending(self, exc):
+        if self.batcher is not None:
+            self.batcher.cancel(exc)
+        for future in self.window.outstanding.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.window.outstanding.clear()
+        self._wake_window_waiters()
+
+    def _wake_window_waiters(self):
+        waiters, self.window_waiters = self.window_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _write_frame(self, frame: bytes):
+        """
+        Writes a complete frame. Only the loop thread writes, so no lock is taken.
+        """
+        if self.capture is not None:
+            self.capture.record(TX, frame)
+        if self.trace is not None:
+            self.trace.record(TX, frame)
+        self.ser.write(frame)
+        FRAMES_SENT.inc()
+
+    async def send_command(self, command_id: int, payload: bytes = b'') -> int:
+        """
+        Sends a command and waits for its ACK, retransmitting with exponential backoff.
+
+        Waits for room in the sliding window first, so MESSAGE_IDs never
+        collide with commands still in flight. With batching enabled, commands
+        sent within the batch window share one frame, and a sub-command the
+        firmware refuses raises batching.CommandRejected. Returns the number
+        of transmissions it took.
+        """
+        if self.batcher is not None and command_id not in UNBATCHED_COMMAND_IDS:
+            if not self.is_connected():
+                raise serial.SerialException("UART port is not connected.")
+            return await self.batcher.submit(command_id, payload)
+        attempts, _ = await self._transmit(command_id, payload)
+        return attempts
+
+    async def send_batch(self, commands) -> list:
+        """
+        Sends (command_id, payload) pairs as one batch frame and returns the firmware's result code for each.
+
+        The batch is delivered and retransmitted as a whole under a single
+        MESSAGE_ID and acknowledged by a single batch result (see batching.py).
+        """
+        payload = encode_batch(commands)
+        _, reply = await self._transmit(BATCH_COMMAND_ID, payload)
+        return batch_results(reply, len(commands))
+
+    async def _transmit(self, command_id: int, payload: bytes) -> tuple:
+        """
+        Sends one frame until it is acknowledged. Returns the number of
+        transmissions and the batch result payload (None for plain ACKs).
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.is_connected():
+                logging.error("Attempted to send command, but UART port is not connected.")
+                raise serial.SerialException("UART port is not connected.")
+            if not self.window.full():
+                break
+            waiter = loop.create_future()
+            self.window_waiters.append(waiter)
+            await waiter
+
+        future = loop.create_future()
+        message_id = self.window.allocate(future)
+        command = self.construct_command(message_id, command_id, payload)
+        if command_id == SET_PROTOCOL_COMMAND_ID:
+            self.protocol_switches[message_id] = payload[0]  # Applied by handle_ack, see apply_protocol()
+        retransmission = self.retransmission
+        try:
+            for attempt in range(1, retransmission.max_attempts + 2):
+                if attempt > 1:
+                    RETRANSMISSIONS.inc()
+                    self.sent_times.pop(message_id, None)  # Which transmission an ACK answers is ambiguous now
+                    if not self.is_connected():
+                        await self.wait_attached(self.reattach_timeout)
+                    # Rebuilt, as a reopened port starts over with the default framing
+                    command = self.construct_command(message_id, command_id, payload)
+                self._write_frame(command)
+                sent = loop.time()
+                if attempt == 1:
+                    self.sent_times[message_id] = time.perf_counter()
+                logging.debug("Sent command with MESSAGE_ID %d, attempt %d", message_id, attempt)
+                timeout = min(retransmission.base_timeout * (2 ** (attempt - 1)), retransmission.max_backoff)
+                try:
+                    reply = await asyncio.wait_for(asyncio.shield(future), timeout)
+                    if attempt == 1:
+                        COMMAND_RTT.observe(loop.time() - sent)  # Retransmitted ones are ambiguous
+                    return attempt, reply
+                except asyncio.TimeoutError:
+                    continue
+            ACK_TIMEOUTS.inc()
+            logging.error("Failed to receive ACK for MESSAGE_ID %d after multiple attempts.", message_id)
+            raise TimeoutError(f"No ACK for MESSAGE_ID {message_id} after {attempt} attempts")
+        finally:
+            self.sent_times.pop(message_id, None)
+            self.protocol_switches.pop(message_id, None)
+            if self.window.outstanding.get(message_id) is future:
+                self.window.release(message_id)
+            self._wake_window_waiters()
+
+    def post_command(self, command_id: int, payload: bytes = b'') -> asyncio.Task:
+        """
+        Sends a command in the background without waiting for its ACK.
+
+        Failures are logged instead of being raised to the caller.
+        """
+        task = asyncio.get_running_loop().create_task(self.send_command(command_id, payload))
+        self.background_tasks.add(task)
+        task.add_done_callback(self._command_done)
+        return task
+
+    def _command_done(self, task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Background command failed: %s", task.exception())
+
+    async def query_capabilities(self, timeout: float = 1.0):
+        """
+        Asks the firmware for its capability flags. Returns them, or None if it does not report any.
+        """
+        self.capabilities_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self.send_command(GET_CAPABILITIES_COMMAND_ID)
+            return await asyncio.wait_for(self.capabilities_waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.capabilities_waiter = None
+
+    async def negotiate_checksum(self, name: str = 'crc16', timeout: float = 1.0) -> bool:
+        """
+        Switches to the named checksum scheme if the firmware supports it.
+
+        See UARTCommunication.negotiate_checksum.
+        """
+        scheme = SCHEMES[name]
+        if not scheme.capability:
+            self.use_checksum(scheme)
+            return True
+        try:
+            capabilities = await self.query_capabilities(timeout)
+            if capabilities is None:
+                logging.warning("Firmware did not report its capabilities. Keeping current checksum.")
+                return False
+            if not capabilities & scheme.capability:
+                logging.info("Firmware does not support %s checksums.", scheme.name)
+                return False
+            flags = self.protocol_flags & ~CAP_CRC16 | scheme.capability  # Keeps other enabled capabilities
+            await self.send_command(SET_PROTOCOL_COMMAND_ID, bytes([flags]))
+        except Exception as e:
+            logging.error("Checksum negotiation failed: %s", e)
+            return False
+        return self.checksum is scheme
+
+    async def enable_timestamps(self, timeout: float = 1.0) -> bool:
+        """
+        Asks the firmware to timestamp its frames if it supports it.
+
+        See UARTCommunication.enable_timestamps.
+        """
+        capabilities = self.capabilities
+        try:
+            if capabilities is None:
+                capabilities = await self.query_capabilities(timeout)
+            if not (capabilities or 0) & CAP_TIMESTAMPS:
+                logging.info("Firmware does not timestamp its frames. Dating reports by their arrival.")
+                return False
+            await self.send_command(SET_PROTOCOL_COMMAND_ID, bytes([self.protocol_flags | CAP_TIMESTAMPS]))
+        except Exception as e:
+            logging.error("Enabling MCU timestamps failed: %s", e)
+            return False
+        return self.mcu_timestamps
+
+    async def enable_batching(self, window: float, timeout: float = 1.0) -> bool:
+        """
+        Lets send_command() collect commands for `window` seconds into batch frames if the firmware supports them.
+        """
+        capabilities = self.capabilities
+        if capabilities is None:
+            try:
+                capabilities = await self.query_capabilities(timeout)
+            except Exception as e:
+                logging.error("Capability query failed: %s", e)
+                return False
+        if not (capabilities or 0) & CAP_BATCH:
+            logging.warning("Firmware does not support batch frames. Sending commands one by one.")
+            return False
+        self.batcher = CommandBatcher(self._transmit, window)
+        logging.info("Batching commands sent within %.1f ms.", window * 1000)
+        return True
+
+    async def request_status(self, timeout: float = 1.0):
+        """
+        Sends a status request and waits for the firmware's status report.
+
+        Callers arriving while a request is in flight share it instead of
+        sending another one. Returns (status, latency) with the decoded
+        report and the round trip in seconds.
+        """
+        if self.status_request is None:
+            self.status_request = asyncio.get_running_loop().create_task(self._request_status(timeout))
+            self.status_request.add_done_callback(self._status_request_done)
+        return await asyncio.shield(self.status_request)
+
+    async def _request_status(self, timeout: float):
+        self.status_waiter = asyncio.get_running_loop().create_future()
+        start = time.monotonic()
+        try:
+            await self.send_command(STATUS_COMMAND_ID)
+            status = await asyncio.wait_for(self.status_waiter, timeout)
+        finally:
+            self.status_waiter = None
+        return status, time.monotonic() - start
+
+    def _status_request_done(self, task):
+        self.status_request = None
+
+    def status_age(self):
+        """
+        Seconds since the latest status report, None if there was none yet.
+        """
+        return None if self.status_time is None else time.monotonic() - self.status_time
+
+    async def query_history(self, channel: str, start: float, end: float, points: int, method: str = 'minmax') -> dict:
+        """
+        Returns a channel's decimated history, computed in a worker thread.
+
+        Raises KeyError for unknown channels.
+        """
+        history = self.history[channel]
+        return await asyncio.to_thread(history.query, start, end, points, method)
+
+    def handle_ack(self, message_id, payload=b''):
+        """
+        Handles an ACK message by resolving the matching send_command() calls.
+
+        See UARTCommunication.handle_ack for the single and cumulative forms.
+        """
+        if payload:
+            acked = self.window.acknowledge_cumulative(message_id, int.from_bytes(payload, 'big'))
+        else:
+            acked = self.window.acknowledge((message_id - 1) % 256)
+            if not acked:
+                UNKNOWN_ACKS.inc()
+                logging.warning("Received ACK for unknown MESSAGE_ID %d", (message_id - 1) % 256)
+        for acked_id, future in acked:
+            self.acknowledged(acked_id, single=not payload)
+            if not future.done():
+                future.set_result(None)
+            logging.debug("ACK received for MESSAGE_ID %d", acked_id)
+        if acked:
+            self._wake_window_waiters()
+
+    def handle_batch_result(self, message_id, payload):
+        """
+        Resolves the send_batch() call of MESSAGE_ID - 1 with the result codes.
+        """
+        acked = self.window.acknowledge((message_id - 1) % 256)
+        if not acked:
+            UNKNOWN_ACKS.inc()
+            logging.warning("Received batch result for unknown MESSAGE_ID %d", (message_id - 1) % 256)
+            return
+        for acked_id, future in acked:
+            self.acknowledged(acked_id, single=True)
+            if not future.done():
+                future.set_result(bytes(payload))
+        self._wake_window_waiters()
+
+    def process_data_message(self, command_id, payload):
+        """
+        Processes a data message and hands it to every messages() consumer.
+        """
+        decoded = super().process_data_message(command_id, payload)
+        if command_id == CAPABILITIES_REPORT_ID and self.capabilities_waiter and not self.capabilities_waiter.done():
+            self.capabilities_waiter.set_result(self.capabilities)
+        elif command_id == STATUS_REPORT_ID and decoded:
+            self.status_time = time.monotonic()
+            if self.status_waiter and not self.status_waiter.done():
+                self.status_waiter.set_result(self.telemetry['status'].copy())
+        if not (self.subscribers and decoded):
+            return decoded
+        codec = self.codecs.lookup(command_id)
+        message = (command_id, codec.as_dict(codec.decode(payload)))
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest message for slow consumers
+            queue.put_nowait(message)
+        return decoded
+
+    async def messages(self):
+        """
+        Asynchronously iterates over decoded data messages as (command_id, values), values being a dict by
+        field name. Messages without a registered codec are not yielded.
+        """
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers.discard(queue)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+File: batching.py
+Author: Jan Kühnemund
+Description: Batch frames carrying several sub-commands under one MESSAGE_ID, and the auto-batching window.
+
+A batch is a frame with COMMAND_ID 0x15 whose payload is a sequence of
+sub-commands:
+
+    COMMAND_ID (u8), LENGTH (u8), PAYLOAD, COMMAND_ID, LENGTH, PAYLOAD, ...
+
+The firmware applies the sub-commands in order and, instead of an ACK,
+answers with a 0x16 batch result: MESSAGE_ID + 1 as in an ACK, and one
+result byte per sub-command (RESULT_OK or a firmware error code). A batch
+costs one frame, one checksum, one window slot and one round trip however
+many sub-commands it carries. Firmware announces support with CAP_BATCH.
+"""
+
+import asyncio
+import logging
+import struct
+
+BATCH_COMMAND_ID = 0x15
+BATCH_RESULT_ID = 0x16  # Firmware reply to a batch, also acknowledges it
+CAP_BATCH = 0x02  # Capability flag of firmware that understands batches
+SUB_COMMAND = struct.Struct('>BB')  # COMMAND_ID, payload length
+MAX_BATCH_PAYLOAD = 255  # The frame's LENGTH field is one byte
+RESULT_OK = 0
+
+
+class CommandRejected(Exception):
+    """
+    The firmware acknowledged a batch but refused one of its sub-commands.
+    """
+    def __init__(self, command_id: int, code: int):
+        super().__init__(f"Command {command_id:#04x} rejected with code {code}")
+        self.command_id = command_id
+        self.code = code
+
+
+def encode_batch(commands) -> bytes:
+    """
+    Packs (command_id, payload) pairs into a batch payload. Raises ValueError if they do not fit into one frame.
+    """
+    if not commands:
+        raise ValueError("A batch needs at least one command")
+    parts = []
+    for command_id, payload in commands:
+        if command_id == BATCH_COMMAND_ID:
+            raise ValueError("Batches cannot be nested")
+        parts.append(SUB_COMMAND.pack(command_id, len(payload)))
+        parts.append(payload)
+    encoded = b''.join(parts)
+    if len(encoded) > MAX_BATCH_PAYLOAD:
+        raise ValueError(f"Batch of {len(encoded)} bytes exceeds {MAX_BATCH_PAYLOAD} bytes")
+    return encoded
+
+
+def decode_batch(payload) -> list:
+    """
+    Splits a batch payload into (command_id, payload) pairs. Raises ValueError if it is truncated.
+    """
+    commands = []
+    offset = 0
+    while offset < len(payload):
+        if offset + SUB_COMMAND.size > len(payload):
+            raise ValueError("Truncated sub-command header")
+        command_id, length = SUB_COMMAND.unpack_from(payload, offset)
+        offset += SUB_COMMAND.size
+        if offset + length > len(payload):
+            raise ValueError(f"Truncated payload of sub-command {command_id:#04x}")
+        commands.append((command_id, bytes(payload[offset:offset + length])))
+        offset += length
+    return commands
+
+
+def batch_results(reply, count: int) -> list:
+    """
+    Returns the result code of each of `count` sub-commands from a batch result payload.
+
+    A batch covered by a cumulative ACK instead (its result was lost) has no
+    payload; the firmware received it, so every sub-command counts as accepted.
+    """
+    if reply is None:
+        return [RESULT_OK] * count
+    if len(reply) != count:
+        raise RuntimeError(f"Batch result has {len(reply)} codes for {count} commands")
+    return list(reply)
+
+
+class CommandBatcher:
+    """
+    Collects concurrent send_command() calls for `window` seconds and sends them as one batch.
+
+    The first command opens the window; the window is flushed when it
+    expires or when the next command would not fit into the frame. A window
+    holding a single command sends it as a plain frame. `transmit(command_id,
+    payload)` is AsyncUARTCommunication._transmit and returns the number of
+    transmissions and the batch result payload, if any.
+    """
+    def __init__(self, transmit, window: float):
+        self.transmit = transmit
+        self.window = window
+        self.pending = []  # (command_id, payload, future) in submission order
+        self.size = 0  # Batch payload bytes of `pending`
+        self.timer = None
+        self.tasks = set()
+        self.batches = 0  # Batch frames sent
+        self.batched = 0  # Commands sent inside them
+
+    def submit(self, command_id: int, payload: bytes) -> asyncio.Future:
+        """
+        Queues a command. The future resolves with the number of transmissions of the frame that carried it.
+        """
+        loop = asyncio.get_running_loop()
+        length = SUB_COMMAND.size + len(payload)
+        if self.size + length > MAX_BATCH_PAYLOAD:
+            self.flush()
+        future = loop.create_future()
+        self.pending.append((command_id, payload, future))
+        self.size += length
+        if self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        """
+        Sends everything collected so far.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending, self.size = self.pending, [], 0
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._send(pending))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def cancel(self, exc: Exception):
+        """
+        Fails the commands still waiting for the window, e.g. when the port closes.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending, self.size = self.pending, [], 0
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def _send(self, pending: list):
+        try:
+            if len(pending) == 1:  # Also any command too large for a batch, which always goes alone
+                command_id, payload, _ = pending[0]
+                attempts, _ = await self.transmit(command_id, payload)
+                results = [RESULT_OK]
+            else:
+                commands = [(command_id, payload) for command_id, payload, _ in pending]
+                attempts, reply = await self.transmit(BATCH_COMMAND_ID, encode_batch(commands))
+                results = batch_results(reply, len(pending))
+                self.batches += 1
+                self.batched += len(pending)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (command_id, _, future), code in zip(pending, results):
+            if future.done():
+                continue
+            if code == RESULT_OK:
+                future.set_result(attempts)
+            else:
+                logging.warning("Command %#04x rejected by the firmware with code %d", command_id, code)
+                future.set_exception(CommandRejected(command_id, code))
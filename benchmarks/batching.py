@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/batching.py
+Author: Jan Kühnemund
+Description: Commands/s at 115200 baud with and without batch frames.
+
+Run from the repository root:
+    python -m benchmarks.batching [--commands N] [--duration S] [--producers N] [--samples N]
+
+First on the virtual-time LinkSimulator (2 ms firmware turnaround) by batch
+size and payload length, then over a pty with a FakeMCU emulating 115200
+baud: concurrent send_command() callers with and without the auto-batching
+window, and a position + velocity + status sequence sent one by one versus
+as one send_batch().
+"""
+
+import argparse
+import asyncio
+import time
+
+from async_uart import AsyncUARTCommunication
+from benchmarks.e2e import percentiles
+from commands import ANGLE_PAIR, SET_POSITION_COMMAND_ID
+from setpoint_stream import velocity_payload
+from mcu_simulator import FakeMCU, LinkSimulator
+from uart_comm import STATUS_COMMAND_ID, SET_VELOCITY_COMMAND_ID
+
+BAUDRATE = 115200
+BATCH_SIZES = (1, 2, 4, 8, 16)
+PAYLOAD_LENGTHS = (0, 8)
+WINDOWS = (0.0, 0.0005, 0.001, 0.002)
+
+
+def simulated(commands: int):
+    print(f"LinkSimulator, {BAUDRATE} baud")
+    print(f"{'batch':>5}  {'payload':>7}  {'commands/s':>10}")
+    for payload_length in PAYLOAD_LENGTHS:
+        for batch_size in BATCH_SIZES:
+            result = LinkSimulator(baudrate=BAUDRATE).run(commands, payload_length, batch_size)
+            print(f"{batch_size:>5}  {payload_length:>7}  {result['commands_per_second']:>10.0f}")
+
+
+async def concurrent(window: float, duration: float, producers: int) -> dict:
+    with FakeMCU(baudrate=BAUDRATE) as mcu:
+        uart = AsyncUARTCommunication(port=mcu.port)
+        await uart.connect()
+        if window:
+            await uart.enable_batching(window)
+        payload = ANGLE_PAIR.pack(120.0, 30.0)
+        latencies = []
+        deadline = time.perf_counter() + duration
+
+        async def produce():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await uart.send_command(SET_POSITION_COMMAND_ID, payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(produce() for _ in range(producers)))
+        finally:
+            uart.close()
+        elapsed = time.perf_counter() - start
+        return dict(percentiles(latencies), rate=len(latencies) / elapsed, batches=mcu.batches)
+
+
+async def sequence(samples: int) -> dict:
+    commands = [(SET_POSITION_COMMAND_ID, ANGLE_PAIR.pack(120.0, 30.0)),
+                (SET_VELOCITY_COMMAND_ID, velocity_payload(0.3, 0.1)),
+                (STATUS_COMMAND_ID, b'')]
+    with FakeMCU(baudrate=BAUDRATE) as mcu:
+        uart = AsyncUARTCommunication(port=mcu.port)
+        await uart.connect()
+        one_by_one, batched = [], []
+        try:
+            for _ in range(samples):
+                start = time.perf_counter()
+                for command_id, payload in commands:
+                    await uart.send_command(command_id, payload)
+                one_by_one.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                await uart.send_batch(commands)
+                batched.append((time.perf_counter() - start) * 1000)
+        finally:
+            uart.close()
+    return {"3 x send_command": percentiles(one_by_one), "send_batch": percentiles(batched)}
+
+
+async def measured(duration: float, producers: int, samples: int):
+    print(f"\nFakeMCU at {BAUDRATE} baud, {producers} concurrent callers of 8-byte set_position")
+    print(f"{'window':>8}  {'commands/s':>10}  {'p50 ms':>7}  {'p99 ms':>7}  {'batches':>7}")
+    for window in WINDOWS:
+        result = await concurrent(window, duration, producers)
+        label = f"{window * 1000:.1f} ms" if window else "off"
+        print(f"{label:>8}  {result['rate']:>10.0f}  {result['p50']:>7.2f}  {result['p99']:>7.2f}  "
+              f"{result['batches']:>7}")
+    print("\nposition + velocity + status, awaited in sequence")
+    for name, stats in (await sequence(samples)).items():
+        print(f"{name:<17} p50 {stats['p50']:6.2f} ms  p99 {stats['p99']:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--commands', type=int, default=2000, help="Commands per LinkSimulator run")
+    parser.add_argument('--duration', type=float, default=2.0, help="Seconds per FakeMCU run")
+    parser.add_argument('--producers', type=int, default=32)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+    simulated(args.commands)
+    asyncio.run(measured(args.duration, args.producers, args.samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/broadcast_fanout.py
+Author: Jan Kühnemund
+Description: Compares WebSocket fan-out latency of PositionHub with the old gather-based broadcast.
+
+Run from the repository root:
+    python -m benchmarks.broadcast_fanout [clients] [slow_clients]
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from broadcast import PositionHub
+
+UPDATE_RATE_HZ = 50
+DURATION = 2.0
+
+
+class FakeWebSocket:
+    """
+    Records the delay between an update being produced and its send completing.
+    """
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.latencies = []
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - json.loads(text)['produced_at'])
+
+    async def send_json(self, message):
+        await self.send_text(json.dumps(message))
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_clients(count: int, slow: int):
+    return [FakeWebSocket(0.1 if i < slow else 0.0) for i in range(count)]
+
+
+async def telemetry():
+    """
+    Yields position updates produced at a fixed rate, like 0x09 reports from the MCU.
+    """
+    start = time.perf_counter()
+    for i in range(int(DURATION * UPDATE_RATE_HZ)):
+        produced_at = start + i / UPDATE_RATE_HZ
+        await asyncio.sleep(max(0.0, produced_at - time.perf_counter()))
+        yield {'azimuth': i, 'elevation': i, 'produced_at': produced_at}
+
+
+async def run_hub(clients):
+    hub = PositionHub(send_timeout=5.0)
+    for client in clients:
+        hub.subscribe(client)
+    async for message in telemetry():
+        hub.publish(message)
+    for subscriber in list(hub.subscribers):
+        hub.unsubscribe(subscriber)
+
+
+async def run_gather(clients):
+    async for message in telemetry():
+        await asyncio.gather(*[client.send_json(message) for client in clients])
+
+
+def report(name: str, clients, slow: int):
+    fast = sorted(latency * 1000 for client in clients[slow:] for latency in client.latencies)
+    p99 = fast[min(len(fast) - 1, int(len(fast) * 0.99))]
+    print(f"{name:<7} fast-client updates={len(fast):<5} mean={statistics.mean(fast):8.3f} ms  "
+          f"p50={statistics.median(fast):8.3f} ms  p99={p99:8.3f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    slow = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    clients = make_clients(count, slow)
+    asyncio.run(run_gather(clients))
+    report("gather", clients, slow)
+    clients = make_clients(count, slow)
+    asyncio.run(run_hub(clients))
+    report("hub", clients, slow)
+
+
+if __name__ == "__main__":
+    main()
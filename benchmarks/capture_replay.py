@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/capture_replay.py
+Author: Jan Kühnemund
+Description: Cost of recording a chunk into the mmap capture and replay throughput.
+
+Recording is compared with an unbuffered os.write per chunk, which is
+what a plain log file costs on the hot path. Replay runs a synthetic
+capture of position reports through ReplayCommunication as fast as
+possible.
+
+Run from the repository root:
+    python -m benchmarks.capture_replay [megabytes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from capture import CaptureRecorder, CHUNK_HEADER, RX
+from mcu_simulator import FakeMCU
+from replay import ReplayCommunication, replay
+
+CHUNK_COUNT = 100000
+
+
+def record_mmap(path: str, chunk: bytes) -> float:
+    recorder = CaptureRecorder(path, size=CHUNK_COUNT * (len(chunk) + CHUNK_HEADER.size) + 4096)
+    start = time.perf_counter()
+    for _ in range(CHUNK_COUNT):
+        recorder.record(RX, chunk)
+    elapsed = time.perf_counter() - start
+    recorder.close()
+    return elapsed
+
+
+def record_os_write(path: str, chunk: bytes) -> float:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    start = time.perf_counter()
+    for _ in range(CHUNK_COUNT):
+        os.write(fd, CHUNK_HEADER.pack(time.monotonic_ns(), RX, len(chunk)) + chunk)
+    elapsed = time.perf_counter() - start
+    os.close(fd)
+    return elapsed
+
+
+def build_capture(path: str, megabytes: int):
+    frames = b''.join(FakeMCU.build_frame(i % 256, 0x09, (i % 65536).to_bytes(2, 'big') * 2) for i in range(4096))
+    chunks = [frames[offset:offset + 64] for offset in range(0, len(frames), 64)]  # Typical read sizes at 115200 baud
+    recorder = CaptureRecorder(path, size=(megabytes << 20) * (64 + CHUNK_HEADER.size) // 64 + (1 << 20))
+    total = 0
+    while total < megabytes << 20:
+        for chunk in chunks:
+            recorder.record(RX, chunk)
+        total += len(frames)
+    recorder.close()
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    chunk = bytes(64)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'capture.bin')
+        for name, record in (("mmap record", record_mmap), ("os.write", record_os_write)):
+            elapsed = record(path, chunk)
+            print(f"{name:<12} {elapsed / CHUNK_COUNT * 1e9:8.0f} ns/chunk")
+
+        build_capture(path, megabytes)
+        uart = ReplayCommunication()
+        try:
+            stats = replay(path, uart)
+        finally:
+            uart.close()
+        print(f"replay       {stats['megabytes_per_second']:8.2f} MB/s  {stats['frames_per_second']:10.0f} frames/s  "
+              f"({stats['bytes'] >> 20} MiB, {stats['frames']} frames)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/checksum_throughput.py
+Author: Jan Kühnemund
+Description: Compares the previous per-byte checksum with the checksum module.
+
+Run from the repository root:
+    python -m benchmarks.checksum_throughput
+"""
+
+import logging
+import os
+import timeit
+
+from checksum import xor_checksum, crc16
+
+PAYLOAD_SIZES = (0, 1, 4, 8, 16, 32, 64, 128, 255)
+HEADER_LENGTH = 3  # MESSAGE_ID, COMMAND_ID and LENGTH are part of the checksummed data
+
+
+def legacy_checksum(data: bytes) -> int:
+    """
+    The previous UARTCommunication.calculate_checksum.
+    """
+    checksum = 0
+    for b in data:
+        checksum ^= b
+    logging.debug(f"Calculated checksum: {checksum:#04x}")
+    return checksum
+
+
+def throughput(function, data: bytes) -> float:
+    number = 20000
+    elapsed = min(timeit.repeat(lambda: function(data), number=number, repeat=3))
+    return number / elapsed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)  # Debug output off, as in production
+    print(f"{'payload':>7}  {'legacy':>12}  {'xor':>12}  {'crc16':>12}  (checksums/s)")
+    for size in PAYLOAD_SIZES:
+        data = os.urandom(HEADER_LENGTH + size)
+        results = [throughput(function, data) for function in (legacy_checksum, xor_checksum, crc16)]
+        print(f"{size:>7}  " + "  ".join(f"{result:12,.0f}" for result in results))
+
+
+if __name__ == "__main__":
+    main()
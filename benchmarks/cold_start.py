@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/cold_start.py
+Author: Jan Kühnemund
+Description: Time from launching main.py to the first answered request and to an attached UART.
+
+Each run starts `python main.py` in a fresh process against a FakeMCU that
+answers normally, answers 200 ms late, or never answers (a rotator that
+is powered off behind a live USB-serial adapter), with CRC-16 negotiation
+enabled so startup needs firmware round trips. GET /devices is polled
+every 10 ms.
+
+Run from the repository root:
+    python -m benchmarks.cold_start [--runs 3] [--timeout 30]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from mcu_simulator import FakeMCU
+
+SCENARIOS = {
+    'responsive MCU': {},
+    'MCU answering after 200 ms': {'delay': 0.2},
+    'silent MCU': {'loss': 1.0},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure(mcu_options: dict, timeout: float) -> dict:
+    with FakeMCU(**mcu_options) as mcu:
+        port = free_port()
+        env = dict(os.environ, UART_PORT=mcu.port, UART_CHECKSUM='crc16', DEVICES_FILE='/nonexistent/devices.json',
+                   JOYSTICK_BACKEND='none', LOG_LEVEL='WARNING')
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, 'main.py', '--host', '127.0.0.1', '--port', str(port)],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        first_request = attached = None
+        try:
+            with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=timeout) as client:
+                while time.perf_counter() - start < timeout:
+                    try:
+                        devices = client.get('/devices').json()
+                    except httpx.TransportError:
+                        time.sleep(0.01)
+                        continue
+                    now = time.perf_counter() - start
+                    first_request = first_request or now
+                    if devices[0]['connected']:
+                        attached = now
+                        break
+                    time.sleep(0.01)
+        finally:
+            server.terminate()
+            server.wait()
+    return {'first_request': first_request, 'attached': attached}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=30.0, help="Seconds to wait for each server")
+    args = parser.parse_args()
+    print(f"{'scenario':<28} {'first request s':>15} {'UART attached s':>15}")
+    for name, options in SCENARIOS.items():
+        results = [measure(options, args.timeout) for _ in range(args.runs)]
+
+        def median(key):
+            values = [result[key] for result in results if result[key] is not None]
+            return f"{statistics.median(values):15.2f}" if len(values) == len(results) else f"{'-':>15}"
+        print(f"{name:<28} {median('first_request')} {median('attached')}")
+
+
+if __name__ == "__main__":
+    main()
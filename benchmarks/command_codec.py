@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/command_codec.py
+Author: Jan Kühnemund
+Description: Encode/decode cost per command for protobuf versus struct payloads.
+
+Run from the repository root:
+    python -m benchmarks.command_codec
+"""
+
+import timeit
+
+import command_pb2
+from commands import CommandEncoder, CommandDecoder, ANGLE_PAIR
+
+NUMBER = 100000
+
+
+def per_call(function) -> float:
+    return min(timeit.repeat(function, number=NUMBER, repeat=3)) / NUMBER * 1e9
+
+
+def fresh_protobuf_set_position():
+    command = command_pb2.Command()
+    command.set_position.azimuth = 123.4
+    command.set_position.elevation = 45.6
+    return command.SerializeToString()
+
+
+def main():
+    protobuf = CommandEncoder({'set_position': 'protobuf', 'set_velocity': 'protobuf', 'set_calibration': 'protobuf'})
+    packed = CommandEncoder()
+    decoder = CommandDecoder()
+    print(f"{'command':<16} {'format':<18} {'bytes':>5} {'encode ns':>10} {'decode ns':>10}")
+    for name in ('set_position', 'set_velocity', 'set_calibration'):
+        for label, encoder in (("protobuf", protobuf), ("struct", packed)):
+            encode = getattr(encoder, name)
+            command_id, payload = encode(123.4, 45.6)
+            print(f"{name:<16} {label:<18} {len(payload):>5} "
+                  f"{per_call(lambda: encode(123.4, 45.6)):>10.0f} "
+                  f"{per_call(lambda: decoder.decode(command_id, payload)):>10.0f}")
+    payload = fresh_protobuf_set_position()
+    print(f"{'set_position':<16} {'protobuf (fresh)':<18} {len(payload):>5} "
+          f"{per_call(fresh_protobuf_set_position):>10.0f} "
+          f"{per_call(lambda: command_pb2.Command.FromString(payload)):>10.0f}")
+    payload = ANGLE_PAIR.pack(123.4, 45.6)
+    print(f"{'set_position':<16} {'raw struct':<18} {len(payload):>5} "
+          f"{per_call(lambda: ANGLE_PAIR.pack(123.4, 45.6)):>10.0f} "
+          f"{per_call(lambda: ANGLE_PAIR.unpack_from(payload)):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/e2e.py
+Author: Jan Kühnemund
+Description: End-to-end benchmarks against the pty-backed FakeMCU.
+
+Covers command round-trip latency (sync and async stacks), frames/s parsed
+from a burst of position reports, WebSocket fan-out latency through the
+FastAPI app and CPU time per 1k messages. Results can be written as JSON so
+runs can be compared over time.
+
+Run from the repository root:
+    python -m benchmarks.e2e [--samples N] [--frames N] [--clients N] [--json PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+from mcu_simulator import FakeMCU, wait_for
+from uart_comm import UARTCommunication, POSITION_REPORT_ID
+from async_uart import AsyncUARTCommunication
+
+
+def percentiles(values) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(fraction):
+        return values[min(len(values) - 1, int(len(values) * fraction))]
+    return {'n': len(values), 'mean': statistics.mean(values), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99)}
+
+
+def sync_round_trip(samples: int) -> dict:
+    """
+    send_command() until the future resolves, one command at a time.
+    """
+    with FakeMCU() as mcu:
+        uart = UARTCommunication(port=mcu.port, timeout=1)
+        latencies = []
+        try:
+            cpu_start = time.process_time()
+            for _ in range(samples):
+                start = time.perf_counter()
+                uart.send_command(0x01).result(timeout=2)
+                latencies.append((time.perf_counter() - start) * 1000)
+            cpu = time.process_time() - cpu_start
+        finally:
+            uart.close()
+    return dict(percentiles(latencies), cpu_ms_per_1k=cpu / samples * 1e6)
+
+
+def async_round_trip(samples: int) -> dict:
+    """
+    await send_command() on the event loop, one command at a time.
+    """
+    async def run(port):
+        uart = AsyncUARTCommunication(port=port)
+        await uart.connect()
+        latencies = []
+        try:
+            cpu_start = time.process_time()
+            for _ in range(samples):
+                start = time.perf_counter()
+                await uart.send_command(0x01)
+                latencies.append((time.perf_counter() - start) * 1000)
+            cpu = time.process_time() - cpu_start
+        finally:
+            uart.close()
+        return dict(percentiles(latencies), cpu_ms_per_1k=cpu / samples * 1e6)
+
+    with FakeMCU() as mcu:
+        return asyncio.run(run(mcu.port))
+
+
+def parse_throughput(frames: int) -> dict:
+    """
+    Writes a burst of position reports and times until all are handled.
+    """
+    with FakeMCU() as mcu:
+        uart = UARTCommunication(port=mcu.port, timeout=1)
+        handled = []
+        uart.add_position_listener(handled.append)
+        burst = b''.join(FakeMCU.build_frame(0, POSITION_REPORT_ID, (i % 65536).to_bytes(2, 'big') * 2)
+                         for i in range(frames))
+        try:
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            for offset in range(0, len(burst), 4096):
+                mcu.write(burst[offset:offset + 4096])
+            wait_for(lambda: len(handled) >= frames, timeout=30.0, interval=0.001)
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+        finally:
+            uart.close()
+    return {'frames': len(handled), 'frames_per_second': len(handled) / elapsed,
+            'cpu_ms_per_1k': cpu / max(1, len(handled)) * 1e6}
+
+
+def websocket_fanout(clients: int, updates: int, rate_hz: float = 100.0) -> dict:
+    """
+    Position reports from the MCU to every /ws client of the FastAPI app.
+    """
+    from fastapi.testclient import TestClient
+    import api
+
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        sent_at = {}
+        latencies = []
+        lock = threading.Lock()
+        with TestClient(api.app) as client:
+            sockets = [client.websocket_connect("/ws") for _ in range(clients)]
+            for websocket in sockets:
+                websocket.__enter__()
+
+            def receive(websocket):
+                while True:
+                    azimuth = websocket.receive_json()['azimuth']
+                    received = time.perf_counter()
+                    if azimuth in sent_at:
+                        with lock:
+                            latencies.append((received - sent_at[azimuth]) * 1000)
+                    if azimuth == updates:
+                        return
+
+            threads = [threading.Thread(target=receive, args=(websocket,), daemon=True) for websocket in sockets]
+            for thread in threads:
+                thread.start()
+            cpu_start = time.process_time()
+            for i in range(1, updates + 1):
+                sent_at[i] = time.perf_counter()
+                mcu.send_position(i, i)
+                time.sleep(1.0 / rate_hz)
+            for thread in threads:
+                thread.join(timeout=5)
+            cpu = time.process_time() - cpu_start
+            for websocket in sockets:
+                websocket.__exit__(None, None, None)
+    return dict(percentiles(latencies), clients=clients, delivered=len(latencies) / (clients * updates),
+                cpu_ms_per_1k=cpu / updates * 1e6)
+
+
+def report(name: str, result: dict):
+    fields = '  '.join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                       for key, value in result.items())
+    print(f"{name:<18} {fields}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=500, help="commands per round-trip benchmark")
+    parser.add_argument('--frames', type=int, default=20000, help="position reports in the parse burst")
+    parser.add_argument('--clients', type=int, default=8, help="WebSocket clients")
+    parser.add_argument('--updates', type=int, default=200, help="position reports sent to WebSocket clients")
+    parser.add_argument('--json', metavar='PATH', help="also write the results to PATH")
+    args = parser.parse_args()
+
+    results = {
+        'sync_round_trip_ms': sync_round_trip(args.samples),
+        'async_round_trip_ms': async_round_trip(args.samples),
+        'parse_throughput': parse_throughput(args.frames),
+        'websocket_fanout_ms': websocket_fanout(args.clients, args.updates),
+    }
+    for name, result in results.items():
+        report(name, result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/frame_parser.py
+Author: Jan Kühnemund
+Description: Compares the previous reslicing parser with FrameParser on a large stream.
+
+Run from the repository root:
+    python -m benchmarks.frame_parser [capture_file] [chunk_size]
+
+Without a capture file (or with "") a 10 MB stream of position reports and
+ACKs with some line noise is synthesized.
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from framing import FrameParser, START_BYTE, END_BYTE
+from mcu_simulator import FakeMCU
+
+STREAM_SIZE = 10 * 1024 * 1024
+
+
+class LegacyParser:
+    """
+    The previous algorithm: reslices the bytearray after every frame.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        while True:
+            message = self.parse_message()
+            if message is None:
+                return
+            yield message
+
+    def parse_message(self):
+        buffer_length = len(self.buffer)
+        if buffer_length < 6:
+            return None
+        if START_BYTE not in self.buffer:
+            self.buffer.clear()
+            return None
+        start_index = self.buffer.index(START_BYTE)
+        if buffer_length - start_index < 6:
+            return None
+        expected_length = 6 + self.buffer[start_index + 3]
+        if buffer_length - start_index < expected_length:
+            return None
+        end_index = start_index + expected_length - 1
+        if self.buffer[end_index] != END_BYTE:
+            self.buffer = self.buffer[end_index + 1:]
+            return None
+        message = self.buffer[start_index:end_index + 1]
+        self.buffer = self.buffer[end_index + 1:]
+        return message
+
+
+def synthesize_stream(size: int) -> bytes:
+    rng = random.Random(0)
+    chunks = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.01:
+            chunk = bytes([0x55] * rng.randint(1, 8))  # Line noise without START_BYTE
+        elif rng.random() < 0.3:
+            chunk = FakeMCU.build_frame(rng.randrange(256), 0x06)
+        else:
+            payload = rng.randrange(36000).to_bytes(2, 'big') + rng.randrange(9000).to_bytes(2, 'big')
+            chunk = FakeMCU.build_frame(rng.randrange(256), 0x09, payload)
+        chunks.append(chunk)
+        total += len(chunk)
+    return b''.join(chunks)
+
+
+def parse(parser, chunks) -> int:
+    frames = 0
+    for chunk in chunks:
+        for _ in parser.feed(chunk):
+            frames += 1
+    return frames
+
+
+def run(parser_class, chunks):
+    """
+    Returns frames parsed, wall time, and the peak traced allocation size
+    (measured in a second pass, as tracemalloc skews the timing).
+    """
+    started = time.perf_counter()
+    frames = parse(parser_class(), chunks)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    parse(parser_class(), chunks[:256])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return frames, elapsed, peak
+
+
+def main():
+    stream = open(sys.argv[1], 'rb').read() if len(sys.argv) > 1 and sys.argv[1] else synthesize_stream(STREAM_SIZE)
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    chunks = [stream[offset:offset + chunk_size] for offset in range(0, len(stream), chunk_size)]
+    print(f"stream: {len(stream) / 1e6:.1f} MB in {chunk_size}-byte reads")
+    for name, parser_class in (("legacy", LegacyParser), ("ring", FrameParser)):
+        frames, elapsed, peak = run(parser_class, chunks)
+        print(f"{name:<7} frames={frames:<8} {frames / elapsed:12,.0f} frames/s  "
+              f"{len(stream) / elapsed / 1e6:6.1f} MB/s  peak alloc={peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/input_mapping.py
+Author: Jan Kühnemund
+Description: Per-frame cost and handler calls of the compiled input mapping versus per-poll dict mapping.
+
+The dict variant is controller.py's get_mapped_input followed by a
+handler call for every button and axis, as the /ws handler used to do.
+
+Run from the repository root:
+    python -m benchmarks.input_mapping
+"""
+
+import timeit
+
+from input_mapper import InputMapper
+from ws_protocol import AXIS_SCALE
+
+NUMBER = 100000
+BUTTONS = 17
+AXES = 4
+
+
+def main():
+    calls = [0]
+
+    def count(*_):
+        calls[0] += 1
+
+    mapping = {'button_0': 'arm', 'button_1': 'disarm', 'axis_0': 'move_x', 'axis_1': 'move_y'}
+    raw_buttons = {f'button_{index}': 0 for index in range(BUTTONS)}
+    raw_axes = {f'axis_{index}': 0.25 for index in range(AXES)}
+
+    def dict_mapping():
+        buttons = {mapping.get(k, k): v for k, v in raw_buttons.items()}
+        axes = {mapping.get(k, k): v for k, v in raw_axes.items()}
+        for action, pressed in buttons.items():
+            if pressed:
+                count(action)
+        for action, value in axes.items():
+            count(action, value)
+
+    mapper = InputMapper({'arm': count, 'disarm': count}, {'move_x': count, 'move_y': count}, path='/dev/null')
+    mapper.compile(mapping)
+    session = mapper.session()
+    steady = [round(0.25 * AXIS_SCALE)] * AXES + [0] * 4
+    moving = [list(steady) for _ in range(2)]
+    moving[1][0] = round(0.5 * AXIS_SCALE)
+    frame = [0]
+
+    def compiled_steady():
+        session.apply(0, steady)
+
+    def compiled_moving():
+        frame[0] ^= 1
+        session.apply(0, moving[frame[0]])
+
+    for name, function in (("dict per poll", dict_mapping), ("compiled, steady", compiled_steady),
+                           ("compiled, moving", compiled_moving)):
+        calls[0] = 0
+        elapsed = min(timeit.repeat(function, number=NUMBER, repeat=3))
+        print(f"{name:<18} {elapsed / NUMBER * 1e6:6.2f} us/frame  {calls[0] / NUMBER / 3:5.2f} handler calls/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/joystick_loop.py
+Author: Jan Kühnemund
+Description: Per-sample cost and timing jitter of the fixed-rate joystick loop on the dummy backend.
+
+Run from the repository root:
+    python -m benchmarks.joystick_loop [--duration 2]
+"""
+
+import argparse
+import time
+import timeit
+
+from controller import DummyController, JoystickLoop
+
+NUMBER = 100000
+RATES = (100, 250, 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--duration', type=float, default=2.0, help="Seconds to run each rate")
+    args = parser.parse_args()
+
+    controller = DummyController()
+    controller.configure()
+    loop = JoystickLoop(controller, lambda buttons, axes: None)
+    elapsed = min(timeit.repeat(loop.sample, number=NUMBER, repeat=3))
+    print(f"sample, unchanged  {elapsed / NUMBER * 1e6:6.2f} us")
+
+    for rate in RATES:
+        loop = JoystickLoop(controller, lambda buttons, axes: None, rate_hz=rate).start()
+        time.sleep(args.duration)
+        loop.stop()
+        print(f"{rate:5d} Hz  achieved {loop.samples / args.duration:7.1f} Hz  "
+              f"overruns {loop.overruns:4d}  max lateness {loop.max_lateness * 1e3:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/logging_overhead.py
+Author: Jan Kühnemund
+Description: Per-frame CPU cost of the receive path under different logging setups.
+
+Compares the previous per-frame f-string logging (hex dumps, INFO lines for
+every frame, synchronous handler at DEBUG as setup_logging used to
+configure) with lazy %-formatting behind a QueueHandler at INFO and DEBUG,
+and with the binary frame trace enabled. Handlers write to os.devnull.
+
+Run from the repository root:
+    python -m benchmarks.logging_overhead [frames]
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+
+from frame_trace import FrameTrace
+from mcu_simulator import FakeMCU
+from uart_comm import UARTCommunication
+
+
+class LegacyUARTCommunication(UARTCommunication):
+    """
+    Adds back the per-frame log lines the receive path used to emit.
+    """
+    def process_uart_data(self, data):
+        logging.debug(f"Read {len(data)} bytes from UART: {data.hex()}")
+        super().process_uart_data(data)
+
+    def handle_message(self, message):
+        payload = message[4:4 + message[3]]
+        logging.info(f"Received message - MESSAGE_ID: {message[1]}, COMMAND_ID: {message[2]}, PAYLOAD: {payload.hex()}")
+        super().handle_message(message)
+
+    def process_data_message(self, command_id, payload):
+        logging.info(f"Processing data message COMMAND_ID {command_id:#04x} with payload: {payload.hex()}")
+        super().process_data_message(command_id, payload)
+
+    def update_position(self, azimuth, elevation):
+        super().update_position(azimuth, elevation)
+        logging.info(f"Updated position: Azimuth={azimuth}, Elevation={elevation}")
+
+
+def configure(level, queued: bool):
+    """
+    Installs a root handler writing to os.devnull. Returns a teardown callable.
+    """
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    root.handlers.clear()
+    root.setLevel(level)
+    stream = open(os.devnull, 'w')
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    listener = None
+    if queued:
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        root.addHandler(handler)
+
+    def teardown():
+        if listener:
+            listener.stop()  # Drains the queue
+        root.handlers[:], level = saved
+        root.setLevel(level)
+        stream.close()
+    return teardown
+
+
+def measure(uart_class, level, queued: bool, frames: int, trace: bool = False) -> tuple:
+    """
+    Returns (hot-path CPU, total process CPU) per frame in microseconds.
+    """
+    stream = b''.join(FakeMCU.build_frame(i % 256, 0x09, (i % 65536).to_bytes(2, 'big') * 2) for i in range(frames))
+    chunks = [stream[offset:offset + 4096] for offset in range(0, len(stream), 4096)]
+    with FakeMCU() as mcu, tempfile.TemporaryDirectory() as directory:
+        uart = uart_class(port=mcu.port, timeout=1)
+        if trace:
+            uart.trace = FrameTrace(os.path.join(directory, 'trace.bin'))
+        teardown = configure(level, queued)
+        try:
+            process_start = time.process_time()
+            thread_start = time.thread_time()
+            for chunk in chunks:
+                uart.process_uart_data(chunk)
+            thread_cpu = time.thread_time() - thread_start
+        finally:
+            teardown()
+            process_cpu = time.process_time() - process_start
+            uart.close()
+    return thread_cpu / frames * 1e6, process_cpu / frames * 1e6
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = [
+        ("before, DEBUG, sync", LegacyUARTCommunication, logging.DEBUG, False, False),
+        ("before, INFO, sync", LegacyUARTCommunication, logging.INFO, False, False),
+        ("after, DEBUG, queue", UARTCommunication, logging.DEBUG, True, False),
+        ("after, INFO, queue", UARTCommunication, logging.INFO, True, False),
+        ("after, INFO, trace", UARTCommunication, logging.INFO, True, True),
+    ]
+    print(f"{'':<22} {'hot path':>12} {'process':>12}")
+    for name, uart_class, level, queued, trace in cases:
+        hot, total = measure(uart_class, level, queued, frames, trace)
+        print(f"{name:<22} {hot:9.2f} us {total:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
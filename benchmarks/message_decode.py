@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/message_decode.py
+Author: Jan Kühnemund
+Description: Per-frame decode and dispatch cost, if/elif with int.from_bytes versus the codec registry.
+
+Run from the repository root:
+    python -m benchmarks.message_decode
+"""
+
+import timeit
+
+from message_codec import CodecRegistry, FRAME_HEADER
+from mcu_simulator import FakeMCU
+
+NUMBER = 200000
+
+
+def legacy_decode(message, sink):
+    """
+    The previous header parsing and position decoding of handle_message/process_data_message.
+    """
+    message_id = message[1]
+    command_id = message[2]
+    payload_length = message[3]
+    payload = message[4:4 + payload_length]
+    if command_id == 0x09:
+        if len(payload) >= 4:
+            azimuth = int.from_bytes(payload[0:2], 'big', signed=False)
+            elevation = int.from_bytes(payload[2:4], 'big', signed=False)
+            sink(azimuth, elevation)
+    elif command_id == 0x0B:
+        pass
+
+
+def make_registry(sink) -> CodecRegistry:
+    registry = CodecRegistry()
+    registry.register(0x09, 'position', '>HH', ('azimuth', 'elevation'), sink)
+    registry.register(0x0B, 'capabilities', '>B', ('flags',))
+    return registry
+
+
+def registry_decode(registry, message):
+    _, message_id, command_id, payload_length = FRAME_HEADER.unpack_from(message)
+    registry.dispatch(command_id, message[4:4 + payload_length])
+
+
+def main():
+    frame = memoryview(FakeMCU.build_frame(7, 0x09, b'\x01\x00\x00\x2d'))
+    sink = lambda azimuth, elevation: None
+    registry = make_registry(sink)
+    results = {
+        'if/elif + int.from_bytes': min(timeit.repeat(lambda: legacy_decode(frame, sink), number=NUMBER, repeat=3)),
+        'codec registry': min(timeit.repeat(lambda: registry_decode(registry, frame), number=NUMBER, repeat=3)),
+    }
+    for name, elapsed in results.items():
+        print(f"{name:<26} {elapsed / NUMBER * 1e9:8.0f} ns/frame")
+
+
+if __name__ == "__main__":
+    main()
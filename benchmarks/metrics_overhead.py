@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/metrics_overhead.py
+Author: Jan Kühnemund
+Description: CPU cost of the metrics on the receive path, and of the sampling profiler while it runs.
+
+The baseline swaps the metrics used by framing.py and uart_comm.py for
+no-op stand-ins, so the difference is what the instrumentation costs.
+
+Run from the repository root:
+    python -m benchmarks.metrics_overhead [frames]
+"""
+
+import sys
+import time
+import timeit
+
+import framing
+import metrics
+import uart_comm
+from mcu_simulator import FakeMCU
+from uart_comm import UARTCommunication
+
+NUMBER = 1000000
+REPEAT = 5
+
+
+class NullMetric:
+    def inc(self, amount: int = 1):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+def receive_path(chunks, frames: int) -> float:
+    """
+    Returns the best CPU time per frame in microseconds for parsing and dispatching `chunks`.
+    """
+    with FakeMCU() as mcu:
+        uart = UARTCommunication(port=mcu.port, timeout=1)
+        try:
+            best = float('inf')
+            for _ in range(REPEAT):
+                start = time.thread_time()
+                for chunk in chunks:
+                    uart.process_uart_data(chunk)
+                best = min(best, time.thread_time() - start)
+        finally:
+            uart.close()
+    return best / frames * 1e6
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    counter = metrics.Counter('c', "")
+    histogram = metrics.Histogram('h', "")
+    for name, function in (("Counter.inc", counter.inc), ("Histogram.observe", lambda: histogram.observe(0.0012))):
+        elapsed = min(timeit.repeat(function, number=NUMBER, repeat=3))
+        print(f"{name:<20} {elapsed / NUMBER * 1e9:6.0f} ns")
+
+    stream = b''.join(FakeMCU.build_frame(i % 256, 0x09, (i % 65536).to_bytes(2, 'big') * 2) for i in range(frames))
+    chunks = [stream[offset:offset + 4096] for offset in range(0, len(stream), 4096)]
+    names = ('FRAMES_RECEIVED', 'CHECKSUM_ERRORS', 'FRAMES_SENT', 'UNKNOWN_ACKS')
+    saved = {name: getattr(uart_comm, name) for name in names}, framing.RESYNCS
+    for name in names:
+        setattr(uart_comm, name, NullMetric())
+    framing.RESYNCS = NullMetric()
+    try:
+        baseline = receive_path(chunks, frames)
+    finally:
+        for name, metric in saved[0].items():
+            setattr(uart_comm, name, metric)
+        framing.RESYNCS = saved[1]
+    instrumented = receive_path(chunks, frames)
+    metrics.PROFILER.start(0.005)
+    try:
+        profiled = receive_path(chunks, frames)
+    finally:
+        metrics.PROFILER.stop()
+    print(f"receive path, no metrics   {baseline:6.2f} us/frame")
+    print(f"receive path, metrics      {instrumented:6.2f} us/frame  {(instrumented / baseline - 1) * 100:+5.1f} %")
+    print(f"  + profiler at 5 ms       {profiled:6.2f} us/frame  {(profiled / baseline - 1) * 100:+5.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/multi_device.py
+Author: Jan Kühnemund
+Description: CPU, memory and threads of one process serving 1 to N simulated rotators.
+
+Every count runs in a fresh process, so the memory figures do not reuse an
+earlier run's heap; the FakeMCUs run in yet another process and do not
+count towards the CPU time.
+
+Run from the repository root:
+    python -m benchmarks.multi_device [--devices 1 2 4 8 16] [--rate 100] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+
+from devices import DeviceRegistry
+from mcu_simulator import FakeMCU
+from metrics import FRAMES_RECEIVED
+
+
+def rss_kib() -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def simulate(count: int, rate: float, ports, stop):
+    mcus = [FakeMCU(report_rate_hz=rate).start() for _ in range(count)]
+    ports.send([mcu.port for mcu in mcus])
+    stop.wait()
+    for mcu in mcus:
+        mcu.stop()
+
+
+async def serve(ports: list, duration: float) -> dict:
+    baseline = rss_kib()
+    registry = DeviceRegistry.from_config({f'rotator{i}': {'port': port} for i, port in enumerate(ports)},
+                                          mapping_path='/nonexistent/mapping.json')
+    await registry.start()
+    try:
+        await asyncio.sleep(1.0)  # Warm up
+        frames, cpu, start = FRAMES_RECEIVED.value, time.process_time(), time.perf_counter()
+        await asyncio.sleep(duration)
+        elapsed = time.perf_counter() - start
+        return {
+            'connected': sum(device.uart.is_connected() for device in registry),
+            'frames': (FRAMES_RECEIVED.value - frames) / elapsed,
+            'cpu': (time.process_time() - cpu) / elapsed * 100,
+            'rss': rss_kib() - baseline,
+            'threads': threading.active_count(),
+        }
+    finally:
+        registry.stop()
+
+
+def measure(count: int, rate: float, duration: float, results):
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    stop = context.Event()
+    simulator = context.Process(target=simulate, args=(count, rate, sender, stop))
+    simulator.start()
+    try:
+        results.put(asyncio.run(serve(receiver.recv(), duration)))
+    finally:
+        stop.set()
+        simulator.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--rate', type=float, default=100.0, help="Position reports per second and device")
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    context = multiprocessing.get_context('spawn')
+    print(f"{'devices':>7} {'open':>5} {'frames/s':>9} {'CPU %':>6} {'CPU %/dev':>9} "
+          f"{'RSS MiB':>8} {'MiB/dev':>8} {'threads':>7}")
+    for count in args.devices:
+        results = context.Queue()
+        process = context.Process(target=measure, args=(count, args.rate, args.duration, results))
+        process.start()
+        result = results.get()
+        process.join()
+        print(f"{count:7d} {result['connected']:5d} {result['frames']:9.0f} {result['cpu']:6.1f} "
+              f"{result['cpu'] / count:9.2f} {result['rss'] / 1024:8.1f} {result['rss'] / 1024 / count:8.2f} "
+              f"{result['threads']:7d}")
+
+
+if __name__ == "__main__":
+    main()
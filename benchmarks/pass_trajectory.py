@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/pass_trajectory.py
+Author: Jan Kühnemund
+Description: Batch versus per-sample pass computation, and setpoint timing jitter of the pass scheduler.
+
+Run from the repository root:
+    python -m benchmarks.pass_trajectory [rate_hz] [seconds]
+"""
+
+import sys
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from tracking import Station, TLEPredictor, PassScheduler, PassTrajectory, next_pass, compute_pass, RotatorLimits
+
+ISS_TLE = ("1 25544U 98067A   08264.51782528 -.00002182  00000-0 -11606-4 0  2927",
+           "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537")
+ISS_EPOCH = 1221913540.0
+
+
+class NullCommands:
+    def __init__(self):
+        self.future = Future()
+        self.future.set_result(1)
+
+    def set_position(self, azimuth, elevation):
+        return self.future
+
+
+def per_sample(predictor, times):
+    """
+    One propagation and conversion per setpoint, as a naive loop would do during the pass.
+    """
+    for t in times:
+        predictor.look_angles(np.array([t]))
+
+
+def jitter(rate_hz: float, seconds: float, spin: float):
+    start = time.time() + 0.1
+    times = start + np.arange(int(rate_hz * seconds)) / rate_hz
+    trajectory = PassTrajectory(times, np.zeros(len(times)), np.zeros(len(times)))
+    scheduler = PassScheduler(NullCommands(), trajectory, spin=spin).start()
+    scheduler.join()
+    lateness = scheduler.lateness[~np.isnan(scheduler.lateness)] * 1e6
+    return np.percentile(lateness, 50), np.percentile(lateness, 99), lateness.max(), scheduler.skipped
+
+
+def main():
+    rate_hz = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    predictor = TLEPredictor(*ISS_TLE, Station(52.52, 13.405, 34))
+    aos, los = next_pass(predictor, ISS_EPOCH)
+    times = np.arange(aos, los, 1.0 / rate_hz)
+
+    start = time.perf_counter()
+    compute_pass(predictor, aos, los, rate_hz, RotatorLimits())
+    batch = time.perf_counter() - start
+    start = time.perf_counter()
+    per_sample(predictor, times)
+    loop = time.perf_counter() - start
+    print(f"{len(times)} setpoints: batch {batch * 1e3:.1f} ms, per-sample {loop * 1e3:.1f} ms")
+
+    for name, spin in (("sleep only", 0.0), ("sleep + spin", 0.002)):
+        p50, p99, worst, skipped = jitter(rate_hz, seconds, spin)
+        print(f"{name:<13} lateness p50 {p50:8.1f} us  p99 {p99:8.1f} us  max {worst:8.1f} us  skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
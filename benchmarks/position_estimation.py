@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/position_estimation.py
+Author: Jan Kühnemund
+Description: Error of the served position against the true rotator position, raw reports versus estimates.
+
+Run from the repository root:
+    python -m benchmarks.position_estimation [--report-hz 10 50] [--latency 0.03] [--jitter 0.02] [--duration 120]
+
+A rotator follows a smooth pass (under ROTATOR_MAX_RATE) in virtual time.
+The MCU reports whole degrees at --report-hz; each report is read after
+--latency plus up to --jitter seconds. At 100 Hz the benchmark compares
+the true position with the latest report, and with the PositionEstimator
+fed either receive times or MCU sample times (as with CAP_TIMESTAMPS and
+a synced clock). Also times one estimate() call.
+"""
+
+import argparse
+import math
+import random
+import timeit
+
+from benchmarks.e2e import percentiles
+from position_estimator import PositionEstimator
+
+QUERY_HZ = 100.0
+
+
+def true_position(t: float) -> tuple:
+    return 180.0 + 40.0 * math.sin(2 * math.pi * t / 60), 45.0 + 20.0 * math.sin(2 * math.pi * t / 45)
+
+
+def angle_error(a: tuple, b: tuple) -> float:
+    azimuth = (a[0] - b[0] + 180) % 360 - 180
+    return math.hypot(azimuth, a[1] - b[1])
+
+
+def simulate(report_hz: float, latency: float, jitter: float, duration: float, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    reports = []  # (received, sampled, azimuth, elevation)
+    for i in range(int(duration * report_hz)):
+        sampled = i / report_hz
+        azimuth, elevation = true_position(sampled)
+        reports.append((sampled + latency + rng.random() * jitter, sampled, round(azimuth), round(elevation)))
+    reports.sort()  # The UART delivers in order; jitter larger than the period would reorder
+    by_receipt, by_sample = PositionEstimator(), PositionEstimator()
+    errors = {'latest report': [], 'estimate, receive times': [], 'estimate, MCU timestamps': []}
+    latest = None
+    index = 0
+    for step in range(int(1.0 * QUERY_HZ), int(duration * QUERY_HZ)):
+        now = step / QUERY_HZ
+        while index < len(reports) and reports[index][0] <= now:
+            received, sampled, azimuth, elevation = reports[index]
+            by_receipt.update(azimuth, elevation, received)
+            by_sample.update(azimuth, elevation, sampled)
+            latest = (azimuth, elevation)
+            index += 1
+        if latest is None:
+            continue
+        truth = true_position(now)
+        errors['latest report'].append(angle_error(latest, truth))
+        for name, estimator in (('estimate, receive times', by_receipt), ('estimate, MCU timestamps', by_sample)):
+            estimate = estimator.estimate(now)
+            errors[name].append(angle_error((estimate['azimuth'], estimate['elevation']), truth))
+    return {name: percentiles(values) for name, values in errors.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--report-hz', type=float, nargs='+', default=[10.0, 50.0])
+    parser.add_argument('--latency', type=float, default=0.03, help="Seconds from sampling to reading a report")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--duration', type=float, default=120.0, help="Virtual seconds per run")
+    args = parser.parse_args()
+    print(f"Pass of up to {40 * 2 * math.pi / 60:.1f} deg/s, latency {args.latency * 1000:.0f} ms "
+          f"+ up to {args.jitter * 1000:.0f} ms, served at {QUERY_HZ:.0f} Hz")
+    print(f"{'reports/s':>9}  {'served position':<26} {'mean deg':>8} {'p50 deg':>8} {'p99 deg':>8}")
+    for report_hz in args.report_hz:
+        for name, stats in simulate(report_hz, args.latency, args.jitter, args.duration).items():
+            print(f"{report_hz:>9.0f}  {name:<26} {stats['mean']:>8.3f} {stats['p50']:>8.3f} {stats['p99']:>8.3f}")
+    estimator = PositionEstimator()
+    estimator.update(10, 10, 0.0)
+    estimator.update(11, 10, 0.2)
+    calls = 100000
+    seconds = timeit.timeit(lambda: estimator.estimate(0.25), number=calls)
+    print(f"\nestimate(): {seconds / calls * 1e6:.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/shared_state.py
+Author: Jan Kühnemund
+Description: Cost of the shared-memory seqlock and of commands routed through the UART owner.
+
+Run from the repository root:
+    python -m benchmarks.shared_state [--samples N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import timeit
+
+from async_uart import AsyncUARTCommunication
+from benchmarks.e2e import percentiles
+from mcu_simulator import FakeMCU
+from shared_state import SharedState
+from uart_owner import UARTOwner, UARTProxy
+
+NUMBER = 100000
+
+
+def seqlock():
+    state = SharedState.create({'link': ('connected',), 'position': ('azimuth', 'elevation'),
+                                'velocity': ('azimuth_velocity', 'elevation_velocity'),
+                                'status': ('state', 'errors', 'uptime')})
+    reader = SharedState.attach(state.name)
+    try:
+        for name, function in (("write", lambda: state.write('position', (120.0, 30.0))),
+                               ("snapshot", reader.snapshot),
+                               ("read channel", lambda: reader.read('position'))):
+            elapsed = min(timeit.repeat(function, number=NUMBER, repeat=3))
+            print(f"{name:<14} {elapsed / NUMBER * 1e6:6.2f} us")
+    finally:
+        reader.close()
+        state.close()
+
+
+async def round_trips(uart, samples: int) -> dict:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await uart.send_command(0x01)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+async def commands(samples: int):
+    with FakeMCU() as mcu, tempfile.TemporaryDirectory() as directory:
+        owner = UARTOwner(os.path.join(directory, 'uart.sock'), {'default': AsyncUARTCommunication(port=mcu.port)})
+        await owner.start()
+        proxy = UARTProxy(owner.socket_path)
+        await proxy.connect()
+        try:
+            direct = await round_trips(owner.devices[0].uart, samples)
+            proxied = await round_trips(proxy, samples)
+        finally:
+            proxy.close()
+            await owner.close()
+    for name, stats in (("direct", direct), ("through owner", proxied)):
+        print(f"command RTT {name:<14} p50 {stats['p50']:6.3f} ms  p99 {stats['p99']:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=2000)
+    args = parser.parse_args()
+    seqlock()
+    asyncio.run(commands(args.samples))
+
+
+if __name__ == "__main__":
+    main()
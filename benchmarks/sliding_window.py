@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/sliding_window.py
+Author: Jan Kühnemund
+Description: Commands/s and retransmissions of the ACK protocol by window size and loss rate.
+
+Run from the repository root:
+    python -m benchmarks.sliding_window [commands]
+
+Uses the virtual-time LinkSimulator (115200 baud, 2 ms firmware turnaround).
+"""
+
+import sys
+
+from mcu_simulator import LinkSimulator
+
+WINDOW_SIZES = (1, 2, 4, 8, 16, 32)
+LOSS_RATES = (0.0, 0.01, 0.05)
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{'window':>6}  {'loss':>5}  {'acks':>10}  {'commands/s':>10}  {'retransmissions':>15}")
+    for window_size in WINDOW_SIZES:
+        for loss in LOSS_RATES:
+            for cumulative in (False, True):
+                result = LinkSimulator(window_size, loss, cumulative_acks=cumulative).run(commands)
+                print(f"{window_size:>6}  {loss:>5.2f}  {'selective' if cumulative else 'single':>10}  "
+                      f"{result['commands_per_second']:>10.0f}  {result['retransmissions']:>15}")
+
+
+if __name__ == "__main__":
+    main()
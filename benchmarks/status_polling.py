@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/status_polling.py
+Author: Jan Kühnemund
+Description: UART traffic and response time of /status with several dashboards polling.
+
+Compares sending 0x07 on every poll, as /status used to, with the TTL
+cache and single-flight requests of api.get_status.
+
+Run from the repository root:
+    python -m benchmarks.status_polling [--clients 8] [--rate 10] [--duration 3]
+"""
+
+import argparse
+import asyncio
+import time
+
+import api
+from benchmarks.e2e import percentiles
+from mcu_simulator import FakeMCU
+
+
+async def poll(get, clients: int, rate: float, duration: float) -> list:
+    latencies = []
+
+    async def client():
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await get()
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(1.0 / rate)
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+async def run(args):
+    async def command_per_poll():
+        return await api.uart_comm.send_command(0x07)
+
+    for name, get in (("0x07 per poll", command_per_poll), ("cached, single-flight", api.get_status)):
+        with FakeMCU() as mcu:
+            api.uart_comm.port = mcu.port
+            await api.uart_comm.connect()
+            try:
+                latencies = await poll(get, args.clients, args.rate, args.duration)
+            finally:
+                api.uart_comm.close()
+            requests = sum(1 for _, command_id, _ in mcu.received if command_id == 0x07)
+        stats = percentiles(latencies)
+        print(f"{name:<22} {stats['n']:5d} polls  {requests:5d} status requests  "
+              f"p50 {stats['p50']:6.3f} ms  p99 {stats['p99']:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=10.0, help="Polls per second and client")
+    parser.add_argument('--duration', type=float, default=3.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
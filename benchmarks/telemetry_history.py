@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/telemetry_history.py
+Author: Jan Kühnemund
+Description: Append cost, query time and response size of the telemetry history.
+
+Fills a history with hours of 50 Hz position samples and compares the JSON
+size of the raw range with min/max and LTTB decimation.
+
+Run from the repository root:
+    python -m benchmarks.telemetry_history [hours] [points]
+"""
+
+import json
+import math
+import sys
+import time
+import timeit
+
+from telemetry_history import TelemetryHistory
+
+RATE_HZ = 50
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    samples = int(hours * 3600 * RATE_HZ)
+    history = TelemetryHistory(('azimuth', 'elevation'), samples)
+    start = time.time() - hours * 3600
+
+    append_start = time.perf_counter()
+    for i in range(samples):
+        history.append((180 + 170 * math.sin(i / 5000), 45 + 40 * math.sin(i / 3000)), start + i / RATE_HZ)
+    append = (time.perf_counter() - append_start) / samples
+    memory = history.times.nbytes + history.values.nbytes
+    print(f"{samples} samples, {memory / 1e6:.1f} MB fixed, append {append * 1e9:.0f} ns/sample")
+
+    end = start + hours * 3600
+    raw = history.query(start, end, samples + 1)
+    print(f"{'raw':<8} {len(raw['time']):>8} rows {len(json.dumps(raw)) / 1e6:9.3f} MB")
+    for method in ('minmax', 'lttb'):
+        elapsed = min(timeit.repeat(lambda: history.query(start, end, points, method), number=1, repeat=3))
+        result = history.query(start, end, points, method)
+        print(f"{method:<8} {len(result['time']):>8} rows {len(json.dumps(result)) / 1e6:9.3f} MB "
+              f"{elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
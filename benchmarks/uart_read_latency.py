@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/uart_read_latency.py
+Author: Jan Kühnemund
+Description: Measures byte-arrival-to-handle_message latency of the UART reader.
+
+Run from the repository root:
+    python -m benchmarks.uart_read_latency [samples]
+"""
+
+import sys
+import time
+import random
+import statistics
+
+from mcu_simulator import FakeMCU, wait_for
+from uart_comm import UARTCommunication
+
+
+class InstrumentedUARTCommunication(UARTCommunication):
+    """
+    Records the time at which each message reaches handle_message.
+    """
+    def __init__(self, *args, **kwargs):
+        self.handled_at = []
+        super().__init__(*args, **kwargs)
+
+    def handle_message(self, message):
+        self.handled_at.append(time.perf_counter())
+        super().handle_message(message)
+
+
+class PollingUARTCommunication(InstrumentedUARTCommunication):
+    """
+    The previous reader: polls in_waiting and sleeps 100 ms per loop.
+    """
+    def read_from_uart(self):
+        while self.is_connected():
+            try:
+                if self.ser.in_waiting:
+                    data = self.ser.read(self.ser.in_waiting)
+                    self.process_uart_data(data)
+                time.sleep(0.1)
+            except Exception:
+                break
+
+
+def measure(uart_class, samples: int):
+    with FakeMCU() as mcu:
+        uart = uart_class(port=mcu.port, timeout=1)
+        latencies = []
+        try:
+            for i in range(samples):
+                # Random spacing so arrivals are not phase-locked to a poll tick
+                time.sleep(random.uniform(0.0, 0.1))
+                sent_at = time.perf_counter()
+                mcu.send_position(i, i)
+                if not wait_for(lambda: len(uart.handled_at) > i, timeout=1.0, interval=0.0005):
+                    continue
+                latencies.append((uart.handled_at[i] - sent_at) * 1000)
+        finally:
+            uart.close()
+    return latencies
+
+
+def report(name: str, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<10} n={len(latencies):<4} mean={statistics.mean(latencies):8.3f} ms  "
+          f"p50={statistics.median(latencies):8.3f} ms  p99={p99:8.3f} ms")
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    report("polling", measure(PollingUARTCommunication, samples))
+    report("selector", measure(InstrumentedUARTCommunication, samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+File: benchmarks/ws_protocol.py
+Author: Jan Kühnemund
+Description: Bytes and CPU per WebSocket message, JSON versus the binary subprotocol.
+
+Measures encoding a position update once for the broadcaster and decoding
+plus dispatching a gamepad frame (17 buttons, 4 axes, like a standard
+mapped gamepad) in the /ws handler.
+
+Run from the repository root:
+    python -m benchmarks.ws_protocol
+"""
+
+import json
+import logging
+import time
+import timeit
+
+logging.disable(logging.INFO)  # api configures logging on import
+
+import api
+from ws_protocol import encode_gamepad, encode_position
+
+NUMBER = 100000
+
+
+def per_message(function) -> float:
+    return min(timeit.repeat(function, number=NUMBER, repeat=3)) / NUMBER * 1e6
+
+
+def main():
+    position = {'azimuth': 183, 'elevation': 42}
+    now = time.time()
+    json_position = json.dumps(position)
+    binary_position = encode_position(183, 42, now)
+
+    buttons = {f'button_{index}': index == 3 for index in range(17)}
+    axes = {'axis_0': 0.25, 'axis_1': -0.5, 'axis_2': 0.0, 'axis_3': 0.0}
+    json_gamepad = json.dumps({'buttons': buttons, 'axes': axes})
+    binary_gamepad = encode_gamepad(1 << 3, [0.25, -0.5, 0.0, 0.0])
+    api.input_mapper.compile({'button_3': 'arm', 'axis_0': 'move_x', 'axis_1': 'move_y'})
+    session = api.input_mapper.session()
+    session.pressed = 1 << 3  # Held, so no command is sent
+
+    rows = [
+        ("position, JSON", len(json_position), per_message(lambda: json.dumps(position))),
+        ("position, binary", len(binary_position), per_message(lambda: encode_position(183, 42, now))),
+        ("gamepad, JSON", len(json_gamepad), per_message(lambda: session.apply_json(json.loads(json_gamepad)))),
+        ("gamepad, binary", len(binary_gamepad), per_message(lambda: session.apply_frame(binary_gamepad))),
+    ]
+    for name, size, cpu in rows:
+        print(f"{name:<18} {size:5d} bytes {cpu:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
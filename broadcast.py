@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+File: broadcast.py
+Author: Jan Kühnemund
+Description: Publish/subscribe hub that pushes position updates to WebSocket clients.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from ws_protocol import encode_position
+from metrics import FRAME_TO_BROADCAST, WS_SEND, WS_DROPPED
+
+
+class Subscriber:
+    """
+    A connected WebSocket client with a single-slot, latest-value mailbox.
+
+    `binary` clients negotiated ws_protocol.SUBPROTOCOL and receive
+    struct frames; all others receive JSON text.
+    """
+    def __init__(self, websocket, binary: bool = False):
+        self.websocket = websocket
+        self.binary = binary
+        self.latest = None  # Serialized message waiting to be sent
+        self.received = 0.0  # time.perf_counter() when the frame behind `latest` was read
+        self.ready = asyncio.Event()
+        self.coalesced = 0  # Updates replaced before they could be sent
+        self.task = None
+
+    def offer(self, payload, received: float = None):
+        """
+        Replaces any unsent update with `payload` (str or bytes); never blocks.
+        """
+        if self.latest is not None:
+            self.coalesced += 1
+        self.latest = payload
+        self.received = time.perf_counter() if received is None else received
+        self.ready.set()
+
+
+class PositionHub:
+    """
+    Fans out updates to all subscribers.
+
+    Every update is serialized at most once per format (JSON text, binary
+    frame) and handed to each subscriber's mailbox.
+    A dedicated sender task per client drains its mailbox, so a slow client
+    only ever falls behind on its own (its pending updates are coalesced to
+    the newest one) and is dropped if a single send takes longer than
+    `send_timeout`.
+    """
+    def __init__(self, send_timeout: float = 1.0, frame_time=None):
+        self.send_timeout = send_timeout
+        self.frame_time = frame_time  # Returns the perf_counter() time the published frame was read
+        self.subscribers = set()
+        self.last_message = None
+        self.last_time = 0.0
+
+    def publish(self, message: dict, received: float = None):
+        """
+        Serializes `message` once per format in use and offers it to every subscriber.
+
+        `received` is the perf_counter() time the data behind it was read,
+        by default `frame_time()`. Must be called on the event loop thread.
+        """
+        self.last_message = message
+        self.last_time = time.time()
+        if received is None:
+            received = self.frame_time() if self.frame_time else time.perf_counter()
+        text = data = None
+        for subscriber in self.subscribers:
+            if subscriber.binary:
+                if data is None:
+                    data = encode_position(message['azimuth'], message['elevation'], self.last_time)
+                subscriber.offer(data, received)
+            else:
+                if text is None:
+                    text = json.dumps(message)
+                subscriber.offer(text, received)
+
+    def subscribe(self, websocket, binary: bool = False) -> Subscriber:
+        """
+        Registers an accepted WebSocket and starts its sender task.
+        """
+        subscriber = Subscriber(websocket, binary)
+        message = self.last_message
+        if message is not None:
+            if binary:
+                subscriber.offer(encode_position(message['azimuth'], message['elevation'], self.last_time))
+            else:
+                subscriber.offer(json.dumps(message))
+        self.subscribers.add(subscriber)
+        subscriber.task = asyncio.get_running_loop().create_task(self._sender(subscriber))
+        logging.info("WebSocket client subscribed (%d connected)", len(self.subscribers))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """
+        Removes a subscriber and stops its sender task.
+        """
+        if subscriber in self.subscribers:
+            self.subscribers.discard(subscriber)
+            logging.info("WebSocket client unsubscribed (%d connected)", len(self.subscribers))
+        if subscriber.task and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    async def _sender(self, subscriber: Subscriber):
+        try:
+            while True:
+                await subscriber.ready.wait()
+                subscriber.ready.clear()
+                payload, subscriber.latest = subscriber.latest, None
+                received = subscriber.received
+                send = subscriber.websocket.send_bytes if subscriber.binary else subscriber.websocket.send_text
+                start = time.perf_counter()
+                await asyncio.wait_for(send(payload), self.send_timeout)
+                end = time.perf_counter()
+                WS_SEND.observe(end - start)
+                FRAME_TO_BROADCAST.observe(end - received)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            WS_DROPPED.inc()
+            logging.warning("Dropping WebSocket client that is too slow to keep up.")
+            self.unsubscribe(subscriber)
+            try:
+                await asyncio.wait_for(subscriber.websocket.close(code=1013), self.send_timeout)
+            except Exception:
+                pass
+        except Exception as e:
+            logging.info("WebSocket client send failed: %s", e)
+            self.unsubscribe(subscriber)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+File: capture.py
+Author: Jan Kühnemund
+Description: Memory-mapped recorder for raw UART traffic.
+
+A capture file is preallocated and mapped into memory, so recording a chunk
+is a memcpy into the mapping and costs no system call. Layout:
+
+    header:  magic (8 bytes), start time (monotonic ns), used length (bytes)
+    records: monotonic ns, direction, chunk length, chunk bytes
+
+Enable it with UART_CAPTURE=path (and UART_CAPTURE_SIZE in MiB) and replay
+a capture with replay.py.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+from threading import Lock
+from frame_trace import RX, TX
+
+MAGIC = b'GSCAPT01'
+FILE_HEADER = struct.Struct('<8sQQ')  # magic, start monotonic_ns, used length
+CHUNK_HEADER = struct.Struct('<QBI')  # monotonic_ns, direction, length
+DEFAULT_SIZE = 64 << 20
+
+
+class CaptureRecorder:
+    """
+    Appends RX/TX chunks with monotonic timestamps to a preallocated, memory-mapped file.
+
+    When the file is full, further chunks are counted in `dropped` instead
+    of growing the file. close() truncates the file to the recorded length.
+    """
+    def __init__(self, path: str, size: int = DEFAULT_SIZE):
+        self.path = path
+        self.size = size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        self.start = time.monotonic_ns()
+        self.offset = FILE_HEADER.size
+        self.dropped = 0
+        self.lock = Lock()  # RX and TX are recorded from different threads
+        # The used length stays 0 until close(); readers then stop at the
+        # first zeroed record, so a capture survives a crash of the recorder.
+        FILE_HEADER.pack_into(self.map, 0, MAGIC, self.start, 0)
+
+    def record(self, direction: int, data):
+        record = CHUNK_HEADER.pack(time.monotonic_ns(), direction, len(data)) + data
+        with self.lock:
+            offset = self.offset
+            end = offset + len(record)
+            if end > self.size or self.map is None:
+                self._drop()
+                return
+            self.map[offset:end] = record
+            self.offset = end
+
+    def _drop(self):
+        if not self.dropped and self.map is not None:
+            logging.warning("Capture file %s is full. Dropping further chunks.", self.path)
+        self.dropped += 1
+
+    def close(self):
+        with self.lock:
+            if self.map is None:
+                return
+            FILE_HEADER.pack_into(self.map, 0, MAGIC, self.start, self.offset)
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            os.ftruncate(self.fd, self.offset)
+            os.close(self.fd)
+        if self.dropped:
+            logging.warning("Capture %s dropped %d chunks.", self.path, self.dropped)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Returns a recorder for UART_CAPTURE, or None if capturing is disabled.
+        """
+        path = os.getenv('UART_CAPTURE')
+        if not path:
+            return None
+        return cls(path, int(os.getenv('UART_CAPTURE_SIZE', str(DEFAULT_SIZE >> 20))) << 20)
+
+
+def read_capture(path: str):
+    """
+    Yields (monotonic_ns, direction, chunk) for every record in a capture file.
+
+    The file is memory-mapped, so captures larger than RAM can be iterated.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, _, used = FILE_HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a UART capture")
+            used = used or len(data)  # Not closed cleanly: scan for the first empty record
+            offset = FILE_HEADER.size
+            while offset + CHUNK_HEADER.size <= used:
+                timestamp, direction, length = CHUNK_HEADER.unpack_from(data, offset)
+                if not timestamp:
+                    break
+                offset += CHUNK_HEADER.size
+                yield timestamp, direction, data[offset:offset + length]
+                offset += length
+
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+File: checksum.py
+Author: Jan Kühnemund
+Description: Frame checksum schemes (8-bit XOR and CRC-16) for the UART protocol.
+"""
+
+import binascii
+
+FOLD_THRESHOLD = 48  # Below this many bytes a plain loop beats the integer fold
+
+
+def xor_checksum(data) -> int:
+    """
+    Returns the XOR of all bytes in `data`.
+
+    Long inputs are converted to one integer and folded in halves, so the
+    work happens in a logarithmic number of big-integer operations instead
+    of one interpreted loop iteration per byte.
+    """
+    length = len(data)
+    if length < FOLD_THRESHOLD:
+        checksum = 0
+        for b in data:
+            checksum ^= b
+        return checksum
+    value = int.from_bytes(data, 'little')
+    while length > 1:
+        half = (length + 1) >> 1
+        bits = half << 3
+        value = (value >> bits) ^ (value & ((1 << bits) - 1))
+        length = half
+    return value
+
+
+def crc16(data) -> int:
+    """
+    Returns the CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) of `data`.
+
+    binascii.crc_hqx is the table-driven implementation of this polynomial
+    in C, which makes it cheaper than the 8-bit XOR loop it replaces.
+    """
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+class ChecksumScheme:
+    """
+    Describes how the checksum field of a frame is computed and encoded.
+    """
+    def __init__(self, name: str, size: int, function, capability: int = 0):
+        self.name = name
+        self.size = size  # Width of the checksum field in bytes
+        self.function = function
+        self.capability = capability  # Firmware capability bit, 0 for the default scheme
+
+    def compute(self, data) -> int:
+        return self.function(data)
+
+    def pack(self, value: int) -> bytes:
+        return value.to_bytes(self.size, 'big')
+
+    def __repr__(self):
+        return f"ChecksumScheme({self.name!r})"
+
+
+CAP_CRC16 = 0x01
+
+XOR = ChecksumScheme('xor', 1, xor_checksum)
+CRC16 = ChecksumScheme('crc16', 2, crc16, CAP_CRC16)
+SCHEMES = {scheme.name: scheme for scheme in (XOR, CRC16)}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+File: clock_sync.py
+Author: Jan Kühnemund
+Description: NTP-style estimate of the MCU clock offset from the existing ACK round trips.
+
+Firmware announcing CAP_TIMESTAMPS appends its clock to every frame it
+sends once the host enables the flag with SET_PROTOCOL:
+
+    ... PAYLOAD, MCU_TIME (u32, microseconds since boot), CHECKSUM ...
+
+MCU_TIME is the time the frame was built: when a report was sampled, or
+when a command was processed for ACKs and batch results. It wraps after
+about 71.6 minutes and is unwrapped on the host.
+"""
+
+import struct
+from collections import deque
+
+CAP_TIMESTAMPS = 0x04  # Capability flag of firmware that timestamps its frames
+MCU_TIME = struct.Struct('>I')  # Appended to every payload while CAP_TIMESTAMPS is enabled
+MCU_TIME_WRAP = 1 << 32
+
+
+class ClockSync:
+    """
+    Offset between the MCU clock and the host's time.perf_counter().
+
+    Every command acknowledged on its first transmission is a sample: sent
+    at host time t0, its ACK read at t3 and stamped t by the MCU. Assuming
+    the ACK was built halfway through the round trip, the offset is
+    t - (t0 + t3) / 2, wrong by at most (t3 - t0) / 2. As in NTP's clock
+    filter, the estimate comes from the sample with the shortest round
+    trip among the latest `window`, since queueing only ever adds delay.
+    """
+    def __init__(self, window: int = 16):
+        self.samples = deque(maxlen=window)  # (round trip, offset) in seconds
+        self.offset = None  # MCU time minus host time, in seconds
+        self.error = None  # Bound on the offset's error, in seconds
+        self.last_raw = None  # Latest MCU_TIME seen, to detect wraparound
+        self.wraps = 0
+
+    @property
+    def synced(self) -> bool:
+        return self.offset is not None
+
+    def unwrap(self, raw: int) -> float:
+        """
+        Converts a raw MCU_TIME to seconds since boot. Must see every timestamp in arrival order.
+
+        A clock that jumps back by less than half the wrap period means the
+        MCU rebooted, which invalidates the offset.
+        """
+        if self.last_raw is not None and raw < self.last_raw:
+            if self.last_raw - raw > MCU_TIME_WRAP // 2:
+                self.wraps += 1
+            else:
+                self.reset()
+        self.last_raw = raw
+        return (self.wraps * MCU_TIME_WRAP + raw) / 1e6
+
+    def add_sample(self, sent: float, mcu_time: float, received: float):
+        """
+        Adds one round trip: host send and receive times and the MCU time of the reply, all in seconds.
+        """
+        round_trip = received - sent
+        if round_trip < 0:
+            return
+        self.samples.append((round_trip, mcu_time - (sent + received) / 2))
+        round_trip, self.offset = min(self.samples)
+        self.error = round_trip / 2
+
+    def to_host(self, mcu_time: float) -> float:
+        """
+        Converts MCU seconds to host time.perf_counter() seconds. Requires `synced`.
+        """
+        return mcu_time - self.offset
+
+    def reset(self):
+        """
+        Forgets all samples, e.g. after the MCU rebooted.
+        """
+        self.samples.clear()
+        self.offset = self.error = self.last_raw = None
+        self.wraps = 0
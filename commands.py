@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+File: commands.py
+Author: Jan Kühnemund
+Description: Typed rotator commands encoded as protobuf or struct payloads inside UART frames.
+"""
+
+import os
+import struct
+import command_pb2
+from setpoint_stream import VELOCITY_SETPOINT, velocity_payload
+from uart_comm import SET_VELOCITY_COMMAND_ID
+
+PROTOBUF_COMMAND_ID = 0x10  # Payload is a serialized turret.Command
+SET_POSITION_COMMAND_ID = 0x03  # struct: azimuth, elevation in degrees
+SET_CALIBRATION_COMMAND_ID = 0x0D  # struct: azimuth, elevation in degrees
+# set_velocity in struct format is the gamepad's velocity setpoint (uart_comm.SET_VELOCITY_COMMAND_ID): degrees/s
+# are sent as fractions of ROTATOR_MAX_RATE, so the firmware has a single velocity command
+
+ANGLE_PAIR = struct.Struct('>ff')
+
+# Per-command wire format. struct payloads are smaller (8 or 4 vs 12 bytes)
+# and cheaper to encode, see benchmarks/command_codec.py; commands without
+# fields only exist as protobuf.
+DEFAULT_WIRE_FORMATS = {
+    'set_position': 'struct',
+    'set_velocity': 'struct',
+    'set_calibration': 'struct',
+}
+
+STRUCT_COMMAND_IDS = {
+    'set_position': SET_POSITION_COMMAND_ID,
+    'set_velocity': SET_VELOCITY_COMMAND_ID,
+    'set_calibration': SET_CALIBRATION_COMMAND_ID,
+}
+
+
+def default_max_rate() -> float:
+    """
+    Degrees/s of a full-scale velocity setpoint.
+    """
+    return float(os.getenv('ROTATOR_MAX_RATE', '5'))
+
+
+class CommandEncoder:
+    """
+    Encodes typed commands into (command_id, payload) pairs.
+
+    A single turret.Command is allocated up front and cleared for every
+    protobuf encode, so building a command does not allocate message
+    objects. Not thread-safe; use one encoder per thread.
+
+    Velocities beyond `max_rate` degrees/s (ROTATOR_MAX_RATE by default)
+    saturate in struct format.
+    """
+    def __init__(self, wire_formats: dict = None, max_rate: float = None):
+        self.wire_formats = dict(DEFAULT_WIRE_FORMATS, **(wire_formats or {}))
+        self.max_rate = max_rate or default_max_rate()
+        self.command = command_pb2.Command()
+
+    def _pair(self, name: str, first: float, second: float):
+        if self.wire_formats.get(name) == 'struct':
+            if name == 'set_velocity':
+                return SET_VELOCITY_COMMAND_ID, velocity_payload(first / self.max_rate, second / self.max_rate)
+            return STRUCT_COMMAND_IDS[name], ANGLE_PAIR.pack(first, second)
+        command = self.command
+        command.Clear()
+        field = getattr(command, name)
+        if name == 'set_velocity':
+            field.azimuth_velocity = first
+            field.elevation_velocity = second
+        else:
+            field.azimuth = first
+            field.elevation = second
+        return PROTOBUF_COMMAND_ID, command.SerializeToString()
+
+    def _empty(self, name: str):
+        command = self.command
+        command.Clear()
+        getattr(command, name).SetInParent()
+        return PROTOBUF_COMMAND_ID, command.SerializeToString()
+
+    def set_position(self, azimuth: float, elevation: float):
+        return self._pair('set_position', azimuth, elevation)
+
+    def set_velocity(self, azimuth_velocity: float, elevation_velocity: float):
+        return self._pair('set_velocity', azimuth_velocity, elevation_velocity)
+
+    def set_calibration(self, azimuth: float, elevation: float):
+        return self._pair('set_calibration', azimuth, elevation)
+
+    def get_position(self):
+        return self._empty('get_position')
+
+    def get_velocity(self):
+        return self._empty('get_velocity')
+
+    def reset(self):
+        return self._empty('reset')
+
+
+class CommandDecoder:
+    """
+    Decodes (command_id, payload) pairs back into (name, fields) tuples.
+
+    Reuses one turret.Command for protobuf payloads.
+    """
+    def __init__(self, max_rate: float = None):
+        self.command = command_pb2.Command()
+        self.struct_names = {command_id: name for name, command_id in STRUCT_COMMAND_IDS.items()}
+        self.velocity_scale = (max_rate or default_max_rate()) / 32767
+
+    def decode(self, command_id: int, payload):
+        name = self.struct_names.get(command_id)
+        if name == 'set_velocity':
+            return name, tuple(value * self.velocity_scale for value in VELOCITY_SETPOINT.unpack_from(payload))
+        if name is not None:
+            return name, ANGLE_PAIR.unpack_from(payload)
+        if command_id != PROTOBUF_COMMAND_ID:
+            raise ValueError(f"Not a rotator command: {command_id:#04x}")
+        command = self.command
+        command.ParseFromString(bytes(payload))
+        name = command.WhichOneof('command_type')
+        field = getattr(command, name)
+        if name == 'set_velocity':
+            return name, (field.azimuth_velocity, field.elevation_velocity)
+        if name in ('set_position', 'set_calibration'):
+            return name, (field.azimuth, field.elevation)
+        return name, ()
+
+
+class RotatorCommands:
+    """
+    Typed command API on top of a UART connection.
+
+    Each method sends one framed, ACKed command and returns whatever the
+    connection's send_command returns: a Future for UARTCommunication, an
+    awaitable for AsyncUARTCommunication.
+    """
+    def __init__(self, uart, wire_formats: dict = None):
+        self.uart = uart
+        self.encoder = CommandEncoder(wire_formats)
+
+    def set_position(self, azimuth: float, elevation: float):
+        return self.uart.send_command(*self.encoder.set_position(azimuth, elevation))
+
+    def set_velocity(self, azimuth_velocity: float, elevation_velocity: float):
+        return self.uart.send_command(*self.encoder.set_velocity(azimuth_velocity, elevation_velocity))
+
+    def set_calibration(self, azimuth: float, elevation: float):
+        return self.uart.send_command(*self.encoder.set_calibration(azimuth, elevation))
+
+    def get_position(self):
+        return self.uart.send_command(*self.encoder.get_position())
+
+    def get_velocity(self):
+        return self.uart.send_command(*self.encoder.get_velocity())
+
+    def reset(self):
+        return self.uart.send_command(*self.encoder.reset())
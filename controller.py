@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+File: controller.py
+Author: Jan Kühnemund
+Description: Controller for handling USB controller inputs.
+"""
+
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Joystick events need the video subsystem, not a display
+
+import logging
+import time
+from array import array
+from threading import Thread, Event, Lock
+import pygame
+from ws_protocol import MAX_AXES, MAX_BUTTONS, AXIS_SCALE
+
+
+class USBController:
+    """
+    Handles USB controller inputs.
+    """
+    def __init__(self, device_id: int = 0):
+        self.device_id = device_id
+        self.joystick = None
+        self.connected = False
+        self.button_mapping = {}
+        self.axis_mapping = {}
+
+    def configure(self, device_id: int = None):
+        """
+        Configures and initializes the joystick.
+        """
+        if device_id is not None:
+            self.device_id = device_id
+        pygame.init()
+        pygame.joystick.init()
+        try:
+            if pygame.joystick.get_count() == 0:
+                raise Exception("No joystick connected")
+            self.joystick = pygame.joystick.Joystick(self.device_id)
+            self.joystick.init()
+            self.connected = True
+            logging.info("Joystick %s initialized.", self.device_id)
+        except Exception as e:
+            self.connected = False
+            logging.error("Failed to initialize joystick %s: %s", self.device_id, e)
+
+    def is_connected(self):
+        """
+        Checks if the joystick is connected.
+        """
+        return self.connected
+
+    def get_input(self):
+        """
+        Retrieves input from the controller.
+        """
+        if not self.is_connected():
+            self.configure()
+        if not self.is_connected():
+            raise Exception("Joystick is not connected.")
+        pygame.event.pump()
+        axes = {}
+        buttons = {}
+        for i in range(self.joystick.get_numaxes()):
+            axes[f'axis_{i}'] = self.joystick.get_axis(i)
+        for i in range(self.joystick.get_numbuttons()):
+            buttons[f'button_{i}'] = self.joystick.get_button(i)
+        return {'axes': axes, 'buttons': buttons}
+
+    def read_into(self, axes: array) -> int:
+        """
+        Samples the joystick into a preallocated int16 array of MAX_AXES axes.
+
+        Returns the button bitmask. Allocates nothing per call, so it can
+        run at a high fixed rate.
+        """
+        pygame.event.pump()
+        joystick = self.joystick
+        for i in range(min(joystick.get_numaxes(), MAX_AXES)):
+            axes[i] = int(joystick.get_axis(i) * AXIS_SCALE)
+        buttons = 0
+        for i in range(min(joystick.get_numbuttons(), MAX_BUTTONS)):
+            if joystick.get_button(i):
+                buttons |= 1 << i
+        return buttons
+
+    def set_button_mapping(self, mapping: dict):
+        """
+        Sets the mapping from controller buttons to actions.
+        """
+        self.button_mapping = mapping
+        logging.info("Button mapping set: %s", self.button_mapping)
+
+    def set_axis_mapping(self, mapping: dict):
+        """
+        Sets the mapping from controller axes to actions.
+        """
+        self.axis_mapping = mapping
+        logging.info("Axis mapping set: %s", self.axis_mapping)
+
+    def get_mapped_input(self):
+        """
+        Retrieves input and applies the user-defined mapping.
+        """
+        raw_input = self.get_input()
+        mapped_buttons = {self.button_mapping.get(k, k): v for k, v in raw_input['buttons'].items()}
+        mapped_axes = {self.axis_mapping.get(k, k): v for k, v in raw_input['axes'].items()}
+        return {'axes': mapped_axes, 'buttons': mapped_buttons}
+
+
+class DummyController:
+    """
+    Joystick backend without hardware, for headless tests and benchmarks.
+
+    set_axis()/set_button() change the state the acquisition loop samples.
+    """
+    def __init__(self, device_id: int = 0):
+        self.device_id = device_id
+        self.connected = False
+        self.axes = [0.0] * MAX_AXES
+        self.buttons = 0
+        self.lock = Lock()
+
+    def configure(self, device_id: int = None):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def set_axis(self, index: int, value: float):
+        with self.lock:
+            self.axes[index] = value
+
+    def set_button(self, index: int, pressed: bool):
+        with self.lock:
+            self.buttons = self.buttons | (1 << index) if pressed else self.buttons & ~(1 << index)
+
+    def read_into(self, axes: array) -> int:
+        with self.lock:
+            for i, value in enumerate(self.axes):
+                axes[i] = int(value * AXIS_SCALE)
+            return self.buttons
+
+
+BACKENDS = {'pygame': USBController, 'dummy': DummyController}
+
+
+class JoystickLoop:
+    """
+    Samples a joystick at a fixed rate on a dedicated thread.
+
+    Each sample is read into a preallocated int16 array and compared with
+    the previous one; `on_change(buttons, axes)` is only called when a
+    button or axis changed, with the bitmask and the array itself (copy it
+    if you keep it). The loop sleeps to absolute deadlines, so the rate does
+    not drift, and skips missed samples instead of bursting. If the joystick
+    goes away, it is reconfigured every `reconnect_interval` seconds.
+    """
+    def __init__(self, backend, on_change, rate_hz: float = 100.0, reconnect_interval: float = 1.0):
+        self.backend = backend
+        self.on_change = on_change
+        self.period = 1.0 / rate_hz
+        self.reconnect_interval = reconnect_interval
+        self.axes = array('h', bytes(2 * MAX_AXES))
+        self.previous_axes = array('h', bytes(2 * MAX_AXES))
+        self.buttons = 0
+        self.samples = 0
+        self.changes = 0
+        self.overruns = 0
+        self.max_lateness = 0.0
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = Thread(target=self._run, name="joystick", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def sample(self) -> bool:
+        """
+        Reads one sample and reports a change. Returns True if anything changed.
+        """
+        buttons = self.backend.read_into(self.axes)
+        self.samples += 1
+        if buttons == self.buttons and self.axes == self.previous_axes:
+            return False
+        self.buttons = buttons
+        self.previous_axes[:] = self.axes
+        self.changes += 1
+        self.on_change(buttons, self.axes)
+        return True
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self.stopped.is_set():
+            if not self.backend.is_connected():
+                self.backend.configure()
+                if not self.backend.is_connected():
+                    self.stopped.wait(self.reconnect_interval)
+                    deadline = time.monotonic()
+                    continue
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error("Joystick read failed: %s", e)
+                self.backend.connected = False
+                # A device that opens but fails every read would otherwise be reopened in a tight loop
+                self.stopped.wait(self.reconnect_interval)
+                deadline = time.monotonic()
+                continue
+            deadline += self.period
+            now = time.monotonic()
+            if now > deadline:
+                self.overruns += int((now - deadline) / self.period) + 1
+                deadline = now  # Fell behind; skip missed samples instead of bursting
+                continue
+            self.stopped.wait(deadline - now)
+            self.max_lateness = max(self.max_lateness, time.monotonic() - deadline)
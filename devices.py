@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+File: devices.py
+Author: Jan Kühnemund
+Description: Registry of the rotators served by one process, configured from DEVICES_FILE.
+
+DEVICES_FILE (default devices.json) maps device names to their UART
+settings, in the order the devices are listed:
+
+    {"uhf":   {"port": "/dev/ttyUSB0", "baudrate": 115200},
+     "sband": {"port": "/dev/ttyUSB1", "checksum": "crc16"}}
+
+Settings left out fall back to the UART_* variables. Without the file there
+is a single device named "default", configured by UART_* alone.
+
+Every device gets its own AsyncUARTCommunication, setpoint streamer,
+WebSocket hub and gamepad mapping. WebSocket clients receive the
+latency-corrected position estimate on every report and, while the rotator
+moves, POSITION_ESTIMATE_RATE_HZ times per second in between. All serial ports are registered with the
+same event loop, so N devices cost N file descriptors and no threads.
+Ports are opened in the background by a UARTSupervisor (hotplug.py) and
+reopened when an adapter is replugged.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import serial
+from async_uart import AsyncUARTCommunication
+from broadcast import PositionHub
+from hotplug import UARTSupervisor
+from input_mapper import InputMapper
+from setpoint_stream import SetpointStreamer, velocity_payload
+from uart_comm import SET_VELOCITY_COMMAND_ID
+from uart_owner import OwnerConnection, UARTProxy, RemoteSetpoints
+
+DEFAULT_DEVICE = 'default'
+UART_OPTIONS = ('port', 'baudrate', 'timeout', 'checksum')
+NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,32}')  # Device names appear in URLs
+
+
+def load_device_config(path: str = None) -> dict:
+    """
+    Returns {name: {option: value}} from DEVICES_FILE. Raises ValueError if the file is invalid.
+    """
+    path = path or os.getenv('DEVICES_FILE', 'devices.json')
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {DEFAULT_DEVICE: {}}
+    if not isinstance(config, dict) or not config:
+        raise ValueError(f"{path} must map device names to UART settings")
+    for name, options in config.items():
+        if not NAME_PATTERN.fullmatch(name):
+            raise ValueError(f"Invalid device name {name!r}: use up to 32 letters, digits, '-' or '_'")
+        if not isinstance(options, dict):
+            raise ValueError(f"Settings of {name} must be an object")
+        unknown = set(options) - set(UART_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown settings for {name}: {', '.join(sorted(unknown))}")
+    return config
+
+
+def create_uart(options: dict) -> AsyncUARTCommunication:
+    """
+    Creates the UART link of one device from its settings.
+    """
+    uart = AsyncUARTCommunication(port=options.get('port'), baudrate=options.get('baudrate'),
+                                  timeout=options.get('timeout'))
+    if 'checksum' in options:
+        uart.preferred_checksum = options['checksum']
+    return uart
+
+
+class Device:
+    """
+    One rotator: its UART link (or a UARTProxy of it), setpoint streamer,
+    WebSocket hub and gamepad mapping. A local link comes with the
+    `supervisor` that attaches it.
+    """
+    def __init__(self, name: str, uart, streamer, mapping_path: str = None, supervisor: UARTSupervisor = None):
+        self.name = name
+        self.uart = uart
+        self.streamer = streamer
+        self.supervisor = supervisor
+        # Position updates are pushed from process_data_message to every WebSocket client of this device
+        self.hub = PositionHub(frame_time=lambda: uart.received_at)
+        uart.add_position_listener(self.publish_position)
+        rate_hz = float(os.getenv('POSITION_ESTIMATE_RATE_HZ', '50'))
+        self.estimate_interval = 1.0 / rate_hz if rate_hz > 0 else None
+        self.estimate_task = None
+        self.axis_state = {'move_x': 0.0, 'move_y': 0.0}
+        # Saved gamepad mapping, compiled into index -> handler tables bound to this device
+        self.input_mapper = InputMapper(
+            button_actions={action: (lambda action=action: self.handle_action(action)) for action in ('arm', 'disarm')},
+            axis_actions={action: (lambda value, action=action: self.handle_axis_action(action, value))
+                          for action in self.axis_state},
+            path=mapping_path,
+        )
+
+    async def start(self):
+        """
+        Starts serving the device. A local UART is attached in the background; a proxy keeps reconnecting to the
+        UART owner in the background once it was started.
+        """
+        self.input_mapper.load()
+        if self.supervisor:
+            self.supervisor.start()
+        else:
+            await self.uart.connect()
+            if not self.uart.is_connected():
+                logging.error("UART of device %s is not connected. UART port might be unavailable.", self.name)
+        self.streamer.start()
+        if self.estimate_interval:
+            self.estimate_task = asyncio.get_running_loop().create_task(self._publish_estimates())
+
+    def stop(self):
+        if self.estimate_task:
+            self.estimate_task.cancel()
+            self.estimate_task = None
+        if self.supervisor:
+            self.supervisor.stop()
+        self.streamer.stop()
+        self.uart.close()
+
+    def publish_position(self, report: dict):
+        # Clients get the report corrected for its age rather than the raw report
+        self.hub.publish(self.uart.get_current_position())
+
+    async def _publish_estimates(self):
+        """
+        Publishes extrapolated positions between reports while the rotator moves.
+        """
+        while True:
+            await asyncio.sleep(self.estimate_interval)
+            if not self.hub.subscribers:
+                continue
+            estimate = self.uart.get_position_estimate()
+            if (estimate is None or estimate['age'] > self.uart.estimator.max_horizon
+                    or not (estimate['azimuth_velocity'] or estimate['elevation_velocity'])):
+                continue
+            self.hub.publish({'azimuth': estimate['azimuth'], 'elevation': estimate['elevation']},
+                             time.perf_counter())
+
+    def handle_action(self, action):
+        # Implement the action, e.g., send command via UART
+        if action == 'arm':
+            self.uart.post_command(0x01, b'')  # Command to arm
+        elif action == 'disarm':
+            self.uart.post_command(0x02, b'')  # Command to disarm
+        # Add more actions as needed
+
+    def handle_axis_action(self, action, value):
+        # Axis actions update the velocity setpoint; the streamer sends only the latest value
+        if action in self.axis_state:
+            self.axis_state[action] = float(value)
+            self.streamer.update(SET_VELOCITY_COMMAND_ID,
+                                 velocity_payload(self.axis_state['move_x'], self.axis_state['move_y']))
+        # Add more axis actions as needed
+
+
+class DeviceRegistry:
+    """
+    The devices of this station by name, in configuration order.
+
+    The first device is the default one behind the original single-device
+    routes. All devices share one gamepad mapping file.
+    """
+    def __init__(self, devices: list):
+        self.devices = {device.name: device for device in devices}
+
+    @classmethod
+    def from_config(cls, config: dict = None, owner_socket: str = None, mapping_path: str = None):
+        """
+        Creates local UART links, or proxies to a UARTOwner serving `owner_socket` (production workers).
+        """
+        config = load_device_config() if config is None else config
+        devices = []
+        if owner_socket:
+            connection = OwnerConnection(owner_socket)  # One socket for all devices of the owner
+            for name in config:
+                proxy = UARTProxy(connection, name)
+                devices.append(Device(name, proxy, RemoteSetpoints(proxy), mapping_path))
+        else:
+            rate_hz = float(os.getenv('SETPOINT_RATE_HZ', '50'))
+            for name, options in config.items():
+                uart = create_uart(options)
+                # Axis input is coalesced into velocity setpoints streamed at a fixed rate without ACKs
+                devices.append(Device(name, uart, SetpointStreamer(uart, max_rate_hz=rate_hz), mapping_path,
+                                      UARTSupervisor(uart)))
+        return cls(devices)
+
+    def __getitem__(self, name: str) -> Device:
+        return self.devices[name]
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+    @property
+    def default(self) -> Device:
+        return next(iter(self.devices.values()))
+
+    async def start(self):
+        """
+        Starts all devices on the running event loop; returns before local UARTs are attached.
+        """
+        await asyncio.gather(*(device.start() for device in self))
+
+    async def wait_attached(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for every local UART to be open. Returns True if they are.
+        """
+        try:
+            await asyncio.gather(*(device.uart.wait_attached(timeout) for device in self if device.supervisor))
+        except serial.SerialException:
+            return False
+        return True
+
+    def stop(self):
+        for device in self:
+            device.stop()
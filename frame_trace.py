@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+File: frame_trace.py
+Author: Jan Kühnemund
+Description: Compact binary trace of UART frames, replacing hex dumps in the log.
+
+Each record is a little-endian header (monotonic time in ns, direction,
+frame length) followed by the raw frame. Enable it with UART_FRAME_TRACE=path
+and print a trace with:
+    python -m frame_trace path
+"""
+
+import struct
+import sys
+import time
+from threading import Lock
+
+RECORD_HEADER = struct.Struct('<QBH')  # monotonic_ns, direction, length
+RX = 0
+TX = 1
+DIRECTIONS = {RX: 'rx', TX: 'tx'}
+
+
+class FrameTrace:
+    """
+    Appends frames to a buffered trace file.
+
+    Recording a frame is one struct.pack and two buffered writes; nothing
+    is formatted until the trace is read back.
+    """
+    def __init__(self, path: str, buffer_size: int = 1 << 16):
+        self.path = path
+        self.file = open(path, 'ab', buffering=buffer_size)
+        self.lock = Lock()  # RX and TX are recorded from different threads
+
+    def record(self, direction: int, frame):
+        header = RECORD_HEADER.pack(time.monotonic_ns(), direction, len(frame))
+        with self.lock:
+            self.file.write(header)
+            self.file.write(frame)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def read_trace(path: str):
+    """
+    Yields (monotonic_ns, direction, frame) for every record in a trace file.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        timestamp, direction, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        yield timestamp, direction, data[offset:offset + length]
+        offset += length
+
+
+def main():
+    start = None
+    for timestamp, direction, frame in read_trace(sys.argv[1]):
+        start = timestamp if start is None else start
+        print(f"{(timestamp - start) / 1e6:12.3f} ms {DIRECTIONS.get(direction, '??')} {frame.hex(' ')}")
+
+
+if __name__ == "__main__":
+    main()
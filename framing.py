@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+File: framing.py
+Author: Jan Kühnemund
+Description: Incremental, zero-copy frame parser for the UART protocol.
+"""
+
+import logging
+from metrics import RESYNCS
+
+START_BYTE = 0x02
+END_BYTE = 0x03
+FRAMING_OVERHEAD = 5  # START, MESSAGE_ID, COMMAND_ID, LENGTH and END, without the checksum
+
+
+class FrameParser:
+    """
+    Splits a byte stream into START/ID/CMD/LEN/PAYLOAD/CHK/END frames.
+
+    Bytes are kept in a fixed bytearray with read and write offsets. Frames
+    are yielded as memoryview slices of that array, so nothing is copied per
+    frame; a yielded frame is only valid until the generator is resumed.
+    Unread bytes are moved to the front of the array only when the tail runs
+    out of room. On garbage or a misplaced END_BYTE the parser resyncs by
+    scanning forward to the next START_BYTE rather than dropping everything.
+
+    `checksum_size` is the width of the checksum field (1 for XOR, 2 for
+    CRC-16) and may be changed between feeds when the protocol is switched.
+    """
+    def __init__(self, capacity: int = 4096, checksum_size: int = 1):
+        self.capacity = capacity
+        self.checksum_size = checksum_size
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.read_offset = 0
+        self.write_offset = 0
+        self.resyncs = 0  # Times the parser had to skip bytes to find a frame
+
+    def __len__(self):
+        return self.write_offset - self.read_offset
+
+    def clear(self):
+        """
+        Discards all buffered bytes.
+        """
+        self.read_offset = self.write_offset = 0
+
+    def feed(self, data):
+        """
+        Appends `data` and yields every complete frame as a memoryview.
+        """
+        data = memoryview(data)
+        while data:
+            data = data[self._append(data):]
+            yield from self._frames()
+
+    def _append(self, data) -> int:
+        """
+        Copies as much of `data` as fits and returns the number of bytes taken.
+        """
+        if self.write_offset == self.capacity:
+            unread = self.write_offset - self.read_offset
+            if unread == self.capacity:
+                # A full buffer cannot hold a valid frame; drop it and resync
+                logging.error("Frame buffer overflow. Discarding buffered bytes.")
+                self._resync()
+                unread = 0
+            else:
+                self.view[:unread] = self.view[self.read_offset:self.write_offset]
+            self.read_offset = 0
+            self.write_offset = unread
+        count = min(len(data), self.capacity - self.write_offset)
+        self.view[self.write_offset:self.write_offset + count] = data[:count]
+        self.write_offset += count
+        return count
+
+    def _resync(self):
+        self.resyncs += 1
+        RESYNCS.inc()
+
+    def _frames(self):
+        buffer = self.buffer
+        min_length = FRAMING_OVERHEAD + self.checksum_size
+        while self.write_offset - self.read_offset >= min_length:
+            start = self.read_offset
+            if buffer[start] != START_BYTE:
+                start = buffer.find(START_BYTE, start, self.write_offset)
+                self._resync()
+                if start < 0:
+                    logging.debug("START_BYTE not found in buffer. Discarding buffered bytes.")
+                    self.read_offset = self.write_offset
+                    return
+                self.read_offset = start
+                continue
+            end = start + min_length + buffer[start + 3]
+            if end > self.write_offset:
+                return  # Incomplete frame, wait for more data
+            if buffer[end - 1] != END_BYTE:
+                logging.error("END_BYTE not found where expected. Resyncing to next START_BYTE.")
+                self.read_offset = start + 1
+                self._resync()
+                continue
+            self.read_offset = end
+            yield self.view[start:end]
+        if self.read_offset == self.write_offset:
+            self.read_offset = self.write_offset = 0
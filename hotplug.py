@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+File: hotplug.py
+Author: Jan Kühnemund
+Description: Background attach of UART ports and reconnection when a USB-serial adapter is replugged.
+
+UARTSupervisor opens a device's port without holding up startup and keeps
+it open: when the port is lost it waits for the device node to come back
+and reopens it with exponential backoff. Commands in flight at the time
+wait for the new port and are sent again.
+
+On Linux the node's directory is watched with inotify (through ctypes,
+so without extra dependencies): an adapter showing up as /dev/ttyUSB0,
+or its /dev/serial/by-id link, is noticed as soon as udev creates it.
+Elsewhere, or if inotify is unavailable, the supervisor polls.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+
+IN_ATTRIB = 0x004  # udev fixing up permissions of a new node
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_IGNORED = 0x8000  # The watch is gone, e.g. /dev/serial/by-id was removed with the last adapter
+WATCH_MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch  # Missing on very old C libraries
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class PortWatcher:
+    """
+    Signals changes in the directory of a device node.
+
+    wait() returns when an entry of the directory is created, removed or
+    changed, or after a timeout, whichever comes first; callers then check
+    the node themselves. Without inotify, wait() only ever times out.
+    """
+    def __init__(self, path: str):
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.libc = _libc()
+        self.fd = None
+        self.wd = None
+        self.changed = None  # Future resolved by the next change
+
+    @property
+    def watching(self) -> bool:
+        return self.wd is not None
+
+    def start(self):
+        """
+        Registers the inotify descriptor with the running event loop. Returns False if the watcher polls instead.
+        """
+        if self.libc is None:
+            return False
+        fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            logging.warning("inotify unavailable (%s). Polling for UART devices.", os.strerror(ctypes.get_errno()))
+            return False
+        self.fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._read)
+        return self._watch()
+
+    def _watch(self) -> bool:
+        # The directory itself may come and go (/dev/serial/by-id), so this is retried on every wait()
+        if self.fd is None or self.wd is not None:
+            return self.wd is not None
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(self.directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error != errno.ENOENT:
+                logging.warning("Cannot watch %s: %s", self.directory, os.strerror(error))
+            return False
+        self.wd = wd
+        return True
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_IGNORED and wd == self.wd:
+                self.wd = None
+        if self.changed is not None and not self.changed.done():
+            self.changed.set_result(None)
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for a change. Returns True if there was one.
+        """
+        self._watch()
+        self.changed = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.changed, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.changed = None
+
+    def close(self):
+        if self.fd is not None:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = self.wd = None
+
+
+class UARTSupervisor:
+    """
+    Attaches an AsyncUARTCommunication in the background and reattaches it after it is lost.
+
+    start() returns at once. The port is opened as soon as its device node
+    exists; failed attempts are retried after `min_backoff` seconds,
+    doubling up to `max_backoff`, or as soon as the node's directory
+    changes. While the port is down, commands in flight wait up to
+    `reattach_timeout` seconds for it (see AsyncUARTCommunication).
+    """
+    def __init__(self, uart, min_backoff: float = 0.1, max_backoff: float = None, reattach_timeout: float = None):
+        self.uart = uart
+        self.min_backoff = min_backoff
+        if max_backoff is None:
+            max_backoff = float(os.getenv('UART_RECONNECT_MAX_BACKOFF', '5'))
+        self.max_backoff = max_backoff
+        if reattach_timeout is None:
+            reattach_timeout = float(os.getenv('UART_REATTACH_TIMEOUT', '10'))
+        uart.reattach_timeout = reattach_timeout
+        self.watcher = None
+        self.task = None
+        self.attempts = 0  # Times the port was opened or tried
+        self.attaches = 0  # Times it was opened
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        uart = self.uart
+        if not uart.port:
+            await uart.connect()  # Logs the missing UART_PORT
+            return
+        self.watcher = PortWatcher(uart.port)
+        if not self.watcher.start():
+            logging.info("Polling for %s every %.1f to %.1f s.", uart.port, self.min_backoff, self.max_backoff)
+        backoff = self.min_backoff
+        try:
+            while True:
+                if uart.is_connected():
+                    await uart.wait_lost()
+                    backoff = self.min_backoff
+                    continue
+                if os.path.exists(uart.port):
+                    self.attempts += 1
+                    await uart.connect()
+                    if uart.is_connected():
+                        self.attaches += 1
+                        if self.attaches > 1:
+                            logging.info("UART port %s reattached.", uart.port)
+                        continue
+                await self.watcher.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            self.watcher.close()
+            self.watcher = None
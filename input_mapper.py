@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+File: input_mapper.py
+Author: Jan Kühnemund
+Description: Compiles saved gamepad mappings into dense lookup tables and applies them per frame.
+
+A mapping is the dict posted to /save-mapping. Buttons map to action
+names; axes map to an action name or to a dict with shaping options:
+
+    {"button_0": "arm", "button_1": "disarm", "axis_0": "move_x",
+     "axis_1": {"action": "move_y", "deadzone": 0.1, "scale": -1.0, "curve": 2.0}}
+"""
+
+import json
+import logging
+import os
+from ws_protocol import MAX_AXES, MAX_BUTTONS, AXIS_SCALE, decode_gamepad
+
+
+class AxisBinding:
+    """
+    An axis mapped to an action, with deadzone, output scale and response curve.
+
+    The curve is an exponent applied to the magnitude after the deadzone,
+    so 1.0 is linear and larger values give finer control near the centre.
+    """
+    __slots__ = ('action', 'handler', 'deadzone', 'scale', 'curve')
+
+    def __init__(self, action: str, handler, deadzone: float = 0.05, scale: float = 1.0, curve: float = 1.0):
+        if not 0.0 <= deadzone < 1.0:
+            raise ValueError(f"Deadzone of {action} must be in [0, 1)")
+        if curve <= 0:
+            raise ValueError(f"Curve of {action} must be positive")
+        self.action = action
+        self.handler = handler
+        self.deadzone = deadzone
+        self.scale = scale
+        self.curve = curve
+
+    def shape(self, value: float) -> float:
+        magnitude = abs(value)
+        if magnitude <= self.deadzone:
+            return 0.0
+        magnitude = min(1.0, (magnitude - self.deadzone) / (1.0 - self.deadzone))
+        if self.curve != 1.0:
+            magnitude **= self.curve
+        return (magnitude if value > 0 else -magnitude) * self.scale
+
+
+class CompiledMapping:
+    """
+    Dense tables built from a mapping: one handler slot per button index
+    and a list of (axis index, AxisBinding) for the mapped axes only.
+    """
+    def __init__(self, mapping: dict, button_actions: dict, axis_actions: dict):
+        self.mapping = dict(mapping)
+        self.buttons = [None] * MAX_BUTTONS
+        self.axes = []
+        for key, target in mapping.items():
+            kind, _, index = key.rpartition('_')
+            if kind not in ('button', 'axis') or not index.isdigit():
+                raise ValueError(f"Unknown input: {key}")
+            index = int(index)
+            if kind == 'button':
+                if index >= MAX_BUTTONS:
+                    raise ValueError(f"Button index out of range: {key}")
+                if not isinstance(target, str) or target not in button_actions:
+                    raise ValueError(f"Unknown button action for {key}: {target}")
+                self.buttons[index] = button_actions[target]
+            else:
+                if index >= MAX_AXES:
+                    raise ValueError(f"Axis index out of range: {key}")
+                if isinstance(target, str):
+                    target = {'action': target}
+                if not isinstance(target, dict):
+                    raise ValueError(f"Invalid target for {key}: {target!r}")
+                options = dict(target)
+                action = options.pop('action', None)
+                if action not in axis_actions:
+                    raise ValueError(f"Unknown axis action for {key}: {action}")
+                try:
+                    binding = AxisBinding(action, axis_actions[action], **{k: float(v) for k, v in options.items()})
+                except TypeError as e:
+                    raise ValueError(f"Invalid options for {key}: {e}")
+                self.axes.append((index, binding))
+        self.axes.sort(key=lambda item: item[0])
+
+
+class InputSession:
+    """
+    Per-connection state: held buttons and the last value sent per axis.
+
+    Always applies the mapper's current table, so a newly saved mapping
+    takes effect on the next frame.
+    """
+    def __init__(self, mapper):
+        self.mapper = mapper
+        self.pressed = 0  # Button bitmask of the previous frame
+        self.last = [0.0] * MAX_AXES  # Shaped value last handed to each axis handler
+
+    def apply(self, buttons: int, axes):
+        """
+        Fires button handlers on press edges and axis handlers on meaningful changes.
+
+        `axes` holds raw int16 values, as in a binary gamepad frame.
+        """
+        table = self.mapper.table
+        new = buttons & ~self.pressed
+        self.pressed = buttons
+        while new:
+            bit = new & -new
+            new ^= bit
+            handler = table.buttons[bit.bit_length() - 1]
+            if handler is not None:
+                handler()
+        epsilon = self.mapper.epsilon
+        last = self.last
+        for index, binding in table.axes:
+            value = binding.shape(axes[index] / AXIS_SCALE)
+            previous = last[index]
+            if value != previous and (abs(value - previous) >= epsilon or value == 0.0):
+                last[index] = value
+                binding.handler(value)
+
+    def apply_frame(self, data: bytes):
+        """
+        Applies a binary gamepad frame; malformed frames are ignored.
+        """
+        try:
+            buttons, axes = decode_gamepad(data)
+        except ValueError:
+            logging.debug("Ignoring malformed gamepad frame of %d bytes", len(data))
+            return
+        self.apply(buttons, axes)
+
+    def apply_json(self, message: dict):
+        """
+        Applies a JSON gamepad frame with `button_<i>`/`axis_<i>` keys.
+
+        Raises ValueError for a frame of the wrong shape; nothing is applied then.
+        """
+        if not isinstance(message, dict):
+            raise ValueError("Gamepad frame must be an object")
+        pressed, values = message.get('buttons', {}), message.get('axes', {})
+        if not isinstance(pressed, dict) or not isinstance(values, dict):
+            raise ValueError("Gamepad buttons and axes must be objects")
+        buttons = 0
+        for key, is_pressed in pressed.items():
+            index = self.mapper.button_indices.get(key)
+            if index is not None and is_pressed:
+                buttons |= 1 << index
+        axes = [0] * MAX_AXES
+        for key, value in values.items():
+            index = self.mapper.axis_indices.get(key)
+            if index is not None:
+                if not isinstance(value, (int, float)):
+                    raise ValueError(f"Invalid value for {key}: {value!r}")
+                axes[index] = round(max(-1.0, min(1.0, float(value))) * AXIS_SCALE)
+        self.apply(buttons, axes)
+
+
+class InputMapper:
+    """
+    Holds the compiled mapping, validates and persists new ones.
+
+    `button_actions` maps action names to callables without arguments,
+    `axis_actions` maps action names to callables taking the shaped value.
+    """
+    def __init__(self, button_actions: dict, axis_actions: dict, path: str = None, epsilon: float = 0.01):
+        self.button_actions = button_actions
+        self.axis_actions = axis_actions
+        self.path = path or os.getenv('INPUT_MAPPING_FILE', 'input_mapping.json')
+        self.epsilon = epsilon  # Smallest axis change worth a handler call
+        self.button_indices = {f'button_{index}': index for index in range(MAX_BUTTONS)}
+        self.axis_indices = {f'axis_{index}': index for index in range(MAX_AXES)}
+        self.table = CompiledMapping({}, button_actions, axis_actions)
+        self.mtime = None  # Modification time of the file last loaded or saved
+
+    @property
+    def mapping(self) -> dict:
+        return self.table.mapping
+
+    def compile(self, mapping: dict):
+        """
+        Replaces the active mapping. Raises ValueError if it is invalid.
+        """
+        self.table = CompiledMapping(mapping, self.button_actions, self.axis_actions)
+
+    def session(self) -> InputSession:
+        return InputSession(self)
+
+    def save(self):
+        """
+        Writes the active mapping to disk atomically.
+        """
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(self.mapping, f, indent=2)
+        os.replace(temporary, self.path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def load(self) -> bool:
+        """
+        Compiles the mapping saved on disk. Returns False if there is none or it is invalid.
+        """
+        try:
+            self.mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                self.compile(json.load(f))
+        except FileNotFoundError:
+            return False
+        except (ValueError, OSError) as e:
+            logging.error("Ignoring input mapping in %s: %s", self.path, e)
+            return False
+        logging.info("Loaded input mapping from %s", self.path)
+        return True
+
+    def refresh(self) -> bool:
+        """
+        Reloads the mapping if the file changed since it was last loaded or saved.
+
+        Lets several processes share one mapping file.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        return mtime != self.mtime and self.load()
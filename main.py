@@ -3,10 +3,50 @@
 File: main.py
 Author: Jan Kühnemund
 Description: Main entry point for the FastAPI application.
+
+    python main.py [--reload]                   development server, reloading on code changes with --reload
+    python main.py --production [--workers N]   one UART owner process and N HTTP workers
+
+In production mode the UART owner (uart_owner.py) opens the serial ports of
+all devices (devices.py) and the workers reach it through UART_OWNER_SOCKET;
+uvloop and httptools are used when they are installed. Either way the
+server answers requests while the UARTs are still being attached.
 """
 
-from utils import setup_logging
+import argparse
+import logging
+import os
+from utils import load_config, setup_logging
 import uvicorn
 
+
+def run_production(host: str, port: int, workers: int):
+    from uart_owner import DEFAULT_SOCKET, start_owner_process
+    socket_path = os.environ.setdefault('UART_OWNER_SOCKET', DEFAULT_SOCKET)  # Inherited by the workers
+    if workers > 1 and os.getenv('JOYSTICK_BACKEND', 'none') != 'none':
+        logging.warning("A local joystick needs a single worker; disabling JOYSTICK_BACKEND.")
+        os.environ['JOYSTICK_BACKEND'] = 'none'
+    owner = start_owner_process(socket_path)
+    try:
+        uvicorn.run("api:app", host=host, port=port, workers=workers, reload=False,
+                    loop="auto", http="auto", access_log=False)
+    finally:
+        owner.terminate()
+        owner.join(timeout=5)
+
+
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
+    load_config()
+    parser = argparse.ArgumentParser(description="Tracking Groundstation server")
+    parser.add_argument('--production', action='store_true', help="Separate UART owner process")
+    parser.add_argument('--reload', action='store_true',
+                        help="Restart on code changes (a watcher process, and the UART reopened on every restart)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="HTTP worker processes in production mode")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    if args.production:
+        setup_logging()
+        run_production(args.host, args.port, args.workers)
+    else:
+        uvicorn.run("api:app", host=args.host, port=args.port, reload=args.reload)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+File: mcu_simulator.py
+Author: Jan Kühnemund
+Description: Fake rotator firmware on a Linux pty for tests and benchmarks.
+"""
+
+import os
+import tty
+import time
+import heapq
+import random
+import struct
+import logging
+import selectors
+from threading import Thread, Lock
+from retransmission import RetransmissionScheduler
+from framing import START_BYTE, END_BYTE, FRAMING_OVERHEAD
+from checksum import XOR, SCHEMES, CAP_CRC16
+from batching import BATCH_COMMAND_ID, BATCH_RESULT_ID, CAP_BATCH, RESULT_OK, encode_batch, decode_batch
+from clock_sync import CAP_TIMESTAMPS, MCU_TIME, MCU_TIME_WRAP
+
+ACK_COMMAND_ID = 0x06
+GET_CAPABILITIES_COMMAND_ID = 0x0A
+CAPABILITIES_REPORT_ID = 0x0B
+SET_PROTOCOL_COMMAND_ID = 0x0C
+STREAM_FLAG = 0x80
+SET_POSITION_COMMAND_ID = 0x03
+ARM_COMMAND_ID = 0x01
+DISARM_COMMAND_ID = 0x02
+STATUS_COMMAND_ID = 0x07
+STATUS_REPORT_ID = 0x08
+STATUS_REPORT = struct.Struct('>BHI')  # State (1 = armed), error flags, uptime in seconds
+INVALID_COMMAND = 0x01  # Batch result code of sub-commands that cannot appear in a batch
+
+
+class FakeMCU:
+    """
+    Emulates the microcontroller side of the UART link on a pseudo terminal.
+
+    `port` is the slave device path that `UARTCommunication` can open. Every
+    well-formed command is answered with an ACK carrying `message_id + 1`,
+    except streamed setpoints (COMMAND_ID with STREAM_FLAG); frames with a
+    bad checksum are dropped without an ACK. Status requests (0x07) are
+    answered with a 0x08 report after the ACK. Batches (0x15) are recorded
+    and handled sub-command by sub-command and answered with a 0x16 batch
+    result instead of an ACK. Once the host enables CAP_TIMESTAMPS, every
+    outgoing payload ends with the MCU clock: microseconds since start()
+    plus `boot_time` seconds.
+
+    Impairments for tests and benchmarks:
+    - `report_rate_hz`: emit 0x09 position reports of `position` at this rate
+    - `loss`: probability of dropping a frame, in either direction
+    - `corruption`: probability of flipping one byte of an outgoing frame
+    - `delay`: seconds every outgoing frame is held back
+    - `baudrate`: emulate a serial link of this speed; a command is only
+      answered once its bytes could have arrived, and outgoing frames
+      queue up behind each other for 10 bits per byte
+    """
+    def __init__(self, capabilities: int = CAP_CRC16 | CAP_BATCH | CAP_TIMESTAMPS, cumulative_acks: bool = False,
+                 report_rate_hz: float = 0.0, loss: float = 0.0, corruption: float = 0.0, delay: float = 0.0,
+                 seed: int = None, baudrate: int = None, boot_time: float = 0.0):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.buffer = bytearray()
+        self.received = []  # (message_id, command_id, payload) of every parsed command
+        self.capabilities = capabilities
+        self.checksum = XOR
+        self.timestamps = False  # Enabled by SET_PROTOCOL with CAP_TIMESTAMPS
+        self.boot_time = boot_time
+        self.acks = AckGenerator() if cumulative_acks else None
+        self.report_rate_hz = report_rate_hz
+        self.position = [0, 0]  # Reported azimuth/elevation, moved by SET_POSITION commands
+        self.armed = False
+        self.errors = 0  # Error flags in status reports
+        self.started = time.monotonic()
+        self.loss = loss
+        self.corruption = corruption
+        self.delay = delay
+        self.baudrate = baudrate
+        self.rx_clock = 0.0  # When the last received frame finished arriving on the emulated wire
+        self.tx_clock = 0.0  # When the emulated wire is free for the next outgoing frame
+        self.batches = 0  # Batch frames received
+        self.random = random.Random(seed)
+        self.outgoing = []  # (due, sequence, frame) held back by `delay`
+        self.sequence = 0
+        self.frames_dropped = 0
+        self.frames_corrupted = 0
+        self.write_lock = Lock()
+        self.running = False
+        self.thread = None
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def start(self):
+        """
+        Starts answering commands in a background thread.
+        """
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background thread and releases the pty.
+        """
+        self.running = False
+        os.write(self._wakeup_w, b'\0')
+        if self.thread:
+            self.thread.join(timeout=1)
+        for fd in (self.master_fd, self.slave_fd, self._wakeup_r, self._wakeup_w):
+            os.close(fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def build_frame(message_id: int, command_id: int, payload: bytes = b'', checksum=XOR) -> bytes:
+        """
+        Builds a frame using the START/ID/CMD/LEN/PAYLOAD/CHK/END layout.
+        """
+        body = bytes([message_id, command_id, len(payload)]) + payload
+        return bytes([START_BYTE]) + body + checksum.pack(checksum.compute(body)) + bytes([END_BYTE])
+
+    def write(self, data: bytes):
+        """
+        Writes raw bytes towards the host, bypassing all impairments.
+        """
+        with self.write_lock:
+            os.write(self.master_fd, data)
+
+    def clock(self) -> int:
+        """
+        The MCU clock in microseconds, as sent in MCU_TIME.
+        """
+        return int((time.monotonic() - self.started + self.boot_time) * 1e6) % MCU_TIME_WRAP
+
+    def send_frame(self, message_id: int, command_id: int, payload: bytes = b''):
+        """
+        Sends a single frame towards the host, subject to loss, corruption and delay.
+        """
+        if self.timestamps:
+            payload = bytes(payload) + MCU_TIME.pack(self.clock())
+        frame = self.build_frame(message_id, command_id, payload, self.checksum)
+        if self.loss and self.random.random() < self.loss:
+            self.frames_dropped += 1
+            return
+        if self.corruption and self.random.random() < self.corruption:
+            frame = bytearray(frame)
+            frame[self.random.randrange(1, len(frame) - 1)] ^= 1 << self.random.randrange(8)
+            frame = bytes(frame)
+            self.frames_corrupted += 1
+        if not self.delay and not self.baudrate:
+            self.write(frame)
+            return
+        with self.write_lock:
+            due = time.monotonic() + self.delay
+            if self.baudrate:
+                due = max(due, self.rx_clock, self.tx_clock) + len(frame) * 10 / self.baudrate
+                self.tx_clock = due
+            self.sequence += 1
+            heapq.heappush(self.outgoing, (due, self.sequence, frame))
+        os.write(self._wakeup_w, b'\0')
+
+    def send_position(self, azimuth: int, elevation: int, message_id: int = 0):
+        """
+        Sends a 0x09 position report.
+        """
+        payload = azimuth.to_bytes(2, 'big') + elevation.to_bytes(2, 'big')
+        self.send_frame(message_id, 0x09, payload)
+
+    def _flush_outgoing(self, now: float) -> float:
+        """
+        Writes delayed frames that are due and returns the time until the next one.
+        """
+        with self.write_lock:
+            while self.outgoing and self.outgoing[0][0] <= now:
+                os.write(self.master_fd, heapq.heappop(self.outgoing)[2])
+            return self.outgoing[0][0] - now if self.outgoing else None
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.master_fd, selectors.EVENT_READ)
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        period = 1.0 / self.report_rate_hz if self.report_rate_hz else None
+        next_report = time.monotonic()
+        try:
+            while self.running:
+                now = time.monotonic()
+                if period and now >= next_report:
+                    self.send_position(*self.position)
+                    next_report = max(next_report + period, now)
+                timeouts = [t for t in (self._flush_outgoing(now), period and next_report - now) if t]
+                for key, _ in selector.select(min(timeouts, default=0.5)):
+                    if not self.running:
+                        break
+                    if key.fd == self._wakeup_r:
+                        os.read(self._wakeup_r, 4096)
+                        continue
+                    try:
+                        data = os.read(self.master_fd, 4096)
+                    except OSError:
+                        return
+                    self.buffer.extend(data)
+                    self._process()
+        finally:
+            selector.close()
+
+    def _process(self):
+        while True:
+            start = self.buffer.find(START_BYTE)
+            if start < 0:
+                self.buffer.clear()
+                return
+            del self.buffer[:start]
+            min_length = FRAMING_OVERHEAD + self.checksum.size
+            if len(self.buffer) < min_length:
+                return
+            length = min_length + self.buffer[3]
+            if len(self.buffer) < length:
+                return
+            frame = bytes(self.buffer[:length])
+            if frame[-1] != END_BYTE:
+                del self.buffer[:1]
+                continue
+            del self.buffer[:length]
+            body = frame[1:4 + frame[3]]
+            if int.from_bytes(frame[4 + frame[3]:-1], 'big') != self.checksum.compute(body):
+                logging.debug("FakeMCU dropped frame with invalid checksum")
+                continue
+            if self.loss and self.random.random() < self.loss:
+                self.frames_dropped += 1
+                continue
+            if self.baudrate:
+                self.rx_clock = max(time.monotonic(), self.rx_clock) + length * 10 / self.baudrate
+            message_id, command_id, payload = frame[1], frame[2], body[3:]
+            if command_id == BATCH_COMMAND_ID and self.capabilities & CAP_BATCH:
+                self._process_batch(message_id, payload)
+                continue
+            self.received.append((message_id, command_id, payload))
+            logging.debug("FakeMCU received command %#04x with MESSAGE_ID %d", command_id, message_id)
+            if command_id != ACK_COMMAND_ID and not command_id & STREAM_FLAG:
+                if self.acks:
+                    self.send_frame(*self.acks.receive(message_id))
+                else:
+                    self.send_frame((message_id + 1) % 256, ACK_COMMAND_ID)
+            self._handle_command(command_id, payload)
+
+    def _process_batch(self, message_id: int, payload: bytes):
+        try:
+            commands = decode_batch(payload)
+        except ValueError:
+            logging.debug("FakeMCU dropped malformed batch")
+            return
+        self.batches += 1
+        results = bytearray()
+        for command_id, sub_payload in commands:
+            if command_id in (ACK_COMMAND_ID, SET_PROTOCOL_COMMAND_ID) or command_id & STREAM_FLAG:
+                results.append(INVALID_COMMAND)
+                continue
+            self.received.append((message_id, command_id, sub_payload))
+            self._handle_command(command_id, sub_payload)
+            results.append(RESULT_OK)
+        if self.acks:
+            self.acks.receive(message_id)  # Keeps the cumulative state in order; the result is the ACK
+        self.send_frame((message_id + 1) % 256, BATCH_RESULT_ID, bytes(results))
+
+    def _handle_command(self, command_id: int, payload: bytes):
+        if command_id == GET_CAPABILITIES_COMMAND_ID:
+            self.send_frame(0, CAPABILITIES_REPORT_ID, bytes([self.capabilities]))
+        elif command_id == SET_PROTOCOL_COMMAND_ID and payload:
+            # Switch only after the ACK went out with the old framing
+            flags = payload[0] & self.capabilities
+            self.checksum = next((scheme for scheme in SCHEMES.values() if scheme.capability & flags), XOR)
+            self.timestamps = bool(flags & CAP_TIMESTAMPS)
+        elif command_id in (ARM_COMMAND_ID, DISARM_COMMAND_ID):
+            self.armed = command_id == ARM_COMMAND_ID
+        elif command_id == STATUS_COMMAND_ID:
+            uptime = int(time.monotonic() - self.started)
+            self.send_frame(0, STATUS_REPORT_ID, STATUS_REPORT.pack(int(self.armed), self.errors, uptime))
+        elif command_id == SET_POSITION_COMMAND_ID and len(payload) >= 8:
+            azimuth, elevation = struct.unpack_from('>ff', payload)
+            self.position = [int(azimuth) % 65536, int(elevation) % 65536]
+
+
+class AckGenerator:
+    """
+    Firmware side of cumulative/selective ACKs.
+
+    Tracks the next in-order MESSAGE_ID and the IDs received ahead of it,
+    and answers each command with an ACK whose MESSAGE_ID is the next
+    expected ID and whose payload is a 32-bit selective-ACK bitmap.
+    """
+    def __init__(self, window: int = 128):
+        self.window = window
+        self.expected = 0
+        self.ahead = set()
+
+    def receive(self, message_id: int):
+        """
+        Records a received command and returns (message_id, command_id, payload) of its ACK.
+        """
+        offset = (message_id - self.expected) % 256
+        if offset == 0:
+            self.expected = (self.expected + 1) % 256
+            while self.expected in self.ahead:
+                self.ahead.discard(self.expected)
+                self.expected = (self.expected + 1) % 256
+        elif offset < self.window:
+            self.ahead.add(message_id)
+        selective = 0
+        for ahead_id in self.ahead:
+            bit = (ahead_id - self.expected - 1) % 256
+            if bit < 32:
+                selective |= 1 << bit
+        return self.expected, ACK_COMMAND_ID, selective.to_bytes(4, 'big')
+
+
+class LinkSimulator:
+    """
+    Discrete-event model of the UART link for protocol experiments.
+
+    Drives a real RetransmissionScheduler on a virtual clock against a
+    firmware model. Each direction serializes bytes at `baudrate` (10 bits
+    per byte), the firmware answers after `turnaround` seconds, and every
+    frame is lost with probability `loss` in either direction. Batch frames
+    are answered with a batch result of one byte per sub-command.
+    """
+    def __init__(self, window_size: int = 8, loss: float = 0.0, baudrate: int = 115200,
+                 turnaround: float = 0.002, cumulative_acks: bool = True, seed: int = 0):
+        self.now = 0.0
+        self.byte_time = 10 / baudrate
+        self.turnaround = turnaround
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.events = []  # (time, sequence, callback, argument)
+        self.sequence = 0
+        self.tx_free = 0.0  # Time the host->MCU line becomes idle
+        self.rx_free = 0.0  # Time the MCU->host line becomes idle
+        self.acks = AckGenerator() if cumulative_acks else None
+        self.scheduler = RetransmissionScheduler(self._transmit, window_size=window_size, clock=lambda: self.now)
+
+    def _at(self, when: float, callback, argument):
+        self.sequence += 1
+        heapq.heappush(self.events, (when, self.sequence, callback, argument))
+
+    def _transmit(self, frame: bytes):
+        self.tx_free = max(self.now, self.tx_free) + len(frame) * self.byte_time
+        if self.random.random() >= self.loss:
+            self._at(self.tx_free, self._mcu_receive, frame)
+
+    def _mcu_receive(self, frame: bytes):
+        message_id = frame[1]
+        if frame[2] == BATCH_COMMAND_ID:
+            if self.acks:
+                self.acks.receive(message_id)  # Keeps the cumulative state in order; the result is the ACK
+            ack_id, payload = (message_id + 1) % 256, bytes(len(decode_batch(frame[4:4 + frame[3]])))
+        elif self.acks:
+            ack_id, _, payload = self.acks.receive(message_id)
+        else:
+            ack_id, payload = (message_id + 1) % 256, b''
+        length = FRAMING_OVERHEAD + 1 + len(payload)
+        self.rx_free = max(self.now + self.turnaround, self.rx_free) + length * self.byte_time
+        if self.random.random() >= self.loss:
+            self._at(self.rx_free, self._host_receive, (ack_id, payload, frame[2] == BATCH_COMMAND_ID))
+
+    def _host_receive(self, ack):
+        ack_id, payload, batch = ack
+        if payload and not batch:
+            self.scheduler.acknowledge_cumulative(ack_id, int.from_bytes(payload, 'big'))
+        else:
+            self.scheduler.acknowledge((ack_id - 1) % 256)
+
+    def run(self, commands: int, payload_length: int = 4, batch_size: int = 1) -> dict:
+        """
+        Sends `commands` commands, `batch_size` per frame, and runs until all are resolved.
+
+        Returns commands/s, transmission counts and failures.
+        """
+        payload = bytes(payload_length)
+        frames = []
+        for first in range(0, commands, batch_size):
+            count = min(batch_size, commands - first)
+            if batch_size == 1:
+                frames.append((0x03, payload))
+            else:
+                frames.append((BATCH_COMMAND_ID, encode_batch([(0x03, payload)] * count)))
+        futures = [self.scheduler.submit(lambda message_id, frame=frame: FakeMCU.build_frame(message_id, *frame))
+                   for frame in frames]
+        while not all(future.done() for future in futures):
+            for _, message in self.scheduler.due(self.now):
+                self._transmit(message.frame)
+            deadline = self.scheduler.next_deadline()
+            next_event = self.events[0][0] if self.events else None
+            candidates = [t for t in (deadline, next_event) if t is not None]
+            if not candidates:
+                break
+            self.now = max(self.now, min(candidates))
+            while self.events and self.events[0][0] <= self.now:
+                _, _, callback, argument = heapq.heappop(self.events)
+                callback(argument)
+        failed = sum(1 for future in futures if future.exception() is not None)
+        return {
+            'commands_per_second': commands / self.now if self.now else 0.0,
+            'elapsed': self.now,
+            'transmissions': self.scheduler.transmissions,
+            'retransmissions': self.scheduler.retransmissions,
+            'failed': failed,
+        }
+
+
+def wait_for(predicate, timeout: float = 2.0, interval: float = 0.001) -> bool:
+    """
+    Polls `predicate` until it returns True or `timeout` seconds elapse.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+File: message_codec.py
+Author: Jan Kühnemund
+Description: Registry of precompiled struct layouts and handlers for UART data messages.
+"""
+
+import logging
+import struct
+
+FRAME_HEADER = struct.Struct('>BBBB')  # START_BYTE, MESSAGE_ID, COMMAND_ID, LENGTH
+
+
+class MessageCodec:
+    """
+    Layout of one data message type.
+
+    `layout` is a precompiled struct.Struct for the payload and `fields` names
+    its values in order. The handler is called with the unpacked values as
+    positional arguments.
+    """
+    __slots__ = ('command_id', 'name', 'layout', 'fields', 'handler')
+
+    def __init__(self, command_id: int, name: str, layout: str, fields: tuple, handler=None):
+        self.command_id = command_id
+        self.name = name
+        self.layout = struct.Struct(layout)
+        self.fields = tuple(fields)
+        self.handler = handler
+
+    def decode(self, payload, offset: int = 0) -> tuple:
+        return self.layout.unpack_from(payload, offset)
+
+    def as_dict(self, values) -> dict:
+        return dict(zip(self.fields, values))
+
+
+class CodecRegistry:
+    """
+    Maps COMMAND_IDs to codecs through a 256-entry table for O(1) dispatch.
+
+    Adding a telemetry type is a single register() call.
+    """
+    def __init__(self):
+        self.table = [None] * 256
+
+    def register(self, command_id: int, name: str, layout: str, fields, handler=None) -> MessageCodec:
+        """
+        Registers (or replaces) the codec for a COMMAND_ID.
+        """
+        codec = MessageCodec(command_id, name, layout, fields, handler)
+        self.table[command_id] = codec
+        return codec
+
+    def lookup(self, command_id: int):
+        return self.table[command_id]
+
+    def __iter__(self):
+        return (codec for codec in self.table if codec is not None)
+
+    def dispatch(self, command_id: int, payload) -> bool:
+        """
+        Decodes `payload` in place and calls the registered handler.
+
+        Returns False if no codec is registered or the payload is too short.
+        """
+        codec = self.table[command_id]
+        if codec is None:
+            return False
+        if len(payload) < codec.layout.size:
+            logging.error("Payload too short for %s data", codec.name)
+            return False
+        if codec.handler is not None:
+            codec.handler(*codec.layout.unpack_from(payload))
+        return True
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+File: metrics.py
+Author: Jan Kühnemund
+Description: Low-overhead counters, fixed-bucket histograms and a sampling profiler, exported in the Prometheus text format.
+
+Metrics are plain objects created once at import and updated inline on the
+hot paths. Counter.inc() and Histogram.observe() take no lock. Most metrics
+have a single writer (the UART reader or the event loop); where two threads
+share one, the GIL can at worst lose an increment, which is a fair trade
+for never contending on the hot path.
+"""
+
+import bisect
+import os
+import sys
+import threading
+from collections import Counter as StackCounter
+
+# Upper bounds in seconds, from UART round trips to slow WebSocket clients
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    """
+    Monotonically increasing count.
+    """
+    __slots__ = ('name', 'description', 'value')
+    type = 'counter'
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def collect(self):
+        return self.value
+
+
+class Gauge:
+    """
+    Value read from `function` at scrape time, so it costs nothing in between.
+    """
+    __slots__ = ('name', 'description', 'function')
+    type = 'gauge'
+
+    def __init__(self, name: str, description: str, function):
+        self.name = name
+        self.description = description
+        self.function = function
+
+    def collect(self):
+        return self.function()
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+
+    counts[i] holds the observations in (bounds[i-1], bounds[i]], the last
+    slot those above every bound; exposition makes them cumulative.
+    """
+    __slots__ = ('name', 'description', 'bounds', 'counts', 'sum')
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def collect(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'sum': self.sum}
+
+
+class Registry:
+    """
+    Named metrics of one process.
+
+    collect() returns plain data that can be sent to another process and
+    merged there, so metrics of the UART owner and a worker end up in one
+    scrape (see uart_owner.py).
+    """
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str, function) -> Gauge:
+        metric = self._register(Gauge(name, description, function))
+        metric.function = function  # The newest owner of a gauge reports it
+        return metric
+
+    def histogram(self, name: str, description: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def collect(self) -> list:
+        """
+        Returns [name, type, description, value] per metric; histogram values are dicts.
+        """
+        return [[metric.name, metric.type, metric.description, metric.collect()] for metric in self.metrics.values()]
+
+
+def merge(*collections) -> list:
+    """
+    Adds up collect() results of several registries, metric by metric.
+    """
+    merged = {}
+    for families in collections:
+        for name, kind, description, value in families:
+            if name not in merged:
+                merged[name] = [name, kind, description, value]
+            elif kind == 'histogram':
+                total = merged[name][3]
+                if total['bounds'] == value['bounds']:
+                    total['counts'] = [a + b for a, b in zip(total['counts'], value['counts'])]
+                    total['sum'] += value['sum']
+            else:
+                merged[name][3] += value
+    return list(merged.values())
+
+
+def render(families) -> str:
+    """
+    Formats collect() results in the Prometheus text exposition format.
+    """
+    lines = []
+    for name, kind, description, value in families:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != 'histogram':
+            lines.append(f"{name} {value}")
+            continue
+        cumulative = 0
+        for bound, count in zip(value['bounds'], value['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += value['counts'][-1]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum {value['sum']}")
+        lines.append(f"{name}_count {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all other threads every `interval` seconds.
+
+    Samples are aggregated in the folded format of flamegraph.pl
+    ("thread;outermost;...;innermost count"). It costs nothing while
+    stopped and can be started and stopped at runtime.
+    """
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval: float = None):
+        if interval:
+            self.interval = interval
+        if self.running:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def clear(self):
+        self.stacks.clear()
+        self.samples = 0
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+REGISTRY = Registry()
+PROFILER = SamplingProfiler()
+
+# UART link, updated by framing.py, retransmission.py, uart_comm.py and async_uart.py
+FRAMES_RECEIVED = REGISTRY.counter('uart_frames_received_total', "Frames parsed from the UART.")
+FRAMES_SENT = REGISTRY.counter('uart_frames_sent_total', "Frames written to the UART, retransmissions included.")
+CHECKSUM_ERRORS = REGISTRY.counter('uart_checksum_errors_total', "Received frames dropped for a bad checksum.")
+RESYNCS = REGISTRY.counter('uart_resyncs_total', "Times the frame parser skipped bytes to find a START_BYTE.")
+RETRANSMISSIONS = REGISTRY.counter('uart_retransmissions_total', "Commands sent again after an ACK timeout.")
+ACK_TIMEOUTS = REGISTRY.counter('uart_ack_timeouts_total', "Commands given up after running out of attempts.")
+UNKNOWN_ACKS = REGISTRY.counter('uart_unknown_acks_total', "ACKs for MESSAGE_IDs not in flight.")
+COMMAND_RTT = REGISTRY.histogram('uart_command_rtt_seconds',
+                                 "Time from sending a command to its ACK, first transmissions only.")
+POSITION_LATENCY = REGISTRY.histogram('uart_position_latency_seconds',
+                                      "Age of position reports when read, from MCU timestamps.")
+
+# WebSocket fan-out, updated by broadcast.py
+FRAME_TO_BROADCAST = REGISTRY.histogram('ws_frame_to_broadcast_seconds',
+                                        "Time from reading a position frame to its WebSocket send completing.")
+WS_SEND = REGISTRY.histogram('ws_send_seconds', "Duration of one WebSocket send.")
+WS_DROPPED = REGISTRY.counter('ws_clients_dropped_total', "WebSocket clients dropped for sending too slowly.")
+GAMEPAD_FRAMES = REGISTRY.counter('ws_gamepad_frames_total', "Gamepad frames received from WebSocket clients.")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+File: position_estimator.py
+Author: Jan Kühnemund
+Description: Alpha-beta tracking of the rotator position, extrapolated to the present.
+
+Position reports are already old when they are read: sampled by the MCU,
+queued, sent at the UART's baud rate and parsed. While the rotator moves,
+the latest report therefore lags behind, and between reports it does not
+change at all. The estimator smooths a velocity out of the reports and
+extrapolates the position to any given time.
+"""
+
+import math
+import os
+
+
+class AxisTracker:
+    """
+    Alpha-beta filter of one axis. `period` wraps positions, e.g. 360 for azimuth.
+    """
+    __slots__ = ('period', 'position', 'velocity')
+
+    def __init__(self, period: float = None):
+        self.period = period
+        self.position = 0.0
+        self.velocity = 0.0
+
+    def difference(self, a: float, b: float) -> float:
+        """
+        a - b, the short way round for wrapped axes.
+        """
+        difference = a - b
+        if self.period:
+            difference = (difference + self.period / 2) % self.period - self.period / 2
+        return difference
+
+    def wrap(self, position: float) -> float:
+        return position % self.period if self.period else position
+
+    def reset(self, measurement: float):
+        self.position = float(measurement)
+        self.velocity = 0.0
+
+    def update(self, measurement: float, dt: float, alpha: float, beta: float, max_rate: float):
+        predicted = self.position + self.velocity * dt
+        residual = self.difference(measurement, predicted)
+        self.position = self.wrap(predicted + alpha * residual)
+        self.velocity = max(-max_rate, min(max_rate, self.velocity + beta * residual / dt))
+
+    def predict(self, dt: float) -> float:
+        return self.wrap(self.position + self.velocity * dt)
+
+
+class PositionEstimator:
+    """
+    Tracks azimuth and elevation from timestamped position reports.
+
+    Reports are whole degrees, so a single one says little about the
+    velocity. The gains follow from `time_constant` and the time since
+    the previous report: alpha = 1 - exp(-dt / time_constant) and the
+    critically damped beta = alpha^2 / (2 - alpha), which smooths over the
+    same time span at any report rate. A report further from the prediction than the rotator could
+    have moved (`max_rate` deg/s, plus `tolerance` degrees for the integer
+    reports) restarts the track instead, so jumps such as the first report
+    after a reconnect leave no phantom velocity. Estimates are not
+    extrapolated more than `max_horizon` seconds past the latest report.
+
+    Azimuth wraps at 360° unless the rotator's travel from `azimuth_min`
+    to `azimuth_max` (ROTATOR_AZ_MIN and ROTATOR_AZ_MAX by default) is
+    longer: an overlap rotator reports positions such as 370° as they are,
+    and they are tracked unwrapped.
+
+    Not thread-safe; callers serialize access.
+    """
+    def __init__(self, time_constant: float = 0.2, max_rate: float = None, max_horizon: float = 0.5,
+                 tolerance: float = 1.0, azimuth_min: float = None, azimuth_max: float = None):
+        self.time_constant = time_constant
+        self.max_rate = max_rate if max_rate is not None else float(os.getenv('ROTATOR_MAX_RATE', '5'))
+        self.max_horizon = max_horizon
+        self.tolerance = tolerance
+        if azimuth_min is None:
+            azimuth_min = float(os.getenv('ROTATOR_AZ_MIN', '0'))
+        if azimuth_max is None:
+            azimuth_max = float(os.getenv('ROTATOR_AZ_MAX', '360'))
+        self.azimuth = AxisTracker(period=360.0 if azimuth_max - azimuth_min <= 360.0 else None)
+        self.elevation = AxisTracker()
+        self.time = None  # time.perf_counter() of the latest report
+
+    @property
+    def initialized(self) -> bool:
+        return self.time is not None
+
+    def update(self, azimuth: float, elevation: float, sampled_at: float):
+        """
+        Adds a report sampled at host time `sampled_at` (time.perf_counter() seconds).
+        """
+        dt = None if self.time is None else sampled_at - self.time
+        if dt is not None and dt <= 0:
+            # Same sample time (e.g. a burst read in one chunk, without MCU timestamps): take the newer report
+            dt = None
+        if dt is not None:
+            limit = self.max_rate * dt + self.tolerance
+            if (abs(self.azimuth.difference(azimuth, self.azimuth.predict(dt))) > limit
+                    or abs(elevation - self.elevation.predict(dt)) > limit):
+                dt = None
+        if dt is None:
+            self.azimuth.reset(azimuth)
+            self.elevation.reset(elevation)
+        else:
+            alpha = 1 - math.exp(-dt / self.time_constant)
+            beta = alpha * alpha / (2 - alpha)
+            self.azimuth.update(azimuth, dt, alpha, beta, self.max_rate)
+            self.elevation.update(elevation, dt, alpha, beta, self.max_rate)
+        self.time = max(sampled_at, self.time or sampled_at)
+
+    def moving(self) -> bool:
+        return bool(self.azimuth.velocity or self.elevation.velocity)
+
+    def estimate(self, now: float) -> dict:
+        """
+        Returns the position and velocity extrapolated to host time `now`, and the age of the latest report.
+        """
+        age = now - self.time
+        dt = max(0.0, min(age, self.max_horizon))
+        return {
+            'azimuth': self.azimuth.predict(dt),
+            'elevation': self.elevation.predict(dt),
+            'azimuth_velocity': self.azimuth.velocity,
+            'elevation_velocity': self.elevation.velocity,
+            'age': age,
+        }
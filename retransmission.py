@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+File: retransmission.py
+Author: Jan Kühnemund
+Description: Sliding-window retransmission scheduler for commands awaiting ACKs.
+"""
+
+import heapq
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Thread, Condition
+from metrics import RETRANSMISSIONS, ACK_TIMEOUTS, COMMAND_RTT
+
+
+class SlidingWindow:
+    """
+    Allocates MESSAGE_IDs sequentially for at most `size` outstanding frames.
+
+    The window spans from the oldest unacknowledged ID (the base) to the
+    next free one. New IDs are only handed out while that span is smaller
+    than `size`, so an ID is never reused while it may still be ACKed, and
+    a cumulative ACK can be placed unambiguously as long as `size` is at
+    most half the ID space.
+    """
+    def __init__(self, size: int = 8, modulus: int = 256):
+        if not 1 <= size <= modulus // 2:
+            raise ValueError(f"Window size must be between 1 and {modulus // 2}")
+        self.size = size
+        self.modulus = modulus
+        self.next_id = 0
+        self.outstanding = {}  # message_id -> value, in allocation order
+
+    def __len__(self):
+        return len(self.outstanding)
+
+    def base(self) -> int:
+        """
+        Returns the oldest outstanding ID, or the next ID if none is outstanding.
+        """
+        return next(iter(self.outstanding), self.next_id)
+
+    def full(self) -> bool:
+        return (self.next_id - self.base()) % self.modulus >= self.size
+
+    def allocate(self, value) -> int:
+        """
+        Reserves the next ID for `value`. The caller must check full() first.
+        """
+        message_id = self.next_id
+        self.next_id = (message_id + 1) % self.modulus
+        self.outstanding[message_id] = value
+        return message_id
+
+    def release(self, message_id: int):
+        """
+        Frees an ID without an ACK (e.g. after giving up). Returns its value.
+        """
+        return self.outstanding.pop(message_id, None)
+
+    def acknowledge(self, message_id: int) -> list:
+        """
+        Handles an ACK for a single message. Returns [(message_id, value)].
+        """
+        if message_id not in self.outstanding:
+            return []
+        return [(message_id, self.outstanding.pop(message_id))]
+
+    def acknowledge_cumulative(self, next_expected: int, selective: int = 0) -> list:
+        """
+        Handles a cumulative ACK with an optional selective-ACK bitmap.
+
+        Every outstanding ID before `next_expected` is acknowledged. Bit i of
+        `selective` additionally acknowledges ID `next_expected + 1 + i`.
+        Returns the acknowledged [(message_id, value)] pairs.
+        """
+        base = self.base()
+        span = (next_expected - base) % self.modulus
+        if span > self.size:
+            span = 0  # Stale ACK from before the current window
+        acked = [message_id for message_id in self.outstanding if (message_id - base) % self.modulus < span]
+        bit = 0
+        while selective >> bit:
+            if selective >> bit & 1:
+                message_id = (next_expected + 1 + bit) % self.modulus
+                if message_id in self.outstanding:
+                    acked.append(message_id)
+            bit += 1
+        return [(message_id, self.outstanding.pop(message_id)) for message_id in acked]
+
+
+class PendingMessage:
+    """
+    A command frame that has been sent (or is about to be) and awaits its ACK.
+    """
+    __slots__ = ('frame', 'attempts', 'last_sent', 'deadline', 'future')
+
+    def __init__(self, frame: bytes, future: Future):
+        self.frame = frame
+        self.attempts = 0
+        self.last_sent = 0.0
+        self.deadline = 0.0
+        self.future = future
+
+
+class RetransmissionScheduler:
+    """
+    Sends command frames and retransmits them with exponential backoff until
+    they are acknowledged: the first ACK timeout is `base_timeout`, doubling
+    with every retransmission up to `max_backoff`.
+
+    Up to `window_size` frames are in flight at once (selective repeat);
+    further commands wait in a FIFO until the window advances. All
+    outstanding messages share one thread. Deadlines live in a min-heap, so
+    the thread sleeps exactly until the next retransmission is due or until
+    a new message or an ACK wakes it up. due() holds the scheduling logic
+    and can be driven with a virtual clock for simulation.
+    """
+    def __init__(self, write, base_timeout: float = 0.1, max_backoff: float = 1.0, max_attempts: int = 10,
+                 window_size: int = 8, clock=time.monotonic, on_transmit=None):
+        self.write = write  # Callable that puts a frame on the wire
+        self.on_transmit = on_transmit  # Called with (message_id, attempt) right before each write
+        self.base_timeout = base_timeout
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.window = SlidingWindow(window_size)
+        self.waiting = deque()  # (build_frame, future) waiting for room in the window
+        self.heap = []  # (deadline, sequence, message_id)
+        self.sequence = 0  # Tie-breaker that keeps heap ordering stable
+        self.transmissions = 0
+        self.retransmissions = 0
+        self.condition = Condition()
+        self.running = False
+        self.thread = None
+
+    @property
+    def pending(self) -> dict:
+        """
+        Messages in flight, keyed by MESSAGE_ID.
+        """
+        return self.window.outstanding
+
+    def start(self):
+        """
+        Starts the scheduler thread.
+        """
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = Thread(target=self._run, name="uart-retransmit", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the scheduler thread and cancels all outstanding messages.
+        """
+        with self.condition:
+            self.running = False
+            futures = [message.future for message in self.window.outstanding.values()]
+            futures += [future for _, future in self.waiting]
+            self.window.outstanding.clear()
+            self.waiting.clear()
+            self.heap.clear()
+            self.condition.notify()
+        for future in futures:
+            future.cancel()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def submit(self, build_frame) -> Future:
+        """
+        Queues a command for transmission.
+
+        `build_frame(message_id)` is called with the MESSAGE_ID allocated from
+        the window and returns the frame to send. The returned future
+        resolves with the number of transmissions once the ACK arrives.
+        """
+        future = Future()
+        with self.condition:
+            self.waiting.append((build_frame, future))
+            self._admit()
+            self.condition.notify()
+        return future
+
+    def acknowledge(self, message_id: int) -> bool:
+        """
+        Resolves the future of a single acknowledged message.
+
+        Returns False if the message ID is not outstanding.
+        """
+        with self.condition:
+            acked = self.window.acknowledge(message_id)
+            self._admit()
+            self.condition.notify()
+        self._resolve(acked)
+        return bool(acked)
+
+    def acknowledge_cumulative(self, next_expected: int, selective: int = 0) -> list:
+        """
+        Resolves every message covered by a cumulative/selective ACK.
+
+        Returns the acknowledged MESSAGE_IDs.
+        """
+        with self.condition:
+            acked = self.window.acknowledge_cumulative(next_expected, selective)
+            self._admit()
+            self.condition.notify()
+        self._resolve(acked)
+        return [message_id for message_id, _ in acked]
+
+    def _resolve(self, acked):
+        now = self.clock()
+        for _, message in acked:
+            if message.attempts == 1:
+                COMMAND_RTT.observe(now - message.last_sent)  # Retransmitted ones are ambiguous
+            if not message.future.done():
+                message.future.set_result(message.attempts)
+
+    def _admit(self):
+        """
+        Moves waiting commands into the window. Must be called with the condition held.
+        """
+        now = self.clock()
+        while self.waiting and not self.window.full():
+            build_frame, future = self.waiting.popleft()
+            message = PendingMessage(None, future)
+            message_id = self.window.allocate(message)
+            try:
+                message.frame = build_frame(message_id)
+            except Exception as e:
+                self.window.release(message_id)
+                future.set_exception(e)
+                continue
+            self._schedule(message_id, message, now)
+
+    def _schedule(self, message_id, message, deadline):
+        message.deadline = deadline
+        self.sequence += 1
+        heapq.heappush(self.heap, (deadline, self.sequence, message_id))
+
+    def next_deadline(self):
+        """
+        Returns the earliest retransmission deadline, or None if nothing is scheduled.
+        """
+        while self.heap:
+            deadline, _, message_id = self.heap[0]
+            message = self.window.outstanding.get(message_id)
+            if message is not None and message.deadline == deadline:
+                return deadline
+            heapq.heappop(self.heap)  # Acknowledged or rescheduled since
+        return None
+
+    def due(self, now: float) -> list:
+        """
+        Collects the frames to (re)send at time `now` and fails messages that
+        ran out of attempts. Must be called with the condition held.
+
+        Returns a list of (message_id, message) to write.
+        """
+        to_send = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            _, _, message_id = heapq.heappop(self.heap)
+            message = self.window.outstanding[message_id]
+            if message.attempts > self.max_attempts:
+                self.window.release(message_id)
+                ACK_TIMEOUTS.inc()
+                logging.error("Failed to receive ACK for MESSAGE_ID %d after multiple attempts.", message_id)
+                message.future.set_exception(
+                    TimeoutError(f"No ACK for MESSAGE_ID {message_id} after {message.attempts} attempts"))
+                self._admit()
+                continue
+            if message.attempts:
+                self.retransmissions += 1
+                RETRANSMISSIONS.inc()
+            self.transmissions += 1
+            timeout = min(self.base_timeout * (2 ** message.attempts), self.max_backoff)
+            message.last_sent = now
+            message.attempts += 1
+            self._schedule(message_id, message, now + timeout)
+            to_send.append((message_id, message))
+        return to_send
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    to_send = self.due(self.clock())
+                    if to_send:
+                        break
+                    deadline = self.next_deadline()
+                    self.condition.wait(None if deadline is None else max(0.0, deadline - self.clock()))
+                if not self.running:
+                    return
+            for message_id, message in to_send:
+                try:
+                    if self.on_transmit is not None:
+                        self.on_transmit(message_id, message.attempts)
+                    self.write(message.frame)
+                    logging.debug("Sent command with MESSAGE_ID %d, attempt %d", message_id, message.attempts)
+                except Exception as e:
+                    logging.exception("Error sending command: %s", e)
+                    with self.condition:
+                        if self.window.outstanding.get(message_id) is message:
+                            self.window.release(message_id)
+                            self._admit()
+                    if not message.future.done():
+                        message.future.set_exception(e)
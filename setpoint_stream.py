@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+File: setpoint_stream.py
+Author: Jan Kühnemund
+Description: Coalescing, rate-limited streaming of idempotent setpoints over UART.
+"""
+
+import asyncio
+import logging
+import struct
+from framing import FRAMING_OVERHEAD
+
+VELOCITY_SETPOINT = struct.Struct('>hh')  # Normalized azimuth/elevation velocity, -32767..32767
+
+
+def velocity_payload(azimuth: float, elevation: float) -> bytes:
+    """
+    Packs normalized axis values (-1..1) into a velocity setpoint payload.
+    """
+    azimuth = max(-1.0, min(1.0, azimuth))
+    elevation = max(-1.0, min(1.0, elevation))
+    return VELOCITY_SETPOINT.pack(round(azimuth * 32767), round(elevation * 32767))
+
+
+def link_budget_rate(baudrate: int, frame_length: int, share: float = 0.5) -> float:
+    """
+    Returns how many frames per second fit into `share` of the link.
+
+    A UART byte takes 10 bits on the wire (start, 8 data, stop).
+    """
+    return baudrate / 10 * share / frame_length
+
+
+class SetpointStreamer:
+    """
+    Streams the latest value of each setpoint at a fixed rate.
+
+    update() only stores the value, so any number of updates between two
+    ticks collapse into one frame per command ID. Frames are sent without
+    ACKs via send_unacked(); the firmware uses the MESSAGE_ID as a sequence
+    number and drops stale frames. Unchanged setpoints are resent every
+    `refresh_interval` seconds so a lost frame is healed quickly.
+    """
+    def __init__(self, uart, max_rate_hz: float = 50.0, link_share: float = 0.5,
+                 payload_length: int = VELOCITY_SETPOINT.size, refresh_interval: float = 0.25):
+        self.uart = uart
+        frame_length = FRAMING_OVERHEAD + 2 + payload_length  # Room for a CRC-16 checksum
+        self.rate_hz = min(max_rate_hz, link_budget_rate(uart.baudrate, frame_length, link_share))
+        self.refresh_interval = refresh_interval
+        self.setpoints = {}  # command_id -> latest payload
+        self.changed = set()  # command_ids updated since the last tick
+        self.last_sent = {}  # command_id -> loop time of the last transmission
+        self.frames_sent = 0
+        self.updates_coalesced = 0
+        self.task = None
+
+    def update(self, command_id: int, payload: bytes):
+        """
+        Stores the newest value for a setpoint; it goes out on the next tick.
+        """
+        if self.setpoints.get(command_id) == payload:
+            return
+        if command_id in self.changed:
+            self.updates_coalesced += 1
+        self.setpoints[command_id] = payload
+        self.changed.add(command_id)
+
+    def start(self):
+        """
+        Starts streaming on the running event loop.
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+            logging.info("Streaming setpoints at %.1f Hz", self.rate_hz)
+
+    def stop(self):
+        """
+        Stops streaming.
+        """
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def tick(self, now: float):
+        """
+        Sends every changed setpoint and refreshes stale ones.
+        """
+        if not self.uart.is_connected():
+            return
+        for command_id, payload in self.setpoints.items():
+            if command_id in self.changed or now - self.last_sent.get(command_id, 0.0) >= self.refresh_interval:
+                try:
+                    self.uart.send_unacked(command_id, payload)
+                except Exception as e:
+                    logging.error("Failed to stream setpoint %#04x: %s", command_id, e)
+                    return
+                self.last_sent[command_id] = now
+                self.frames_sent += 1
+        self.changed.clear()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.rate_hz
+        deadline = loop.time()
+        while True:
+            self.tick(loop.time())
+            deadline += period
+            delay = deadline - loop.time()
+            if delay < 0:
+                deadline = loop.time()  # Fell behind; skip missed ticks instead of bursting
+                delay = 0
+            await asyncio.sleep(delay)
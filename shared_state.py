@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+File: shared_state.py
+Author: Jan Kühnemund
+Description: Latest position and telemetry values in shared memory, published by one process and read by many.
+
+The block is self-describing, so readers only need its name:
+
+    header:  magic (4 bytes), length of the channel description
+    channels: JSON list of [name, [field, ...]]
+    data:    sequence (u64), then per channel: update count (u64), time (f64), one f64 per field
+
+The data is guarded by a seqlock. The single writer makes the sequence odd,
+writes, and makes it even again; readers copy the whole data block and
+retry if the sequence was odd or changed meanwhile. Readers never block the
+writer, and a snapshot costs one unpack. A writer that dies mid-write leaves
+the sequence odd; readers give up after READ_TIMEOUT with TimeoutError.
+"""
+
+import json
+import struct
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = b'GSST'
+HEADER = struct.Struct('<4sI')  # magic, length of the channel description
+SEQUENCE = struct.Struct('<Q')
+READ_SPINS = 1000  # Retries before a reader gives up its time slice
+READ_TIMEOUT = 0.05  # Seconds a reader retries before the block counts as stuck
+
+
+class SharedState:
+    """
+    Seqlock-protected block of per-channel values in multiprocessing.shared_memory.
+
+    Use create() in the process that owns the data and attach() in readers.
+    Only one process (and thread) may write.
+    """
+    def __init__(self, shm, channels: dict, owner: bool = False):
+        self.shm = shm
+        self.channels = channels
+        self.owner = owner
+        self.data_offset = HEADER.size + HEADER.unpack_from(shm.buf)[1]
+        self.layout = struct.Struct('<Q' + ''.join('Qd' + 'd' * len(fields) for fields in channels.values()))
+        self.slots = {}  # name -> (offset, struct of count, time and fields)
+        self.indices = {}  # name -> index of the channel's update count in a snapshot
+        offset = self.data_offset + SEQUENCE.size
+        index = 1
+        for name, fields in channels.items():
+            slot = struct.Struct('<Qd' + 'd' * len(fields))
+            self.slots[name] = (offset, slot)
+            self.indices[name] = index
+            offset += slot.size
+            index += 2 + len(fields)
+        self.counts = dict.fromkeys(channels, 0)  # Writer side only
+        self.sequence = 0
+
+    @classmethod
+    def create(cls, channels: dict, name: str = None):
+        """
+        Allocates a zeroed block for `channels` ({name: (field, ...)}).
+        """
+        description = json.dumps([[channel, list(fields)] for channel, fields in channels.items()]).encode()
+        size = HEADER.size + len(description)
+        size += struct.calcsize('<Q' + ''.join('Qd' + 'd' * len(fields) for fields in channels.values()))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, len(description))
+        shm.buf[HEADER.size:HEADER.size + len(description)] = description
+        return cls(shm, {channel: tuple(fields) for channel, fields in channels.items()}, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        """
+        Maps an existing block read-only by convention.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker, which would unlink it when this process exits.
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        magic, length = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"{name} is not a shared state block")
+        description = json.loads(bytes(shm.buf[HEADER.size:HEADER.size + length]))
+        return cls(shm, {channel: tuple(fields) for channel, fields in description})
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, channel: str, values, timestamp: float = None):
+        """
+        Publishes new values for a channel.
+        """
+        offset, slot = self.slots[channel]
+        count = self.counts[channel] + 1
+        self.counts[channel] = count
+        buf = self.shm.buf
+        SEQUENCE.pack_into(buf, self.data_offset, self.sequence + 1)  # Odd: write in progress
+        slot.pack_into(buf, offset, count, time.time() if timestamp is None else timestamp, *values)
+        self.sequence += 2
+        SEQUENCE.pack_into(buf, self.data_offset, self.sequence)
+
+    def snapshot(self, timeout: float = READ_TIMEOUT) -> tuple:
+        """
+        Returns a consistent copy of the data block as a flat tuple.
+
+        Index 0 is the sequence; self.indices locates each channel's
+        update count, followed by its time and fields. Raises TimeoutError
+        if no consistent copy could be taken within `timeout` seconds.
+        """
+        layout, buf, offset = self.layout, self.shm.buf, self.data_offset
+        spins = 0
+        deadline = None
+        while True:
+            values = layout.unpack_from(buf, offset)
+            if not values[0] & 1 and SEQUENCE.unpack_from(buf, offset)[0] == values[0]:
+                return values
+            spins += 1
+            if spins % READ_SPINS == 0:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + timeout
+                elif now > deadline:
+                    raise TimeoutError(f"Shared state {self.name} is stuck in a write; its writer may have died")
+                time.sleep(0)
+
+    def read(self, channel: str = None) -> dict:
+        """
+        Returns {'count', 'time', field: value, ...} for a channel, or for all channels by name.
+        """
+        values = self.snapshot()
+        if channel is not None:
+            return self._decode(values, channel)
+        return {name: self._decode(values, name) for name in self.channels}
+
+    def _decode(self, values: tuple, channel: str) -> dict:
+        index = self.indices[channel]
+        result = {'count': values[index], 'time': values[index + 1]}
+        result.update(zip(self.channels[channel], values[index + 2:]))
+        return result
+
+    def close(self):
+        """
+        Unmaps the block; the owner also removes it.
+        """
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
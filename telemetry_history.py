@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+File: telemetry_history.py
+Author: Jan Kühnemund
+Description: Fixed-size, NumPy-backed history of timestamped telemetry with downsampled queries.
+"""
+
+import time
+from threading import Lock
+import numpy as np
+
+DECIMATION_METHODS = ('minmax', 'lttb')
+
+
+class TelemetryHistory:
+    """
+    Ring buffer of (time, values) samples for one telemetry channel.
+
+    Timestamps (float64, seconds since the epoch) and values (float32, one
+    column per field) live in arrays allocated up front, so memory stays
+    at `capacity` samples however long the station runs; the oldest
+    samples are overwritten first.
+    """
+    def __init__(self, fields, capacity: int):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.fields)), dtype=np.float32)
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.lock = Lock()  # Appends come from the UART reader, queries from the API
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values, timestamp: float = None):
+        with self.lock:
+            head = self.head
+            self.times[head] = time.time() if timestamp is None else timestamp
+            self.values[head] = values
+            self.head = (head + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def range(self, start: float, end: float):
+        """
+        Returns copies of (times, values) for samples with start <= time <= end, oldest first.
+        """
+        with self.lock:
+            if self.count < self.capacity:
+                segments = [(0, self.head)]
+            else:
+                segments = [(self.head, self.capacity), (0, self.head)]
+            times, values = [], []
+            for first, last in segments:
+                segment = self.times[first:last]
+                lower = first + np.searchsorted(segment, start, 'left')
+                upper = first + np.searchsorted(segment, end, 'right')
+                times.append(self.times[lower:upper])
+                values.append(self.values[lower:upper])
+            return np.concatenate(times), np.concatenate(values)
+
+    def query(self, start: float, end: float, points: int, method: str = 'minmax') -> dict:
+        """
+        Returns the samples between `start` and `end`, decimated to about `points` rows.
+
+        'minmax' keeps the minimum and maximum of every bucket so spikes
+        survive; 'lttb' (largest triangle three buckets, on the first field)
+        keeps the visual shape with real samples.
+        """
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Unknown decimation method: {method}")
+        times, values = self.range(start, end)
+        if len(times) > points:
+            if method == 'minmax':
+                times, values = decimate_minmax(times, values, points)
+            else:
+                times, values = decimate_lttb(times, values, points)
+        result = {'time': times.tolist()}
+        for column, field in enumerate(self.fields):
+            result[field] = values[:, column].tolist()
+        return result
+
+
+def decimate_minmax(times, values, points: int):
+    """
+    Reduces samples to a minimum and a maximum row per bucket.
+
+    Each bucket yields two rows, stamped with its first and last sample time.
+    """
+    buckets = max(1, points // 2)
+    edges = np.linspace(0, len(times), buckets + 1).astype(np.intp)
+    starts, ends = edges[:-1], edges[1:] - 1
+    minima = np.minimum.reduceat(values, starts, axis=0)
+    maxima = np.maximum.reduceat(values, starts, axis=0)
+    out_times = np.empty(buckets * 2, dtype=times.dtype)
+    out_times[0::2] = times[starts]
+    out_times[1::2] = times[ends]
+    out_values = np.empty((buckets * 2, values.shape[1]), dtype=values.dtype)
+    out_values[0::2] = minima
+    out_values[1::2] = maxima
+    return out_times, out_values
+
+
+def decimate_lttb(times, values, points: int):
+    """
+    Largest-Triangle-Three-Buckets downsampling on the first value column.
+
+    Returns real samples, always including the first and the last one.
+    """
+    if points < 3:
+        return times[[0, -1]][:points], values[[0, -1]][:points]
+    y = values[:, 0].astype(np.float64)
+    edges = np.linspace(1, len(times) - 1, points - 1).astype(np.intp)
+    selected = np.empty(points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = len(times) - 1
+    previous = 0
+    for bucket in range(points - 2):
+        first, last = edges[bucket], edges[bucket + 1]
+        following = slice(edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else slice(-1, None)
+        average_time = times[following].mean()
+        average_y = y[following].mean()
+        areas = np.abs((times[previous] - average_time) * (y[first:last] - y[previous])
+                       - (times[previous] - times[first:last]) * (average_y - y[previous]))
+        previous = first + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return times[selected], values[selected]
@@ -1,24 +1,23 @@
-import serial
-import command_pb2  # Import the generated Protobuf code from your command.proto
+import os
+from utils import load_config
+from uart_comm import UARTCommunication
+from commands import RotatorCommands
 
-def send_command(command):
-    ser = serial.Serial('/dev/ttyS0', 115200)  # Adjust this to your serial port
-    ser.write(command.SerializeToString())
-    ser.close()
+load_config()
+
+# Adjust UART_PORT in .env (or the environment) to your serial port
+uart_comm = UARTCommunication(port=os.getenv('UART_PORT', '/dev/ttyS0'))
+commands = RotatorCommands(uart_comm, {'set_position': 'protobuf'})
 
 # Test SetPositionCommand
 def test_set_position():
-    command = command_pb2.Command()
-    command.set_position.azimuth = 45.0
-    command.set_position.elevation = 30.0
-    send_command(command)
+    commands.set_position(45.0, 30.0).result(timeout=5)
 
 # Test GetPositionCommand
 def test_get_position():
-    command = command_pb2.Command()
-    command.get_position.SetInParent()  # Create an empty GetPositionCommand
-    send_command(command)
+    commands.get_position().result(timeout=5)
 
 if __name__ == "__main__":
     test_set_position()  # Test SetPositionCommand
     test_get_position()  # Test GetPositionCommand
+    uart_comm.close()
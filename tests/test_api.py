@@ -1,10 +1,121 @@
 # tests/test_api.py
 from fastapi.testclient import TestClient
 from api import app
-
-client = TestClient(app)
+import api
+from mcu_simulator import FakeMCU, wait_for
 
 def test_get_status():
-    response = client.get("/status")
-    assert response.status_code == 200
-    assert response.json() == {"message": "Status requested"}
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            mcu.armed = True
+            response = client.get("/status", params={"fresh": 1})
+            assert response.status_code == 200
+            body = response.json()
+            assert body["status"]["state"] == 1
+            assert body["cached"] is False and body["latency_ms"] > 0
+            response = client.get("/status")
+            assert response.json()["cached"] is True
+            assert [command_id for _, command_id, _ in mcu.received].count(0x07) == 1
+
+def test_status_single_flight():
+    import asyncio
+    with FakeMCU(delay=0.05) as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            async def poll():
+                return await asyncio.gather(*(api.get_status(fresh=True) for _ in range(8)))
+            responses = client.portal.call(poll)
+            assert len({response["latency_ms"] for response in responses}) == 1
+            assert [command_id for _, command_id, _ in mcu.received].count(0x07) == 1
+
+def test_telemetry_history():
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            for azimuth in range(1, 51):
+                mcu.send_position(azimuth, 10)
+            assert wait_for(lambda: api.uart_comm.get_reported_position()['azimuth'] == 50)
+            response = client.get("/telemetry/position/history", params={"points": 10})
+            assert response.status_code == 200
+            body = response.json()
+            assert len(body["time"]) == 10
+            assert max(body["azimuth"]) == 50
+            assert client.get("/telemetry/nope/history").status_code == 404
+            assert client.get("/telemetry/position/history", params={"method": "median"}).status_code == 400
+
+def test_binary_websocket(tmp_path):
+    from ws_protocol import SUBPROTOCOL, POSITION_FRAME, encode_gamepad
+    api.input_mapper.path = str(tmp_path / "mapping.json")
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            assert client.post("/save-mapping", json={"button_2": "arm"}).status_code == 200
+            with client.websocket_connect("/ws", subprotocols=[SUBPROTOCOL]) as websocket:
+                assert websocket.accepted_subprotocol == SUBPROTOCOL
+                mcu.send_position(200, 30)
+                while True:
+                    _, azimuth, elevation, _ = POSITION_FRAME.unpack(websocket.receive_bytes())
+                    if azimuth == 200:
+                        break
+                assert elevation == 30
+                websocket.send_bytes(encode_gamepad(0b100, []))
+                websocket.send_bytes(encode_gamepad(0b100, []))  # Held, must not fire again
+                assert wait_for(lambda: any(command_id == 0x01 for _, command_id, _ in mcu.received))
+            assert [command_id for _, command_id, _ in mcu.received].count(0x01) == 1
+
+def test_malformed_json_frames_keep_the_session(tmp_path):
+    api.input_mapper.path = str(tmp_path / "mapping.json")
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            assert client.post("/save-mapping", json={"button_1": "arm"}).status_code == 200
+            with client.websocket_connect("/ws") as websocket:
+                for text in ("{not json", "[1, 2]", '{"axes": {"axis_0": "x"}}', '{"buttons": 3}'):
+                    websocket.send_text(text)
+                websocket.send_text('{"buttons": {"button_1": true}}')
+                assert wait_for(lambda: any(command_id == 0x01 for _, command_id, _ in mcu.received))
+
+def test_dummy_joystick(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOYSTICK_BACKEND", "dummy")
+    api.input_mapper.path = str(tmp_path / "mapping.json")
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            assert client.post("/save-mapping", json={"button_0": "disarm"}).status_code == 200
+            api.joystick_loop.backend.set_button(0, True)
+            assert wait_for(lambda: any(command_id == 0x02 for _, command_id, _ in mcu.received))
+        assert not api.joystick_loop.thread.is_alive()
+
+def test_metrics():
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            assert client.get("/status", params={"fresh": 1}).status_code == 200
+            body = client.get("/metrics").text
+            samples = dict(line.rsplit(" ", 1) for line in body.splitlines() if not line.startswith("#"))
+            assert int(samples["uart_command_rtt_seconds_count"]) >= 1
+            assert int(samples["uart_frames_received_total"]) >= 2
+            assert samples["uart_connected"] == "1"
+            assert client.post("/debug/profiler", params={"enabled": True, "interval_ms": 1}).json()["running"]
+            assert client.post("/debug/profiler", params={"enabled": False}).json()["running"] is False
+
+def test_device_routes():
+    with FakeMCU() as mcu:
+        api.uart_comm.port = mcu.port
+        with TestClient(app) as client:
+            assert wait_for(api.uart_comm.is_connected)
+            assert client.get("/devices").json()[0]["name"] == api.default_device.name
+            mcu.send_position(90, 20)
+            assert wait_for(lambda: api.uart_comm.get_current_position()['azimuth'] == 90)
+            response = client.get(f"/devices/{api.default_device.name}/telemetry/position/history")
+            assert response.json()["azimuth"][-1] == 90
+            assert client.get("/devices/nope/status").status_code == 404
+            assert client.get("/devices/nope/telemetry/position/history").status_code == 404
@@ -0,0 +1,30 @@
+import asyncio
+import unittest
+from async_uart import AsyncUARTCommunication
+from mcu_simulator import FakeMCU
+
+class TestAsyncUARTCommunication(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcu = FakeMCU().start()
+        self.uart_comm = AsyncUARTCommunication(port=self.mcu.port)
+        await self.uart_comm.connect()
+
+    async def asyncTearDown(self):
+        self.uart_comm.close()
+        self.mcu.stop()
+
+    async def test_send_command_resolves_on_ack(self):
+        attempts = await asyncio.wait_for(self.uart_comm.send_command(0x01), 1)
+        self.assertEqual(attempts, 1)
+        self.assertEqual(self.mcu.received[0][1], 0x01)
+
+    async def test_messages_yields_decoded_data(self):
+        messages = self.uart_comm.messages()
+        receive = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0)
+        self.mcu.send_position(90, 10)
+        command_id, values = await asyncio.wait_for(receive, 1)
+        self.assertEqual(command_id, 0x09)
+        self.assertEqual(values, {'azimuth': 90, 'elevation': 10})
+        self.assertEqual(self.uart_comm.get_current_position(), {'azimuth': 90, 'elevation': 10})
+        await messages.aclose()
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from async_uart import AsyncUARTCommunication
+from batching import (encode_batch, decode_batch, batch_results, CommandRejected, BATCH_COMMAND_ID,
+                      MAX_BATCH_PAYLOAD, RESULT_OK)
+from checksum import CAP_CRC16
+from mcu_simulator import FakeMCU, LinkSimulator, INVALID_COMMAND
+from uart_comm import UARTCommunication
+
+class TestBatchEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        commands = [(0x03, b'\x00' * 8), (0x07, b''), (0x05, b'\x01\x02')]
+        payload = encode_batch(commands)
+        self.assertEqual(len(payload), 2 * 3 + 10)
+        self.assertEqual(decode_batch(payload), commands)
+
+    def test_invalid(self):
+        for commands in ([], [(BATCH_COMMAND_ID, b'')], [(0x03, bytes(MAX_BATCH_PAYLOAD))]):
+            with self.assertRaises(ValueError):
+                encode_batch(commands)
+        with self.assertRaises(ValueError):
+            decode_batch(b'\x03\x08\x00')
+
+    def test_results(self):
+        self.assertEqual(batch_results(None, 3), [RESULT_OK] * 3)
+        self.assertEqual(batch_results(b'\x00\x01', 2), [0, 1])
+        with self.assertRaises(RuntimeError):
+            batch_results(b'\x00', 2)
+
+    def test_batches_raise_baud_limited_throughput(self):
+        single = LinkSimulator().run(400, payload_length=0)
+        batched = LinkSimulator().run(400, payload_length=0, batch_size=8)
+        self.assertEqual(batched['failed'], 0)
+        self.assertGreater(batched['commands_per_second'], 2 * single['commands_per_second'])
+
+class TestSyncBatch(unittest.TestCase):
+    def test_send_batch(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                results = uart_comm.send_batch([(0x01, b''), (0x06, b''), (0x07, b'')]).result(timeout=1)
+                self.assertEqual(results, [RESULT_OK, INVALID_COMMAND, RESULT_OK])
+                self.assertEqual(mcu.batches, 1)
+                self.assertEqual([command_id for _, command_id, _ in mcu.received], [0x01, 0x07])
+            finally:
+                uart_comm.close()
+
+class TestAsyncBatch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcu = FakeMCU().start()
+        self.uart_comm = AsyncUARTCommunication(port=self.mcu.port)
+        await self.uart_comm.connect()
+
+    async def asyncTearDown(self):
+        self.uart_comm.close()
+        self.mcu.stop()
+
+    async def test_send_batch(self):
+        results = await asyncio.wait_for(self.uart_comm.send_batch([(0x03, bytes(8)), (0x06, b'')]), 1)
+        self.assertEqual(results, [RESULT_OK, INVALID_COMMAND])
+        self.assertEqual(self.mcu.batches, 1)
+
+    async def test_auto_batching(self):
+        self.assertTrue(await self.uart_comm.enable_batching(0.005))
+        attempts = await asyncio.wait_for(asyncio.gather(*(self.uart_comm.send_command(0x01) for _ in range(5))), 1)
+        self.assertEqual(attempts, [1] * 5)
+        self.assertEqual(self.mcu.batches, 1)
+        self.assertEqual(len(self.mcu.received), 5 + 1)  # And the capability query
+        with self.assertRaises(CommandRejected):
+            await asyncio.gather(self.uart_comm.send_command(0x01), self.uart_comm.send_command(0x06))
+        # A lone command goes out as a plain frame
+        await asyncio.wait_for(self.uart_comm.send_command(0x02), 1)
+        self.assertEqual(self.mcu.batches, 2)
+
+    async def test_firmware_without_batches(self):
+        self.mcu.capabilities = CAP_CRC16
+        self.assertFalse(await self.uart_comm.enable_batching(0.005))
+        await asyncio.wait_for(asyncio.gather(*(self.uart_comm.send_command(0x01) for _ in range(3))), 1)
+        self.assertEqual(self.mcu.batches, 0)
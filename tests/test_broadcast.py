@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from broadcast import PositionHub
+from ws_protocol import POSITION_FRAME
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+class TestPositionHub(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_client_does_not_delay_fast_client(self):
+        hub = PositionHub(send_timeout=0.05)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=0.2)
+        hub.subscribe(fast)
+        hub.subscribe(slow)
+        for i in range(20):
+            hub.publish({'azimuth': i, 'elevation': 0})
+            await asyncio.sleep(0.001)
+        self.assertEqual(fast.sent[-1], '{"azimuth": 19, "elevation": 0}')
+        await asyncio.sleep(0.1)
+        self.assertTrue(slow.closed)
+        self.assertEqual(len(hub.subscribers), 1)
+
+    async def test_updates_are_coalesced_and_serialized_once(self):
+        hub = PositionHub()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        subscribers = [hub.subscribe(first), hub.subscribe(second)]
+        for i in range(5):
+            hub.publish({'azimuth': i, 'elevation': i})
+        await asyncio.sleep(0.01)
+        self.assertEqual(first.sent, ['{"azimuth": 4, "elevation": 4}'])
+        self.assertIs(first.sent[0], second.sent[0])
+        self.assertEqual(subscribers[0].coalesced, 4)
+        for subscriber in subscribers:
+            hub.unsubscribe(subscriber)
+
+    async def test_new_subscriber_receives_last_position(self):
+        hub = PositionHub()
+        hub.publish({'azimuth': 1, 'elevation': 2})
+        websocket = FakeWebSocket()
+        subscriber = hub.subscribe(websocket)
+        await asyncio.sleep(0.01)
+        self.assertEqual(websocket.sent, ['{"azimuth": 1, "elevation": 2}'])
+        hub.unsubscribe(subscriber)
+
+    async def test_binary_and_json_subscribers(self):
+        hub = PositionHub()
+        text_client, binary_clients = FakeWebSocket(), [FakeWebSocket(), FakeWebSocket()]
+        subscribers = [hub.subscribe(text_client)] + [hub.subscribe(client, binary=True) for client in binary_clients]
+        hub.publish({'azimuth': 180, 'elevation': 45})
+        await asyncio.sleep(0.01)
+        self.assertEqual(text_client.sent, ['{"azimuth": 180, "elevation": 45}'])
+        _, azimuth, elevation, timestamp = POSITION_FRAME.unpack(binary_clients[0].sent[0])
+        self.assertEqual((azimuth, elevation), (180.0, 45.0))
+        self.assertEqual(timestamp, hub.last_time)
+        self.assertIs(binary_clients[0].sent[0], binary_clients[1].sent[0])
+        for subscriber in subscribers:
+            hub.unsubscribe(subscriber)
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from capture import CaptureRecorder, read_capture, RX, TX
+from replay import ReplayCommunication, replay
+from uart_comm import UARTCommunication
+from mcu_simulator import FakeMCU, wait_for
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'capture.bin')
+
+    def test_records_round_trip_and_file_is_truncated(self):
+        recorder = CaptureRecorder(self.path, size=1 << 16)
+        recorder.record(RX, b'\x02\x00\x09')
+        recorder.record(TX, memoryview(b'\x02\x01\x01\x00\x00\x03'))
+        recorder.close()
+        records = list(read_capture(self.path))
+        self.assertEqual([(direction, bytes(data)) for _, direction, data in records],
+                         [(RX, b'\x02\x00\x09'), (TX, b'\x02\x01\x01\x00\x00\x03')])
+        self.assertLess(os.path.getsize(self.path), 1 << 16)
+
+    def test_capture_is_readable_before_close(self):
+        recorder = CaptureRecorder(self.path, size=1 << 16)
+        try:
+            recorder.record(RX, b'\x02\x00')
+            recorder.record(RX, b'\x09\x00')
+            self.assertEqual([bytes(data) for _, _, data in read_capture(self.path)], [b'\x02\x00', b'\x09\x00'])
+        finally:
+            recorder.close()
+
+    def test_full_capture_drops_chunks(self):
+        recorder = CaptureRecorder(self.path, size=64)
+        for _ in range(10):
+            recorder.record(RX, b'x' * 16)
+        recorder.close()
+        self.assertGreater(recorder.dropped, 0)
+        self.assertEqual(len(list(read_capture(self.path))), 10 - recorder.dropped)
+
+    def test_replay_reproduces_recorded_positions(self):
+        with FakeMCU() as mcu, mock.patch.dict(os.environ, {'UART_CAPTURE': self.path, 'UART_CAPTURE_SIZE': '1'}):
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                uart_comm.send_command(0x01).result(timeout=1)
+                for azimuth in range(1, 21):
+                    mcu.send_position(azimuth, 45)
+                self.assertTrue(wait_for(lambda: uart_comm.get_reported_position()['azimuth'] == 20))
+            finally:
+                uart_comm.close()
+
+        replayed = ReplayCommunication()
+        positions = []
+        replayed.add_position_listener(positions.append)
+        try:
+            stats = replay(self.path, replayed)
+        finally:
+            replayed.close()
+        self.assertEqual([position['azimuth'] for position in positions], list(range(1, 21)))
+        self.assertEqual(stats['frames'], 21)  # 20 positions and the ACK
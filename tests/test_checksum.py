@@ -0,0 +1,39 @@
+import os
+import unittest
+from checksum import xor_checksum, crc16, CRC16, XOR
+from mcu_simulator import FakeMCU, wait_for
+from uart_comm import UARTCommunication
+
+class TestChecksum(unittest.TestCase):
+    def test_xor_checksum_matches_bytewise_xor(self):
+        for length in range(256):
+            data = os.urandom(length)
+            expected = 0
+            for b in data:
+                expected ^= b
+            self.assertEqual(xor_checksum(data), expected)
+
+    def test_crc16_check_value(self):
+        self.assertEqual(crc16(b'123456789'), 0x29B1)
+
+    def test_negotiates_crc16_when_supported(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                self.assertTrue(uart_comm.negotiate_checksum('crc16'))
+                self.assertIs(uart_comm.checksum, CRC16)
+                self.assertIs(mcu.checksum, CRC16)
+                self.assertEqual(uart_comm.send_command(0x01).result(timeout=1), 1)
+                mcu.send_position(12, 34)
+                self.assertTrue(wait_for(lambda: uart_comm.get_current_position()['azimuth'] == 12))
+            finally:
+                uart_comm.close()
+
+    def test_keeps_xor_when_unsupported(self):
+        with FakeMCU(capabilities=0) as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                self.assertFalse(uart_comm.negotiate_checksum('crc16'))
+                self.assertIs(uart_comm.checksum, XOR)
+            finally:
+                uart_comm.close()
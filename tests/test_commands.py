@@ -0,0 +1,52 @@
+import unittest
+import command_pb2
+from commands import (CommandEncoder, CommandDecoder, RotatorCommands, PROTOBUF_COMMAND_ID,
+                      SET_POSITION_COMMAND_ID)
+from setpoint_stream import velocity_payload
+from uart_comm import SET_VELOCITY_COMMAND_ID
+from mcu_simulator import FakeMCU
+from uart_comm import UARTCommunication
+
+PROTOBUF_ONLY = {'set_position': 'protobuf', 'set_velocity': 'protobuf', 'set_calibration': 'protobuf'}
+
+class TestCommandCodec(unittest.TestCase):
+    def test_round_trip_in_both_formats(self):
+        decoder = CommandDecoder()
+        for encoder in (CommandEncoder(), CommandEncoder(PROTOBUF_ONLY)):
+            name, values = decoder.decode(*encoder.set_position(45.0, 30.0))
+            self.assertEqual((name, values), ('set_position', (45.0, 30.0)))
+            name, values = decoder.decode(*encoder.set_velocity(-1.5, 2.5))
+            self.assertEqual(name, 'set_velocity')
+            self.assertAlmostEqual(values[0], -1.5, places=3)
+            self.assertAlmostEqual(values[1], 2.5, places=3)
+        self.assertEqual(decoder.decode(*CommandEncoder().reset()), ('reset', ()))
+
+    def test_struct_velocity_is_the_gamepad_setpoint(self):
+        self.assertEqual(CommandEncoder(max_rate=5.0).set_velocity(2.5, -10.0),
+                         (SET_VELOCITY_COMMAND_ID, velocity_payload(0.5, -1.0)))  # Saturates past max_rate
+
+    def test_protobuf_payload_is_a_turret_command(self):
+        command_id, payload = CommandEncoder(PROTOBUF_ONLY).set_position(45.0, 30.0)
+        self.assertEqual(command_id, PROTOBUF_COMMAND_ID)
+        command = command_pb2.Command.FromString(payload)
+        self.assertEqual(command.set_position.elevation, 30.0)
+
+    def test_encoder_reuses_message_object(self):
+        encoder = CommandEncoder(PROTOBUF_ONLY)
+        command = encoder.command
+        encoder.set_position(1.0, 2.0)
+        encoder.get_velocity()
+        self.assertIs(encoder.command, command)
+        self.assertEqual(command.WhichOneof('command_type'), 'get_velocity')
+
+    def test_typed_api_sends_framed_commands(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                commands = RotatorCommands(uart_comm)
+                commands.set_position(180.0, 45.0).result(timeout=1)
+                commands.get_position().result(timeout=1)
+                self.assertEqual(mcu.received[0][1], SET_POSITION_COMMAND_ID)
+                self.assertEqual(CommandDecoder().decode(*mcu.received[1][1:]), ('get_position', ()))
+            finally:
+                uart_comm.close()
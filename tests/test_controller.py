@@ -1,7 +1,10 @@
 # tests/test_controller.py
+import time
 import unittest
+from array import array
 from unittest.mock import MagicMock, patch
-from controller import USBController
+from controller import USBController, DummyController, JoystickLoop
+from ws_protocol import MAX_AXES
 
 class TestUSBController(unittest.TestCase):
     @patch('controller.pygame')
@@ -20,3 +23,69 @@ class TestUSBController(unittest.TestCase):
         input_data = controller.get_input()
         self.assertIn('axes', input_data)
         self.assertIn('buttons', input_data)
+
+    @patch('controller.pygame')
+    def test_read_into(self, mock_pygame):
+        mock_joystick = MagicMock()
+        mock_joystick.get_numaxes.return_value = 2
+        mock_joystick.get_numbuttons.return_value = 3
+        mock_joystick.get_axis.side_effect = [0.5, -1.0]
+        mock_joystick.get_button.side_effect = [1, 0, 1]
+
+        controller = USBController()
+        controller.joystick = mock_joystick
+        axes = array('h', bytes(2 * MAX_AXES))
+        self.assertEqual(controller.read_into(axes), 0b101)
+        self.assertEqual(list(axes[:3]), [16383, -32767, 0])
+
+
+class TestJoystickLoop(unittest.TestCase):
+    def test_reports_changes_only(self):
+        controller = DummyController()
+        controller.configure()
+        changes = []
+        loop = JoystickLoop(controller, lambda buttons, axes: changes.append((buttons, axes.tolist()[:2])))
+        self.assertFalse(loop.sample())
+        controller.set_axis(1, -0.5)
+        controller.set_button(4, True)
+        self.assertTrue(loop.sample())
+        self.assertFalse(loop.sample())
+        controller.set_button(4, False)
+        self.assertTrue(loop.sample())
+        self.assertEqual(changes, [(1 << 4, [0, -16383]), (0, [0, -16383])])
+        self.assertEqual((loop.samples, loop.changes), (4, 2))
+
+    def test_fixed_rate(self):
+        controller = DummyController()
+        changes = []
+        start = time.monotonic()
+        loop = JoystickLoop(controller, lambda buttons, axes: changes.append(buttons), rate_hz=200).start()
+        try:
+            controller.set_button(0, True)
+            time.sleep(0.25)
+        finally:
+            loop.stop()
+        elapsed = time.monotonic() - start
+        self.assertTrue(controller.is_connected())
+        self.assertEqual(changes, [1])
+        # Absolute deadlines: never faster than the rate, and late samples are skipped rather than bursted
+        self.assertGreater(loop.samples, 1)
+        self.assertLessEqual(loop.samples, elapsed * 200 + 2)
+
+    def test_failing_reads_back_off(self):
+        controller = DummyController()
+        reads = []
+
+        def read_into(axes):
+            reads.append(time.monotonic())
+            raise OSError("read error")
+        controller.read_into = read_into
+        start = time.monotonic()
+        loop = JoystickLoop(controller, lambda buttons, axes: None, reconnect_interval=0.05).start()
+        try:
+            time.sleep(0.2)
+        finally:
+            loop.stop()
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(len(reads), 1)
+        self.assertLessEqual(len(reads), elapsed / 0.05 + 1)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from devices import DeviceRegistry, load_device_config, DEFAULT_DEVICE
+from mcu_simulator import FakeMCU
+
+class TestDeviceConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'devices.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, config):
+        with open(self.path, 'w') as f:
+            json.dump(config, f)
+
+    def test_missing_file_is_one_default_device(self):
+        self.assertEqual(load_device_config(self.path), {DEFAULT_DEVICE: {}})
+
+    def test_order_and_settings(self):
+        self.write({'uhf': {'port': '/dev/ttyUSB0'}, 'sband': {'port': '/dev/ttyUSB1', 'checksum': 'crc16'}})
+        config = load_device_config(self.path)
+        self.assertEqual(list(config), ['uhf', 'sband'])
+        registry = DeviceRegistry.from_config(config)
+        self.assertEqual(registry.default.name, 'uhf')
+        self.assertEqual(registry['sband'].uart.port, '/dev/ttyUSB1')
+        self.assertEqual(registry['sband'].uart.preferred_checksum, 'crc16')
+
+    def test_invalid(self):
+        for config in ({}, {'u h f': {}}, {'uhf': {'parity': 'N'}}, {'uhf': '/dev/ttyUSB0'}):
+            self.write(config)
+            with self.assertRaises(ValueError):
+                load_device_config(self.path)
+
+class TestDeviceRegistry(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcus = [FakeMCU().start() for _ in range(8)]
+        config = {f'rotator{i}': {'port': mcu.port} for i, mcu in enumerate(self.mcus)}
+        self.directory = tempfile.TemporaryDirectory()
+        self.registry = DeviceRegistry.from_config(config, mapping_path=os.path.join(self.directory.name, 'map.json'))
+        await self.registry.start()
+        self.assertTrue(await self.registry.wait_attached(2))
+
+    async def asyncTearDown(self):
+        self.registry.stop()
+        for mcu in self.mcus:
+            mcu.stop()
+        self.directory.cleanup()
+
+    async def test_devices_share_the_loop_thread(self):
+        threads = threading.active_count()
+        self.assertTrue(all(device.uart.is_connected() for device in self.registry))
+        for i, mcu in enumerate(self.mcus):
+            mcu.send_position(i * 10, i)
+        for _ in range(100):
+            if all(device.uart.get_current_position()['azimuth'] == i * 10 for i, device in enumerate(self.registry)):
+                break
+            await asyncio.sleep(0.01)
+        for i, device in enumerate(self.registry):
+            self.assertEqual(device.uart.get_current_position(), {'azimuth': i * 10, 'elevation': i})
+        self.assertEqual(threading.active_count(), threads)
+
+    async def test_actions_reach_their_own_device(self):
+        self.registry['rotator3'].handle_action('arm')
+        self.registry['rotator5'].handle_axis_action('move_x', 1.0)
+        for _ in range(100):
+            if self.mcus[3].received and self.mcus[5].received:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual([command_id for _, command_id, _ in self.mcus[3].received], [0x01])
+        self.assertEqual({command_id for _, command_id, _ in self.mcus[5].received}, {0x84})
+        self.assertFalse(any(mcu.received for i, mcu in enumerate(self.mcus) if i not in (3, 5)))
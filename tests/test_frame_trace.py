@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from frame_trace import FrameTrace, read_trace, RX, TX
+from uart_comm import UARTCommunication
+from mcu_simulator import FakeMCU, wait_for
+
+class TestFrameTrace(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'trace.bin')
+
+    def test_records_round_trip(self):
+        trace = FrameTrace(self.path)
+        trace.record(RX, b'\x02\x00\x09\x00\x09\x03')
+        trace.record(TX, memoryview(b'\x02\x01\x01\x00\x00\x03'))
+        trace.close()
+        records = list(read_trace(self.path))
+        self.assertEqual([(direction, frame) for _, direction, frame in records],
+                         [(RX, b'\x02\x00\x09\x00\x09\x03'), (TX, b'\x02\x01\x01\x00\x00\x03')])
+        self.assertLessEqual(records[0][0], records[1][0])
+
+    def test_uart_traces_sent_and_received_frames(self):
+        with FakeMCU() as mcu, mock.patch.dict(os.environ, {'UART_FRAME_TRACE': self.path}):
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                uart_comm.send_command(0x01).result(timeout=1)
+                mcu.send_position(10, 20)
+                self.assertTrue(wait_for(lambda: uart_comm.get_current_position()['azimuth'] == 10))
+            finally:
+                uart_comm.close()
+        directions = [direction for _, direction, _ in read_trace(self.path)]
+        self.assertEqual(directions, [TX, RX, RX])
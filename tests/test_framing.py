@@ -0,0 +1,35 @@
+import unittest
+from framing import FrameParser
+from mcu_simulator import FakeMCU
+
+POSITION = FakeMCU.build_frame(1, 0x09, b'\x00\x5a\x00\x0a')
+ACK = FakeMCU.build_frame(2, 0x06)
+
+class TestFrameParser(unittest.TestCase):
+    def test_frames_split_across_reads(self):
+        parser = FrameParser()
+        stream = POSITION + ACK
+        frames = []
+        for i in range(len(stream)):
+            frames.extend(bytes(frame) for frame in parser.feed(stream[i:i + 1]))
+        self.assertEqual(frames, [POSITION, ACK])
+        self.assertEqual(len(parser), 0)
+
+    def test_frames_are_memoryviews(self):
+        parser = FrameParser()
+        for frame in parser.feed(POSITION):
+            self.assertIsInstance(frame, memoryview)
+            self.assertEqual(frame, POSITION)
+
+    def test_resyncs_to_next_start_byte(self):
+        parser = FrameParser()
+        broken = POSITION[:-1] + b'\xff'  # Wrong END_BYTE
+        frames = [bytes(frame) for frame in parser.feed(b'\x55\x02' + broken + b'\x00' + ACK)]
+        self.assertEqual(frames, [ACK])
+        self.assertGreaterEqual(parser.resyncs, 2)
+
+    def test_stream_larger_than_capacity(self):
+        parser = FrameParser(capacity=64)
+        stream = (POSITION + ACK) * 100
+        frames = [bytes(frame) for frame in parser.feed(stream)]
+        self.assertEqual(frames, [POSITION, ACK] * 100)
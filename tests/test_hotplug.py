@@ -0,0 +1,75 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from async_uart import AsyncUARTCommunication
+from hotplug import PortWatcher, UARTSupervisor
+from mcu_simulator import FakeMCU
+
+class TestUARTSupervisor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'ttyUSB0')  # Stands in for the adapter's device node
+        self.mcus = []
+
+    async def asyncTearDown(self):
+        for mcu in self.mcus:
+            mcu.stop()
+        self.directory.cleanup()
+
+    def plug(self, **options):
+        mcu = FakeMCU(**options).start()
+        self.mcus.append(mcu)
+        os.symlink(mcu.port, self.path)
+        return mcu
+
+    def unplug(self, mcu):
+        os.unlink(self.path)
+        mcu.stop()
+        self.mcus.remove(mcu)
+
+    async def test_watcher_sees_new_nodes(self):
+        watcher = PortWatcher(self.path)
+        if not watcher.start():
+            self.skipTest("inotify is not available")
+        try:
+            waiting = asyncio.ensure_future(watcher.wait(5))
+            await asyncio.sleep(0.01)
+            self.plug()
+            self.assertTrue(await asyncio.wait_for(waiting, 1))
+        finally:
+            watcher.close()
+
+    async def test_attaches_in_background_and_after_replug(self):
+        uart = AsyncUARTCommunication(port=self.path)
+        supervisor = UARTSupervisor(uart, min_backoff=0.05, max_backoff=0.2, reattach_timeout=5).start()
+        try:
+            await asyncio.sleep(0.1)
+            self.assertFalse(uart.is_connected())  # No adapter yet; startup was not held up
+            silent = self.plug(loss=1.0)
+            await uart.wait_attached(2)
+            command = asyncio.ensure_future(uart.send_command(0x01))
+            await asyncio.sleep(0.05)
+            self.unplug(silent)  # The command is still waiting for its ACK
+            await asyncio.wait_for(uart.wait_lost(), 1)
+            mcu = self.plug()
+            attempts = await asyncio.wait_for(command, 5)
+            self.assertGreater(attempts, 1)
+            self.assertEqual([command_id for _, command_id, _ in mcu.received], [0x01])
+            self.assertEqual(supervisor.attaches, 2)
+        finally:
+            supervisor.stop()
+            uart.close()
+
+    async def test_commands_fail_without_reattach(self):
+        mcu = self.plug(loss=1.0)
+        uart = AsyncUARTCommunication(port=mcu.port)
+        await uart.connect()
+        try:
+            command = asyncio.ensure_future(uart.send_command(0x01))
+            await asyncio.sleep(0.05)
+            self.unplug(mcu)
+            with self.assertRaises(Exception):
+                await asyncio.wait_for(command, 1)
+        finally:
+            uart.close()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from input_mapper import InputMapper, AxisBinding
+from ws_protocol import encode_gamepad, AXIS_SCALE
+
+class TestInputMapper(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.mapper = InputMapper(
+            button_actions={'arm': lambda: self.calls.append('arm'), 'disarm': lambda: self.calls.append('disarm')},
+            axis_actions={'move_x': lambda value: self.calls.append(('move_x', value))},
+            path=os.path.join(directory.name, 'mapping.json'),
+        )
+
+    def test_buttons_fire_once_per_press(self):
+        self.mapper.compile({'button_0': 'arm', 'button_5': 'disarm'})
+        session = self.mapper.session()
+        for buttons in (0b1, 0b1, 0b100001, 0b0, 0b1):
+            session.apply_frame(encode_gamepad(buttons, []))
+        self.assertEqual(self.calls, ['arm', 'disarm', 'arm'])
+
+    def test_axes_only_emit_meaningful_changes(self):
+        self.mapper.compile({'axis_1': {'action': 'move_x', 'deadzone': 0.1, 'scale': -1.0}})
+        session = self.mapper.session()
+        for value in (0.05, 0.55, 0.552, 0.7, 0.0):
+            session.apply(0, [0, round(value * AXIS_SCALE)] + [0] * 6)
+        self.assertEqual([call[0] for call in self.calls], ['move_x'] * 3)
+        self.assertAlmostEqual(self.calls[0][1], -0.5, places=3)
+        self.assertAlmostEqual(self.calls[1][1], -2 / 3, places=3)
+        self.assertEqual(self.calls[2][1], 0.0)
+
+    def test_json_frames_use_the_same_tables(self):
+        self.mapper.compile({'button_2': 'arm', 'axis_0': 'move_x'})
+        session = self.mapper.session()
+        session.apply_json({'buttons': {'button_2': True}, 'axes': {'axis_0': 1.0}})
+        session.apply_json({'buttons': {'button_2': True}, 'axes': {'axis_0': 1.0}})
+        self.assertEqual(self.calls, ['arm', ('move_x', 1.0)])
+
+    def test_curve(self):
+        binding = AxisBinding('move_x', None, deadzone=0.0, curve=2.0)
+        self.assertAlmostEqual(binding.shape(-0.5), -0.25)
+
+    def test_invalid_mappings_are_rejected(self):
+        for mapping in ({'button_0': 'launch'}, {'axis_0': 'move_z'}, {'pedal_0': 'arm'}, {'button_40': 'arm'},
+                        {'axis_0': {'action': 'move_x', 'deadzone': 1.5}}, {'axis_0': {'action': 'move_x', 'gain': 2}},
+                        {'axis_0': 5}, {'axis_0': True}, {'axis_0': ['move_x']}, {'button_0': ['arm']}):
+            with self.assertRaises(ValueError):
+                self.mapper.compile(mapping)
+        self.assertEqual(self.mapper.mapping, {})
+
+    def test_mapping_persists(self):
+        mapping = {'button_1': 'disarm', 'axis_0': {'action': 'move_x', 'curve': 3}}
+        self.mapper.compile(mapping)
+        self.mapper.save()
+        self.mapper.compile({})
+        self.assertTrue(self.mapper.load())
+        self.assertEqual(self.mapper.mapping, mapping)
+        self.assertEqual(self.mapper.table.axes[0][1].curve, 3.0)
+
+    def test_refresh_picks_up_other_writers(self):
+        other = InputMapper(self.mapper.button_actions, self.mapper.axis_actions, path=self.mapper.path)
+        self.assertFalse(self.mapper.refresh())
+        other.compile({'button_0': 'arm'})
+        other.save()
+        self.assertTrue(self.mapper.refresh())
+        self.assertEqual(self.mapper.mapping, {'button_0': 'arm'})
+        self.assertFalse(self.mapper.refresh())
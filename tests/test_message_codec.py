@@ -0,0 +1,38 @@
+import unittest
+from message_codec import CodecRegistry
+from mcu_simulator import FakeMCU
+from uart_comm import UARTCommunication, VELOCITY_REPORT_ID
+
+class TestCodecRegistry(unittest.TestCase):
+    def test_dispatch_unpacks_payload_in_place(self):
+        registry = CodecRegistry()
+        received = []
+        registry.register(0x09, 'position', '>HH', ('azimuth', 'elevation'), lambda *values: received.append(values))
+        frame = memoryview(FakeMCU.build_frame(0, 0x09, b'\x01\x00\x00\x2d'))
+        self.assertTrue(registry.dispatch(0x09, frame[4:8]))
+        self.assertEqual(received, [(256, 45)])
+
+    def test_unknown_and_short_payloads_are_rejected(self):
+        registry = CodecRegistry()
+        registry.register(0x09, 'position', '>HH', ('azimuth', 'elevation'), lambda *values: self.fail())
+        self.assertFalse(registry.dispatch(0x42, b''))
+        with self.assertLogs(level='ERROR'):
+            self.assertFalse(registry.dispatch(0x09, b'\x00\x01'))
+
+class TestTelemetryRegistration(unittest.TestCase):
+    def setUp(self):
+        self.mcu = FakeMCU().start()
+        self.uart_comm = UARTCommunication(port=self.mcu.port, timeout=1)
+
+    def tearDown(self):
+        self.uart_comm.close()
+        self.mcu.stop()
+
+    def test_builtin_telemetry(self):
+        self.uart_comm.handle_message(memoryview(FakeMCU.build_frame(0, VELOCITY_REPORT_ID, bytes.fromhex('3f80000040000000'))))
+        self.assertEqual(self.uart_comm.get_telemetry()['velocity'], {'azimuth_velocity': 1.0, 'elevation_velocity': 2.0})
+
+    def test_new_telemetry_type_is_one_registration(self):
+        self.uart_comm.register_telemetry(0x30, 'supply', '>H', ('millivolts',))  # Not allocated by the protocol
+        self.uart_comm.handle_message(FakeMCU.build_frame(0, 0x30, b'\x2e\xe0'))
+        self.assertEqual(self.uart_comm.get_telemetry()['supply'], {'millivolts': 12000})
@@ -0,0 +1,49 @@
+import time
+import unittest
+from metrics import Registry, SamplingProfiler, merge, render, RESYNCS
+from framing import FrameParser
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_buckets(self):
+        histogram = self.registry.histogram('rtt_seconds', "RTT.", buckets=(0.001, 0.01))
+        for value in (0.0005, 0.001, 0.002, 5):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(render(self.registry.collect()), (
+            '# HELP rtt_seconds RTT.\n'
+            '# TYPE rtt_seconds histogram\n'
+            'rtt_seconds_bucket{le="0.001"} 2\n'
+            'rtt_seconds_bucket{le="0.01"} 3\n'
+            'rtt_seconds_bucket{le="+Inf"} 4\n'
+            'rtt_seconds_sum 5.0035\n'
+            'rtt_seconds_count 4\n'))
+
+    def test_merge_adds_up_processes(self):
+        counter = self.registry.counter('frames_total', "Frames.")
+        self.registry.gauge('clients', "Clients.", lambda: 3)
+        self.registry.histogram('send_seconds', "Send.").observe(0.002)
+        counter.inc(5)
+        other = Registry()
+        other.counter('frames_total', "Frames.").inc(2)
+        other.histogram('send_seconds', "Send.").observe(0.2)
+        merged = {name: value for name, _, _, value in merge(self.registry.collect(), other.collect())}
+        self.assertEqual(merged['frames_total'], 7)
+        self.assertEqual(merged['clients'], 3)
+        self.assertEqual(sum(merged['send_seconds']['counts']), 2)
+
+    def test_parser_resyncs_are_counted(self):
+        before = RESYNCS.value
+        list(FrameParser().feed(b'\xff\xff\x02\x00\x01\x00\x01\x03'))
+        self.assertEqual(RESYNCS.value - before, 1)
+
+    def test_profiler_samples_other_threads(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        time.sleep(0.05)
+        profiler.stop()
+        self.assertGreater(profiler.samples, 0)
+        self.assertIn('MainThread;', profiler.folded())
+        self.assertFalse(profiler.running)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+import unittest
+from unittest import mock
+from async_uart import AsyncUARTCommunication
+from clock_sync import ClockSync, MCU_TIME_WRAP
+from mcu_simulator import FakeMCU, wait_for
+from uart_comm import UARTCommunication
+from position_estimator import PositionEstimator
+
+class TestClockSync(unittest.TestCase):
+    def test_shortest_round_trip_wins(self):
+        clock = ClockSync()
+        clock.add_sample(10.0, 1000.5 + 0.030, 10.100)  # ACK queued behind other frames
+        clock.add_sample(11.0, 1001.5 + 0.002, 11.004)
+        self.assertAlmostEqual(clock.offset, 990.5)
+        self.assertAlmostEqual(clock.error, 0.002)
+        self.assertAlmostEqual(clock.to_host(1002.0), 11.5)
+
+    def test_unwrap_and_reboot(self):
+        clock = ClockSync()
+        self.assertAlmostEqual(clock.unwrap(MCU_TIME_WRAP - 1_000_000), (MCU_TIME_WRAP - 1_000_000) / 1e6)
+        self.assertAlmostEqual(clock.unwrap(500_000), (MCU_TIME_WRAP + 500_000) / 1e6)
+        clock.add_sample(1.0, 5.0, 1.001)
+        self.assertTrue(clock.synced)
+        clock.unwrap(100_000)  # Clock went back without wrapping: the MCU rebooted
+        self.assertFalse(clock.synced)
+        self.assertAlmostEqual(clock.unwrap(200_000), 0.2)
+
+class TestPositionEstimator(unittest.TestCase):
+    def test_extrapolates_constant_rate(self):
+        estimator = PositionEstimator(max_rate=5.0)
+        for i in range(150):
+            estimator.update(10.0 + 2.0 * i * 0.02, 20.0 - 1.0 * i * 0.02, i * 0.02)
+        estimate = estimator.estimate(2.98 + 0.1)
+        self.assertAlmostEqual(estimate['azimuth_velocity'], 2.0, places=2)
+        self.assertAlmostEqual(estimate['elevation_velocity'], -1.0, places=2)
+        self.assertAlmostEqual(estimate['azimuth'], 10.0 + 2.0 * 3.08, places=2)
+        self.assertAlmostEqual(estimate['elevation'], 20.0 - 1.0 * 3.08, places=2)
+        horizon = estimator.estimate(2.98 + 10.0)  # Not extrapolated past max_horizon
+        self.assertAlmostEqual(horizon['azimuth'], 10.0 + 2.0 * (2.98 + estimator.max_horizon), places=2)
+
+    def test_azimuth_wraps(self):
+        estimator = PositionEstimator(max_rate=5.0, azimuth_min=0.0, azimuth_max=360.0)
+        for i in range(150):
+            estimator.update((350.0 + 4.0 * i * 0.02) % 360, 0.0, i * 0.02)
+        self.assertAlmostEqual(estimator.estimate(3.0)['azimuth'], (350.0 + 4.0 * 3.0) % 360, places=2)
+
+    def test_overlap_rotator_is_not_wrapped(self):
+        estimator = PositionEstimator(max_rate=5.0, azimuth_min=0.0, azimuth_max=450.0)
+        for i in range(150):
+            estimator.update(350.0 + 4.0 * i * 0.02, 0.0, i * 0.02)  # Past 360° into the overlap
+        self.assertAlmostEqual(estimator.estimate(3.0)['azimuth'], 350.0 + 4.0 * 3.0, places=2)
+        self.assertAlmostEqual(estimator.estimate(3.0)['azimuth_velocity'], 4.0, places=2)
+        estimator.update(5.0, 0.0, 3.0)  # 5° is 357° away on this rotator, not 3°: a restart, not motion
+        self.assertEqual(estimator.estimate(3.0)['azimuth'], 5.0)
+
+    def test_jump_restarts_the_track(self):
+        estimator = PositionEstimator(max_rate=5.0)
+        estimator.update(10, 10, 0.0)
+        estimator.update(10, 10, 0.1)
+        estimator.update(180, 45, 0.2)  # 850 deg/s: a new target or a reconnect, not motion
+        self.assertEqual(estimator.estimate(0.3), {'azimuth': 180.0, 'elevation': 45.0, 'azimuth_velocity': 0.0,
+                                                   'elevation_velocity': 0.0, 'age': estimator.estimate(0.3)['age']})
+
+class TestMCUTimestamps(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcu = FakeMCU(delay=0.05, boot_time=1000.0).start()
+        self.uart_comm = AsyncUARTCommunication(port=self.mcu.port)
+        await self.uart_comm.connect()
+
+    async def asyncTearDown(self):
+        self.uart_comm.close()
+        self.mcu.stop()
+
+    async def test_reports_are_dated_by_the_mcu(self):
+        self.assertTrue(await self.uart_comm.enable_timestamps())
+        for _ in range(5):
+            await self.uart_comm.send_command(0x01)
+        self.assertTrue(self.uart_comm.clock.synced)
+        sampled = time.time()
+        self.mcu.send_position(90, 10)
+        for _ in range(100):
+            if self.uart_comm.get_reported_position()['azimuth'] == 90:
+                break
+            await asyncio.sleep(0.01)
+        times, values = self.uart_comm.history['position'].range(0, float('inf'))
+        self.assertEqual(list(values[-1]), [90, 10])
+        # Read 50 ms after it was sampled, dated to within the offset's error bound
+        self.assertLess(abs(times[-1] - sampled), self.uart_comm.clock.error + 0.01)
+        self.assertEqual(self.uart_comm.get_current_position(), {'azimuth': 90, 'elevation': 10})
+
+class TestThreadedMCUTimestamps(unittest.TestCase):
+    def test_clock_is_sampled_from_acks(self):
+        with FakeMCU(delay=0.05, boot_time=1000.0) as mcu, mock.patch.dict(os.environ, {'UART_MCU_TIMESTAMPS': '1'}):
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                self.assertTrue(uart_comm.mcu_timestamps)
+                for _ in range(5):
+                    uart_comm.send_command(0x01).result(timeout=2)
+                self.assertTrue(uart_comm.clock.synced)
+                sampled = time.time()
+                mcu.send_position(90, 10)
+                self.assertTrue(wait_for(lambda: uart_comm.get_reported_position()['azimuth'] == 90))
+                times, _ = uart_comm.history['position'].range(0, float('inf'))
+                self.assertLess(abs(times[-1] - sampled), uart_comm.clock.error + 0.01)
+            finally:
+                uart_comm.close()
@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+from retransmission import RetransmissionScheduler, SlidingWindow
+
+def frame_for(message_id):
+    return bytes([message_id])
+
+class TestRetransmissionScheduler(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.scheduler = RetransmissionScheduler(self.sent.append, base_timeout=0.01, max_backoff=0.02,
+                                                 max_attempts=3, window_size=16)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_thread_count_is_constant_under_load(self):
+        threads_before = threading.active_count()
+        futures = []
+        for i in range(5000):
+            futures.append(self.scheduler.submit(frame_for))
+            self.assertEqual(threading.active_count(), threads_before)
+            if i % 16 == 15:
+                for message_id in list(self.scheduler.pending):
+                    self.scheduler.acknowledge(message_id)
+        for message_id in list(self.scheduler.pending):
+            self.scheduler.acknowledge(message_id)
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(threading.active_count(), threads_before)
+
+    def test_ack_resolves_future(self):
+        future = self.scheduler.submit(frame_for)
+        self.assertTrue(self.scheduler.acknowledge(0))
+        self.assertGreaterEqual(future.result(timeout=1), 0)
+        self.assertFalse(self.scheduler.acknowledge(0))
+
+    def test_retransmits_until_attempts_exhausted(self):
+        future = self.scheduler.submit(frame_for)
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=2)
+        self.assertEqual(self.sent.count(b'\x00'), 4)
+
+    def test_unacked_message_is_resent(self):
+        self.scheduler.submit(frame_for)
+        deadline = time.monotonic() + 1
+        while self.sent.count(b'\x00') < 2 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.assertGreaterEqual(self.sent.count(b'\x00'), 2)
+        self.scheduler.acknowledge(0)
+
+    def test_backoff_schedule(self):
+        now = 0.0
+        scheduler = RetransmissionScheduler(lambda frame: None, clock=lambda: now)
+        future = scheduler.submit(frame_for)
+        sent_at = []
+        while scheduler.next_deadline() is not None:
+            now = scheduler.next_deadline()
+            if scheduler.due(now):
+                sent_at.append(round(now, 3))
+        # base_timeout 0.1 s before the first retransmission, doubling up to max_backoff 1 s
+        self.assertEqual(sent_at, [0.0, 0.1, 0.3, 0.7, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5])
+        self.assertIsInstance(future.exception(timeout=0), TimeoutError)
+
+    def test_commands_beyond_window_wait_for_acks(self):
+        futures = [self.scheduler.submit(frame_for) for _ in range(20)]
+        self.assertEqual(len(self.scheduler.pending), 16)
+        self.assertEqual(self.scheduler.acknowledge_cumulative(4), [0, 1, 2, 3])
+        self.assertEqual(len(self.scheduler.pending), 16)
+        self.assertEqual(sorted(self.scheduler.pending)[-1], 19)
+        self.assertTrue(all(f.done() for f in futures[:4]))
+
+class TestSlidingWindow(unittest.TestCase):
+    def test_ids_do_not_collide_across_wraparound(self):
+        window = SlidingWindow(size=4)
+        for i in range(600):
+            if window.full():
+                window.acknowledge(window.base())
+            self.assertNotIn(window.next_id, window.outstanding)
+            window.allocate(i)
+
+    def test_cumulative_and_selective_ack(self):
+        window = SlidingWindow(size=8)
+        for i in range(6):
+            window.allocate(i)
+        # 0 and 1 arrived in order, 2 was lost, 3 and 5 arrived
+        acked = window.acknowledge_cumulative(2, 0b101)
+        self.assertEqual(sorted(message_id for message_id, _ in acked), [0, 1, 3, 5])
+        self.assertEqual(sorted(window.outstanding), [2, 4])
+
+    def test_window_is_full_while_base_is_outstanding(self):
+        window = SlidingWindow(size=4)
+        for i in range(4):
+            window.allocate(i)
+        window.acknowledge(3)
+        self.assertTrue(window.full())
+        window.acknowledge(0)
+        self.assertFalse(window.full())
+
+    def test_stale_cumulative_ack_is_ignored(self):
+        window = SlidingWindow(size=4)
+        for i in range(3):
+            window.allocate(i)
+        self.assertEqual(window.acknowledge_cumulative(200), [])
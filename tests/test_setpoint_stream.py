@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from setpoint_stream import SetpointStreamer, velocity_payload, link_budget_rate
+from mcu_simulator import FakeMCU, wait_for
+from uart_comm import UARTCommunication, SET_VELOCITY_COMMAND_ID, STREAM_FLAG
+
+class FakeUART:
+    baudrate = 115200
+
+    def __init__(self):
+        self.sent = []
+
+    def is_connected(self):
+        return True
+
+    def send_unacked(self, command_id, payload):
+        self.sent.append((command_id, payload))
+
+class TestSetpointStreamer(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_are_coalesced_per_command(self):
+        uart = FakeUART()
+        streamer = SetpointStreamer(uart, max_rate_hz=20, refresh_interval=10)
+        streamer.start()
+        for i in range(100):
+            streamer.update(SET_VELOCITY_COMMAND_ID, velocity_payload(i / 100, 0))
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.1)
+        streamer.stop()
+        self.assertLess(len(uart.sent), 10)
+        self.assertEqual(uart.sent[-1], (SET_VELOCITY_COMMAND_ID, velocity_payload(0.99, 0)))
+
+    async def test_unchanged_setpoint_is_refreshed(self):
+        uart = FakeUART()
+        streamer = SetpointStreamer(uart, max_rate_hz=100, refresh_interval=0.02)
+        streamer.update(SET_VELOCITY_COMMAND_ID, velocity_payload(0.5, 0.5))
+        streamer.start()
+        await asyncio.sleep(0.1)
+        streamer.stop()
+        self.assertGreaterEqual(len(uart.sent), 3)
+
+    def test_rate_is_capped_by_link_budget(self):
+        uart = FakeUART()
+        uart.baudrate = 1200
+        streamer = SetpointStreamer(uart, max_rate_hz=50)
+        self.assertAlmostEqual(streamer.rate_hz, link_budget_rate(1200, 11))
+        self.assertLess(streamer.rate_hz, 50)
+
+class TestSendUnacked(unittest.TestCase):
+    def test_streamed_setpoints_use_sequence_numbers_without_acks(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                for _ in range(3):
+                    uart_comm.send_unacked(SET_VELOCITY_COMMAND_ID, velocity_payload(0.1, -0.1))
+                self.assertTrue(wait_for(lambda: len(mcu.received) == 3))
+                self.assertEqual([m[0] for m in mcu.received], [0, 1, 2])
+                self.assertTrue(all(m[1] == SET_VELOCITY_COMMAND_ID | STREAM_FLAG for m in mcu.received))
+                self.assertEqual(len(uart_comm.retransmission.pending), 0)
+            finally:
+                uart_comm.close()
@@ -0,0 +1,45 @@
+import time
+import unittest
+from shared_state import SharedState, SEQUENCE
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.state = SharedState.create({'position': ('azimuth', 'elevation'), 'status': ('state',)})
+        self.reader = SharedState.attach(self.state.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.state.close()
+
+    def test_reader_sees_writes(self):
+        self.assertEqual(self.reader.channels, self.state.channels)
+        self.assertEqual(self.reader.read('position')['count'], 0)
+        self.state.write('position', (120.5, 30.0), timestamp=10.0)
+        self.state.write('position', (121.0, 31.0), timestamp=11.0)
+        self.state.write('status', (1,))
+        self.assertEqual(self.reader.read('position'),
+                         {'count': 2, 'time': 11.0, 'azimuth': 121.0, 'elevation': 31.0})
+        self.assertEqual(self.reader.read()['status']['state'], 1.0)
+        self.assertEqual(self.reader.snapshot()[0], 6)
+
+    def test_snapshot_retries_during_write(self):
+        self.state.write('status', (1,))
+        buf = self.state.shm.buf
+        SEQUENCE.pack_into(buf, self.state.data_offset, self.state.sequence + 1)  # Writer in progress
+        attempts = []
+
+        def layout_unpack(buffer, offset, unpack=self.reader.layout.unpack_from):
+            attempts.append(offset)
+            if len(attempts) == 3:
+                SEQUENCE.pack_into(buf, self.state.data_offset, self.state.sequence)  # Writer done
+            return unpack(buffer, offset)
+        self.reader.layout = type('Layout', (), {'unpack_from': staticmethod(layout_unpack)})
+        self.assertEqual(self.reader.snapshot()[0], 2)
+        self.assertEqual(len(attempts), 3)
+
+    def test_snapshot_gives_up_on_a_dead_writer(self):
+        SEQUENCE.pack_into(self.state.shm.buf, self.state.data_offset, self.state.sequence + 1)  # Never finished
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            self.reader.snapshot(timeout=0.01)
+        self.assertLess(time.monotonic() - start, 1)
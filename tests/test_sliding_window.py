@@ -0,0 +1,33 @@
+import unittest
+from mcu_simulator import FakeMCU, LinkSimulator
+from uart_comm import UARTCommunication
+
+class TestSlidingWindowSimulation(unittest.TestCase):
+    def test_window_makes_throughput_baud_limited(self):
+        stop_and_wait = LinkSimulator(window_size=1).run(200)
+        pipelined = LinkSimulator(window_size=8).run(200)
+        self.assertGreater(pipelined['commands_per_second'], 3 * stop_and_wait['commands_per_second'])
+        # A 10-byte frame at 115200 baud takes ~0.87 ms, i.e. at most ~1150 frames/s
+        self.assertGreater(pipelined['commands_per_second'], 1000)
+
+    def test_all_commands_complete_under_loss(self):
+        for window_size in (1, 8, 32):
+            for loss in (0.01, 0.05):
+                result = LinkSimulator(window_size=window_size, loss=loss, seed=window_size).run(200)
+                self.assertEqual(result['failed'], 0)
+                self.assertGreater(result['retransmissions'], 0)
+
+    def test_selective_acks_reduce_retransmissions(self):
+        per_message = LinkSimulator(window_size=16, loss=0.05, cumulative_acks=False, seed=3).run(500)
+        cumulative = LinkSimulator(window_size=16, loss=0.05, cumulative_acks=True, seed=3).run(500)
+        self.assertLess(cumulative['retransmissions'], per_message['retransmissions'])
+
+    def test_cumulative_acks_over_pty(self):
+        with FakeMCU(cumulative_acks=True) as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                futures = [uart_comm.send_command(0x01) for _ in range(40)]
+                self.assertTrue(all(future.result(timeout=2) >= 1 for future in futures))
+                self.assertEqual(len(mcu.received), 40)
+            finally:
+                uart_comm.close()
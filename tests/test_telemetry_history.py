@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+from telemetry_history import TelemetryHistory, decimate_minmax, decimate_lttb
+
+class TestTelemetryHistory(unittest.TestCase):
+    def test_ring_keeps_only_the_newest_samples(self):
+        history = TelemetryHistory(('azimuth', 'elevation'), capacity=100)
+        for i in range(250):
+            history.append((i, -i), timestamp=float(i))
+        self.assertEqual(len(history), 100)
+        times, values = history.range(0, 1000)
+        np.testing.assert_array_equal(times, np.arange(150, 250))
+        np.testing.assert_array_equal(values[:, 1], -np.arange(150, 250))
+
+    def test_range_across_wrap(self):
+        history = TelemetryHistory(('value',), capacity=10)
+        for i in range(15):
+            history.append((i,), timestamp=float(i))
+        times, _ = history.range(8, 11)
+        np.testing.assert_array_equal(times, [8, 9, 10, 11])
+
+    def test_query_without_decimation_returns_columns(self):
+        history = TelemetryHistory(('azimuth', 'elevation'), capacity=10)
+        history.append((1, 2), timestamp=5.0)
+        self.assertEqual(history.query(0, 10, 100), {'time': [5.0], 'azimuth': [1.0], 'elevation': [2.0]})
+
+    def test_minmax_keeps_spikes(self):
+        times = np.arange(10000, dtype=np.float64)
+        values = np.zeros((10000, 1), dtype=np.float32)
+        values[4321] = 99
+        values[777] = -5
+        out_times, out_values = decimate_minmax(times, values, 100)
+        self.assertEqual(len(out_times), 100)
+        self.assertEqual(out_values.max(), 99)
+        self.assertEqual(out_values.min(), -5)
+        self.assertTrue(np.all(np.diff(out_times) >= 0))
+
+    def test_lttb_selects_real_samples_including_endpoints(self):
+        times = np.arange(5000, dtype=np.float64)
+        values = np.sin(times / 100).astype(np.float32).reshape(-1, 1)
+        values[2500] = 10
+        out_times, out_values = decimate_lttb(times, values, 200)
+        self.assertEqual(len(out_times), 200)
+        self.assertEqual((out_times[0], out_times[-1]), (0, 4999))
+        self.assertIn(2500, out_times)
+        np.testing.assert_array_equal(out_values[:, 0], values[out_times.astype(int), 0])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            TelemetryHistory(('value',), capacity=10).query(0, 1, 10, 'median')
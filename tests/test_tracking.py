@@ -0,0 +1,87 @@
+import unittest
+from concurrent.futures import Future
+import numpy as np
+from tracking import (Station, RotatorLimits, PassTrajectory, PassScheduler, TLEPredictor, look_angles,
+                      next_pass, compute_pass, fit_to_rotator, limit_rate)
+
+ISS_TLE = ("1 25544U 98067A   08264.51782528 -.00002182  00000-0 -11606-4 0  2927",
+           "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537")
+ISS_EPOCH = 1221913540.0
+
+
+class RecordingCommands:
+    def __init__(self):
+        self.sent = []
+
+    def set_position(self, azimuth, elevation):
+        self.sent.append((azimuth, elevation))
+        future = Future()
+        future.set_result(1)
+        return future
+
+
+class OverheadPredictor:
+    """
+    Pass straight over the station: azimuth 90° rising to 90° elevation, then 270° setting.
+    """
+    def look_angles(self, times):
+        elevation = 90.0 - np.abs(times - 300.0) * 0.3
+        return np.where(times < 300.0, 90.0, 270.0), elevation
+
+
+class TestTracking(unittest.TestCase):
+    def test_look_angles(self):
+        station = Station(52.5, 13.4, 0)
+        overhead = station.ecef + 500 * station.enu[2]
+        north = station.ecef + 500 * station.enu[1] + 1 * station.enu[2]
+        azimuth, elevation, distance = look_angles(station, np.array([overhead, north]))
+        self.assertAlmostEqual(elevation[0], 90.0, places=6)
+        self.assertAlmostEqual(distance[0], 500.0, places=6)
+        self.assertAlmostEqual(azimuth[1] % 360, 0.0, places=6)
+
+    def test_azimuth_crossing_north_is_unwrapped(self):
+        azimuth = np.array([340.0, 350.0, 0.0, 10.0, 20.0])
+        fitted, _, flipped = fit_to_rotator(azimuth, np.full(5, 30.0), RotatorLimits(0, 450))
+        np.testing.assert_allclose(np.diff(fitted), 10.0)
+        self.assertFalse(flipped)
+        self.assertTrue(0 <= fitted.min() and fitted.max() <= 450)
+
+    def test_pass_is_flipped_when_azimuth_does_not_fit(self):
+        azimuth = np.array([340.0, 350.0, 0.0, 10.0, 20.0])
+        fitted, elevation, flipped = fit_to_rotator(azimuth, np.full(5, 30.0), RotatorLimits(0, 360, 180))
+        self.assertTrue(flipped)
+        np.testing.assert_allclose(elevation, 150.0)
+        self.assertTrue(0 <= fitted.min() and fitted.max() <= 360)
+
+    def test_keyhole_rate_is_limited(self):
+        times = np.arange(0, 120, 0.1)
+        azimuth = np.where(times < 60, 90.0, 270.0)  # 180° jump at zenith
+        limited = limit_rate(times, azimuth, 5.0)
+        self.assertLessEqual(np.abs(np.diff(limited)).max(), 0.5 + 1e-9)
+        self.assertEqual((limited[0], limited[-1]), (90.0, 270.0))
+
+    def test_tle_pass(self):
+        predictor = TLEPredictor(*ISS_TLE, Station(52.52, 13.405, 34))
+        aos, los = next_pass(predictor, ISS_EPOCH)
+        self.assertTrue(ISS_EPOCH < aos < los < aos + 1200)
+        trajectory = compute_pass(predictor, aos, los, 10, RotatorLimits())
+        self.assertEqual(len(trajectory), round((los - aos) * 10))
+        self.assertGreater(trajectory.elevation.max(), 0)
+        self.assertLessEqual(np.abs(np.diff(trajectory.azimuth)).max(), 0.5 + 1e-9)
+
+    def test_elevation_is_clipped_to_the_rotator(self):
+        trajectory = compute_pass(OverheadPredictor(), 0.0, 600.0, 10, RotatorLimits(0, 450, 80))
+        self.assertFalse(trajectory.flipped)
+        self.assertAlmostEqual(trajectory.elevation.max(), 80.0)
+
+    def test_scheduler_sends_every_setpoint_on_time(self):
+        import time
+        start = time.time() + 0.05
+        times = start + np.arange(20) * 0.01
+        trajectory = PassTrajectory(times, np.arange(20.0), np.full(20, 10.0))
+        commands = RecordingCommands()
+        scheduler = PassScheduler(commands, trajectory).start()
+        scheduler.join(timeout=2)
+        self.assertEqual(len(commands.sent) + scheduler.skipped, 20)
+        self.assertEqual(commands.sent[-1], (19.0, 10.0))
+        self.assertLess(np.nanmedian(scheduler.lateness), 0.005)
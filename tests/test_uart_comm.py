@@ -1,12 +1,56 @@
-# tests/test_uart_comm.py
 import unittest
 from uart_comm import UARTCommunication
+from mcu_simulator import FakeMCU, wait_for
 
 class TestUARTCommunication(unittest.TestCase):
     def test_construct_command(self):
         uart_comm = UARTCommunication(port='/dev/null')
-        command_id = 0x01
-        payload = b'\x00\x01\x00\x02'
-        command = uart_comm.construct_command(command_id, payload)
-        expected_length = 1 + 1 + 1 + 4 + 1 + 1  # Start, ID, Length, Payload, Checksum, End
-        self.assertEqual(len(command), expected_length)
+        try:
+            command_id = 0x01
+            payload = b'\x00\x01\x00\x02'
+            command = uart_comm.construct_command(0x00, command_id, payload)
+            expected_length = 1 + 1 + 1 + 1 + 4 + 1 + 1  # Start, Message ID, Command ID, Length, Payload, Checksum, End
+            self.assertEqual(len(command), expected_length)
+        finally:
+            uart_comm.close()
+
+    def test_position_report_is_read_without_polling_delay(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                mcu.send_position(180, 45)
+                self.assertTrue(wait_for(lambda: uart_comm.get_current_position()['azimuth'] == 180, timeout=0.05))
+                self.assertEqual(uart_comm.get_current_position(), {'azimuth': 180, 'elevation': 45})
+            finally:
+                uart_comm.close()
+
+    def test_send_command_resolves_on_ack(self):
+        with FakeMCU() as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                future = uart_comm.send_command(0x01)
+                self.assertEqual(future.result(timeout=1), 1)
+                self.assertEqual(mcu.received[0][1], 0x01)
+            finally:
+                uart_comm.close()
+
+    def test_send_command_survives_lossy_link(self):
+        with FakeMCU(loss=0.3, seed=1) as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            uart_comm.retransmission.base_timeout = 0.01
+            try:
+                futures = [uart_comm.send_command(0x01) for _ in range(10)]
+                attempts = [future.result(timeout=5) for future in futures]
+                self.assertGreater(sum(attempts), 10)
+                self.assertGreater(mcu.frames_dropped, 0)
+            finally:
+                uart_comm.close()
+
+    def test_periodic_position_reports(self):
+        with FakeMCU(report_rate_hz=200) as mcu:
+            uart_comm = UARTCommunication(port=mcu.port, timeout=1)
+            try:
+                mcu.position = [90, 30]
+                self.assertTrue(wait_for(lambda: uart_comm.get_current_position() == {'azimuth': 90, 'elevation': 30}))
+            finally:
+                uart_comm.close()
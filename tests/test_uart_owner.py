@@ -0,0 +1,141 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from async_uart import AsyncUARTCommunication
+from mcu_simulator import FakeMCU
+from shared_state import SEQUENCE
+from uart_owner import UARTOwner, UARTProxy, OwnerConnection, RemoteSetpoints
+
+class TestUARTOwner(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcu = FakeMCU().start()
+        self.directory = tempfile.TemporaryDirectory()
+        socket_path = os.path.join(self.directory.name, 'uart.sock')
+        self.owner = UARTOwner(socket_path, {'default': AsyncUARTCommunication(port=self.mcu.port)})
+        await self.owner.start()
+        for device in self.owner.devices:
+            await device.uart.wait_attached(2)
+        self.proxy = UARTProxy(socket_path, poll_hz=1000)
+        await self.proxy.connect()
+
+    async def asyncTearDown(self):
+        self.proxy.close()
+        await self.owner.close()
+        self.mcu.stop()
+        self.directory.cleanup()
+
+    async def test_commands_and_status(self):
+        self.assertTrue(self.proxy.is_connected())
+        self.assertEqual(await asyncio.wait_for(self.proxy.send_command(0x01), 1), 1)
+        self.assertIsNone(self.proxy.status_age())
+        statuses = await asyncio.gather(*(self.proxy.request_status() for _ in range(4)))
+        self.assertEqual({status['state'] for status, _ in statuses}, {1})
+        self.assertEqual([command_id for _, command_id, _ in self.mcu.received].count(0x07), 1)
+        self.assertLess(self.proxy.status_age(), 1)
+        self.assertEqual(self.proxy.get_telemetry()['status']['state'], 1)
+        families = {name: value for name, _, _, value in await self.proxy.collect_metrics()}
+        self.assertGreaterEqual(sum(families['uart_command_rtt_seconds']['counts']), 1)
+        self.assertEqual(await self.proxy.send_batch([(0x01, b''), (0x07, b'')]), [0, 0])
+        self.proxy.post_command(0x02)
+        RemoteSetpoints(self.proxy).update(0x04, b'\x00\x01\x00\x02')
+        for _ in range(100):
+            if {0x02, 0x84} <= {command_id for _, command_id, _ in self.mcu.received}:
+                break
+            await asyncio.sleep(0.01)
+        self.assertIn((0x84, b'\x00\x01\x00\x02'), [(command_id, payload) for _, command_id, payload in self.mcu.received])
+
+    async def test_position_and_history(self):
+        positions = []
+        self.proxy.add_position_listener(positions.append)
+        self.mcu.send_position(200, 30)
+        for _ in range(100):
+            if positions:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(positions, [{'azimuth': 200, 'elevation': 30}])
+        self.assertEqual(self.proxy.get_current_position(), {'azimuth': 200, 'elevation': 30})
+        history = await self.proxy.query_history('position', 0, 2e9, 10)
+        self.assertEqual(history['azimuth'], [200])
+        with self.assertRaises(KeyError):
+            await self.proxy.query_history('nope', 0, 2e9, 10)
+
+    async def test_reads_without_a_state_block(self):
+        proxy = UARTProxy(self.owner.socket_path)
+        self.assertFalse(proxy.is_connected())
+        self.assertIsNone(proxy.status_age())
+        self.assertEqual(proxy.get_telemetry(), {})
+        self.assertIsNone(proxy.get_reported_position())
+        self.assertIsNone(proxy.get_current_position())
+
+    async def test_stuck_state_block_reads_as_disconnected(self):
+        state = self.owner.devices[0].state
+        self.assertTrue(self.proxy.is_connected())
+        SEQUENCE.pack_into(state.shm.buf, state.data_offset, state.sequence + 1)  # Owner died mid-write
+        self.assertFalse(self.proxy.is_connected())
+        self.assertEqual(self.proxy.get_telemetry(), {})
+        SEQUENCE.pack_into(state.shm.buf, state.data_offset, state.sequence)
+        self.assertTrue(self.proxy.is_connected())
+
+    async def test_reconnects_after_owner_restart(self):
+        self.mcu.loss = 1.0
+        request = asyncio.ensure_future(self.proxy.send_command(0x01))
+        await asyncio.sleep(0.05)
+        await self.owner.close()  # Stops like a crashed owner for the workers: socket and state block gone
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(request, 1)
+        self.assertFalse(self.proxy.is_connected())
+        with self.assertRaises(ConnectionError):
+            await self.proxy.send_command(0x01)
+        self.mcu.loss = 0.0
+        self.owner = UARTOwner(self.owner.socket_path, {'default': AsyncUARTCommunication(port=self.mcu.port)})
+        await self.owner.start()
+        for _ in range(200):
+            if self.proxy.is_connected():
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(self.proxy.is_connected())
+        self.assertEqual(await asyncio.wait_for(self.proxy.send_command(0x01), 1), 1)
+        self.mcu.send_position(250, 20)
+        for _ in range(100):
+            if self.proxy.get_reported_position()['azimuth'] == 250:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.proxy.get_reported_position(), {'azimuth': 250, 'elevation': 20})
+
+class TestMultiDeviceOwner(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mcus = [FakeMCU().start() for _ in range(3)]
+        self.directory = tempfile.TemporaryDirectory()
+        socket_path = os.path.join(self.directory.name, 'uart.sock')
+        uarts = {f'rotator{i}': AsyncUARTCommunication(port=mcu.port) for i, mcu in enumerate(self.mcus)}
+        self.owner = UARTOwner(socket_path, uarts)
+        await self.owner.start()
+        for device in self.owner.devices:
+            await device.uart.wait_attached(2)
+        connection = OwnerConnection(socket_path)
+        self.proxies = [UARTProxy(connection, name, poll_hz=1000) for name in ('rotator2', 'rotator0', 'nope')]
+        await asyncio.gather(*(proxy.connect() for proxy in self.proxies))
+
+    async def asyncTearDown(self):
+        for proxy in self.proxies:
+            proxy.close()
+        await self.owner.close()
+        for mcu in self.mcus:
+            mcu.stop()
+        self.directory.cleanup()
+
+    async def test_requests_are_routed_by_device(self):
+        second, first, unknown = self.proxies
+        self.assertTrue(second.is_connected() and first.is_connected())
+        self.assertFalse(unknown.is_connected())
+        await asyncio.wait_for(second.send_command(0x01), 1)
+        self.assertEqual([command_id for _, command_id, _ in self.mcus[2].received], [0x01])
+        self.assertFalse(self.mcus[0].received or self.mcus[1].received)
+        self.mcus[0].send_position(120, 45)
+        for _ in range(100):
+            if first.get_current_position()['azimuth'] == 120:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(first.get_current_position(), {'azimuth': 120, 'elevation': 45})
+        self.assertEqual(second.get_current_position(), {'azimuth': 0, 'elevation': 0})
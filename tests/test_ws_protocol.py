@@ -0,0 +1,22 @@
+import unittest
+from ws_protocol import (encode_gamepad, decode_gamepad, encode_position, POSITION_FRAME, GAMEPAD_FRAME,
+                         MAX_AXES, AXIS_SCALE)
+
+class TestWSProtocol(unittest.TestCase):
+    def test_gamepad_round_trip(self):
+        data = encode_gamepad(0b101, [1.0, -1.0, 0.5, 2.0])
+        self.assertEqual(len(data), GAMEPAD_FRAME.size)
+        buttons, axes = decode_gamepad(data)
+        self.assertEqual(buttons, 0b101)
+        self.assertEqual(axes, (AXIS_SCALE, -AXIS_SCALE, round(0.5 * AXIS_SCALE), AXIS_SCALE) + (0,) * (MAX_AXES - 4))
+
+    def test_malformed_gamepad_frame(self):
+        with self.assertRaises(ValueError):
+            decode_gamepad(b'\x02\x00')
+        with self.assertRaises(ValueError):
+            decode_gamepad(encode_position(1, 2, 3).ljust(GAMEPAD_FRAME.size, b'\0'))
+
+    def test_position_frame(self):
+        data = encode_position(123.5, 45.25, 1700000000.125)
+        self.assertEqual(len(data), 17)
+        self.assertEqual(POSITION_FRAME.unpack(data), (0x01, 123.5, 45.25, 1700000000.125))
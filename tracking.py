@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+File: tracking.py
+Author: Jan Kühnemund
+Description: Satellite pass trajectories computed in one NumPy batch and streamed to the rotator on time.
+
+Run from the repository root:
+    python tracking.py --tle satellite.tle [--rate 10] [--mode position|velocity] [--dry-run]
+    python tracking.py --ephemeris pass.csv
+"""
+
+import argparse
+import logging
+import math
+import os
+import time
+from threading import Thread, Event
+import numpy as np
+from utils import load_config, setup_logging
+
+WGS84_A = 6378.137  # Equatorial radius in km
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+
+
+class Station:
+    """
+    Ground station location (WGS84 geodetic, degrees and meters).
+    """
+    def __init__(self, latitude: float, longitude: float, altitude: float = 0.0):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        height = altitude / 1000
+        n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+        self.ecef = np.array([(n + height) * math.cos(lat) * math.cos(lon),
+                              (n + height) * math.cos(lat) * math.sin(lon),
+                              (n * (1 - WGS84_E2) + height) * math.sin(lat)])
+        # Rows are the east, north and up unit vectors in ECEF
+        self.enu = np.array([[-math.sin(lon), math.cos(lon), 0.0],
+                             [-math.sin(lat) * math.cos(lon), -math.sin(lat) * math.sin(lon), math.cos(lat)],
+                             [math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)]])
+
+    @classmethod
+    def from_env(cls):
+        return cls(float(os.getenv('STATION_LATITUDE', '0')), float(os.getenv('STATION_LONGITUDE', '0')),
+                   float(os.getenv('STATION_ALTITUDE', '0')))
+
+
+class RotatorLimits:
+    """
+    Mechanical limits of the rotator (degrees, degrees/s).
+
+    An elevation range up to 180° allows flipped ("over the top") passes.
+    """
+    def __init__(self, azimuth_min: float = 0.0, azimuth_max: float = 360.0, elevation_max: float = 90.0,
+                 max_rate: float = 5.0):
+        self.azimuth_min = azimuth_min
+        self.azimuth_max = azimuth_max
+        self.elevation_max = elevation_max
+        self.max_rate = max_rate
+
+    @classmethod
+    def from_env(cls):
+        return cls(float(os.getenv('ROTATOR_AZ_MIN', '0')), float(os.getenv('ROTATOR_AZ_MAX', '360')),
+                   float(os.getenv('ROTATOR_EL_MAX', '90')), float(os.getenv('ROTATOR_MAX_RATE', '5')))
+
+
+class PassTrajectory:
+    """
+    Commanded azimuth/elevation samples at unix times, ready to stream.
+    """
+    def __init__(self, times, azimuth, elevation, flipped: bool = False):
+        self.times = times
+        self.azimuth = azimuth
+        self.elevation = elevation
+        self.flipped = flipped
+
+    def __len__(self):
+        return len(self.times)
+
+    def velocities(self):
+        """
+        Returns (azimuth, elevation) rates in degrees/s.
+        """
+        if len(self.times) < 2:
+            return np.zeros_like(self.azimuth), np.zeros_like(self.elevation)
+        return np.gradient(self.azimuth, self.times), np.gradient(self.elevation, self.times)
+
+
+def julian_dates(times):
+    """
+    Splits unix times into whole and fractional Julian dates, as sgp4 expects.
+    """
+    days = np.floor(times / 86400.0)
+    return UNIX_EPOCH_JD + days, times / 86400.0 - days
+
+
+def gmst(times):
+    """
+    Greenwich mean sidereal time in radians (IAU 1982) for unix times.
+    """
+    whole, fraction = julian_dates(times)
+    centuries = (whole - J2000_JD + fraction) / 36525.0
+    seconds = (67310.54841 + (876600.0 * 3600 + 8640184.812866) * centuries
+               + 0.093104 * centuries ** 2 - 6.2e-6 * centuries ** 3)
+    return np.radians((seconds % 86400.0) / 240.0)
+
+
+def teme_to_ecef(positions, times):
+    """
+    Rotates TEME positions (N x 3, km) into the Earth-fixed frame, ignoring polar motion.
+    """
+    angle = gmst(times)
+    cos, sin = np.cos(angle), np.sin(angle)
+    ecef = np.empty_like(positions)
+    ecef[:, 0] = cos * positions[:, 0] + sin * positions[:, 1]
+    ecef[:, 1] = -sin * positions[:, 0] + cos * positions[:, 1]
+    ecef[:, 2] = positions[:, 2]
+    return ecef
+
+
+def look_angles(station: Station, ecef):
+    """
+    Returns (azimuth, elevation, range) arrays in degrees and km for ECEF positions.
+    """
+    enu = (ecef - station.ecef) @ station.enu.T
+    distance = np.linalg.norm(enu, axis=1)
+    azimuth = np.degrees(np.arctan2(enu[:, 0], enu[:, 1])) % 360.0
+    elevation = np.degrees(np.arcsin(enu[:, 2] / distance))
+    return azimuth, elevation, distance
+
+
+class TLEPredictor:
+    """
+    Az/el of a satellite from a two-line element set, propagated with SGP4.
+    """
+    def __init__(self, line1: str, line2: str, station: Station):
+        from sgp4.api import Satrec  # Only needed for TLE tracking
+        self.satellite = Satrec.twoline2rv(line1, line2)
+        self.station = station
+
+    @classmethod
+    def from_file(cls, path: str, station: Station):
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        line1 = next(line for line in lines if line.startswith('1 '))
+        line2 = next(line for line in lines if line.startswith('2 '))
+        return cls(line1, line2, station)
+
+    def look_angles(self, times):
+        whole, fraction = julian_dates(times)
+        errors, positions, _ = self.satellite.sgp4_array(whole, fraction)
+        if np.any(errors):
+            raise ValueError(f"SGP4 propagation failed with error {int(errors[errors != 0][0])}")
+        azimuth, elevation, _ = look_angles(self.station, teme_to_ecef(positions, times))
+        return azimuth, elevation
+
+
+class EphemerisPredictor:
+    """
+    Az/el interpolated from a precomputed ephemeris CSV with a header row.
+
+    Columns are either time, azimuth, elevation (degrees) or time, x, y, z
+    (ECEF km); time is in unix seconds.
+    """
+    def __init__(self, path: str, station: Station):
+        data = np.genfromtxt(path, delimiter=',', names=True)
+        self.times = data['time']
+        if 'azimuth' in data.dtype.names:
+            azimuth, elevation = data['azimuth'], data['elevation']
+        else:
+            azimuth, elevation, _ = look_angles(station, np.column_stack([data['x'], data['y'], data['z']]))
+        self.azimuth = np.unwrap(np.radians(azimuth))  # Continuous, so interpolation never sweeps through 180°
+        self.elevation = elevation
+
+    def look_angles(self, times):
+        azimuth = np.degrees(np.interp(times, self.times, self.azimuth)) % 360.0
+        elevation = np.interp(times, self.times, self.elevation, left=-90.0, right=-90.0)
+        return azimuth, elevation
+
+
+def next_pass(predictor, start: float, horizon: float = 86400.0, min_elevation: float = 0.0,
+              step: float = 20.0):
+    """
+    Returns (aos, los) unix times of the next pass above `min_elevation`, or None.
+
+    Elevation is evaluated on a coarse grid in one batch and the horizon
+    crossings are refined on a 0.1 s grid.
+    """
+    times = start + np.arange(0.0, horizon + step, step)
+    _, elevation = predictor.look_angles(times)
+    visible = elevation > min_elevation
+    if not visible.any():
+        return None
+    first = int(np.argmax(visible))
+    set_index = first + int(np.argmin(visible[first:])) if not visible[first:].all() else len(times) - 1
+
+    def refine(index, rising):
+        if index == 0 or (not rising and index == len(times) - 1):
+            return times[index]
+        fine = np.arange(times[index - 1], times[index] + 0.1, 0.1)
+        above = predictor.look_angles(fine)[1] > min_elevation
+        return fine[int(np.argmax(above if rising else ~above))]
+
+    return refine(first, True), refine(set_index, False)
+
+
+def fit_to_rotator(azimuth, elevation, limits: RotatorLimits):
+    """
+    Maps a pass onto the rotator's travel.
+
+    Azimuth is unwrapped so it never jumps by 360° and shifted into
+    [azimuth_min, azimuth_max]. If the pass does not fit and the rotator
+    can tilt past 90°, the pass is flipped (azimuth + 180°, elevation
+    mirrored at zenith). Returns (azimuth, elevation, flipped).
+    """
+    candidates = [(azimuth, elevation, False)]
+    if limits.elevation_max >= 180.0:
+        candidates.append(((azimuth + 180.0) % 360.0, 180.0 - elevation, True))
+    fallback = None
+    for candidate_azimuth, candidate_elevation, flipped in candidates:
+        unwrapped = np.degrees(np.unwrap(np.radians(candidate_azimuth)))
+        shifted = unwrapped + 360.0 * math.ceil((limits.azimuth_min - unwrapped.min()) / 360.0)
+        if shifted.max() <= limits.azimuth_max:
+            return shifted, candidate_elevation, flipped
+        fallback = fallback or (shifted, candidate_elevation, flipped)
+    logging.warning("Pass does not fit the rotator's azimuth range. Clipping.")
+    shifted, candidate_elevation, flipped = fallback
+    return np.clip(shifted, limits.azimuth_min, limits.azimuth_max), candidate_elevation, flipped
+
+
+def limit_rate(times, values, max_rate: float):
+    """
+    Limits the slew rate of a trajectory, e.g. azimuth through the zenith keyhole.
+
+    A forward pass lags behind fast segments and a backward pass leads
+    into them; their mean is still rate-limited and splits the pointing
+    error before and after the keyhole.
+    """
+    if len(values) < 2 or (np.abs(np.diff(values)) / np.maximum(np.diff(times), 1e-9)).max() <= max_rate:
+        return values
+    steps = (np.diff(times) * max_rate).tolist()
+    target = values.tolist()
+    forward = target[:]
+    for i in range(1, len(target)):
+        forward[i] = min(max(target[i], forward[i - 1] - steps[i - 1]), forward[i - 1] + steps[i - 1])
+    backward = target[:]
+    for i in range(len(target) - 2, -1, -1):
+        backward[i] = min(max(target[i], backward[i + 1] - steps[i]), backward[i + 1] + steps[i])
+    return (np.array(forward) + np.array(backward)) / 2
+
+
+def compute_pass(predictor, aos: float, los: float, rate_hz: float = 10.0, limits: RotatorLimits = None):
+    """
+    Computes the commanded trajectory of a pass in one batch.
+    """
+    limits = limits or RotatorLimits.from_env()
+    times = np.arange(aos, los, 1.0 / rate_hz)
+    azimuth, elevation = predictor.look_angles(times)
+    azimuth, elevation, flipped = fit_to_rotator(azimuth, np.clip(elevation, 0.0, 90.0), limits)
+    if not flipped:
+        elevation = np.minimum(elevation, limits.elevation_max)  # E.g. an 80° stop
+    azimuth = limit_rate(times, azimuth, limits.max_rate)
+    elevation = limit_rate(times, elevation, limits.max_rate)
+    return PassTrajectory(times, azimuth, elevation, flipped)
+
+
+class PassScheduler:
+    """
+    Streams a trajectory's setpoints through RotatorCommands at their scheduled times.
+
+    The thread sleeps until shortly before each deadline and spins for the
+    last `spin` seconds, so setpoints leave within tens of microseconds of
+    their deadline instead of at the mercy of the sleep granularity. When it
+    falls behind, stale samples are skipped rather than sent in a burst.
+    Commands go out through send_command without waiting for the ACKs;
+    the sliding window keeps them in order.
+    """
+    def __init__(self, commands, trajectory: PassTrajectory, mode: str = 'position', spin: float = 0.002):
+        if mode not in ('position', 'velocity'):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.commands = commands
+        self.trajectory = trajectory
+        self.mode = mode
+        self.spin = spin
+        self.lateness = np.full(len(trajectory), np.nan)  # Seconds between deadline and send, per sample
+        self.sent = 0
+        self.skipped = 0
+        self.failures = 0
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = Thread(target=self._run, name="pass-scheduler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def join(self, timeout: float = None):
+        self.thread.join(timeout)
+
+    def _send(self, index: int, azimuth, elevation, azimuth_rate, elevation_rate):
+        if self.mode == 'position':
+            future = self.commands.set_position(azimuth[index], elevation[index])
+        else:
+            future = self.commands.set_velocity(azimuth_rate[index], elevation_rate[index])
+        future.add_done_callback(self._command_done)
+
+    def _command_done(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.failures += 1
+
+    def _run(self):
+        trajectory = self.trajectory
+        offset = time.time() - time.perf_counter()  # Deadlines are unix times; wait on the monotonic clock
+        deadlines = (trajectory.times - offset).tolist()
+        azimuth, elevation = trajectory.azimuth.tolist(), trajectory.elevation.tolist()
+        azimuth_rate, elevation_rate = (rate.tolist() for rate in trajectory.velocities())
+        index = 0
+        while index < len(deadlines) and not self.stopped.is_set():
+            while index + 1 < len(deadlines) and deadlines[index + 1] <= time.perf_counter():
+                index += 1  # Fell behind; only the newest due setpoint matters
+                self.skipped += 1
+            deadline = deadlines[index]
+            remaining = deadline - time.perf_counter() - self.spin
+            if remaining > 0 and self.stopped.wait(remaining):
+                return
+            while time.perf_counter() < deadline:
+                pass
+            try:
+                self._send(index, azimuth, elevation, azimuth_rate, elevation_rate)
+                self.sent += 1
+            except Exception as e:
+                logging.error("Failed to send setpoint %d: %s", index, e)
+                self.failures += 1
+            self.lateness[index] = time.perf_counter() - deadline
+            index += 1
+
+
+def main():
+    load_config()
+    parser = argparse.ArgumentParser(description="Track the next satellite pass.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--tle', help="file with a two-line element set")
+    source.add_argument('--ephemeris', help="CSV with time,azimuth,elevation or time,x,y,z columns")
+    parser.add_argument('--rate', type=float, default=10.0, help="setpoints per second")
+    parser.add_argument('--mode', choices=('position', 'velocity'), default='position')
+    parser.add_argument('--min-elevation', type=float, default=0.0)
+    parser.add_argument('--dry-run', action='store_true', help="only print the pass")
+    args = parser.parse_args()
+
+    setup_logging()
+    station = Station.from_env()
+    if args.tle:
+        predictor = TLEPredictor.from_file(args.tle, station)
+    else:
+        predictor = EphemerisPredictor(args.ephemeris, station)
+    window = next_pass(predictor, time.time(), min_elevation=args.min_elevation)
+    if window is None:
+        print("No pass in the next 24 hours.")
+        return
+    aos, los = window
+    trajectory = compute_pass(predictor, aos, los, args.rate)
+    print(f"AOS {time.strftime('%H:%M:%S', time.localtime(aos))}  LOS {time.strftime('%H:%M:%S', time.localtime(los))}  "
+          f"max elevation {trajectory.elevation.max() if not trajectory.flipped else 180 - trajectory.elevation.min():.1f}°  "
+          f"{len(trajectory)} setpoints{'  (flipped)' if trajectory.flipped else ''}")
+    if args.dry_run:
+        return
+
+    from uart_comm import UARTCommunication
+    from commands import RotatorCommands
+    uart = UARTCommunication()
+    try:
+        commands = RotatorCommands(uart)
+        commands.set_position(trajectory.azimuth[0], trajectory.elevation[0]).result()  # Pre-position for AOS
+        scheduler = PassScheduler(commands, trajectory, args.mode).start()
+        scheduler.join()
+        lateness = scheduler.lateness[~np.isnan(scheduler.lateness)] * 1e3
+        print(f"sent {scheduler.sent}, skipped {scheduler.skipped}, failed {scheduler.failures}, "
+              f"lateness p50 {np.percentile(lateness, 50):.3f} ms p99 {np.percentile(lateness, 99):.3f} ms")
+    finally:
+        uart.close()
+
+
+if __name__ == "__main__":
+    main()
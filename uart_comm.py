@@ -6,32 +6,96 @@ Description: Handles UART communication with the microcontroller.
 """
 
 import serial
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
 import time
 import logging
 import os
-import random
-from dotenv import load_dotenv
-from collections import deque
+import selectors
+from concurrent.futures import Future
+from retransmission import RetransmissionScheduler
+from framing import FrameParser, START_BYTE, END_BYTE
+from checksum import SCHEMES, XOR, CAP_CRC16
+from message_codec import CodecRegistry, FRAME_HEADER
+from frame_trace import FrameTrace, RX, TX
+from capture import CaptureRecorder
+from telemetry_history import TelemetryHistory
+from metrics import FRAMES_RECEIVED, FRAMES_SENT, CHECKSUM_ERRORS, UNKNOWN_ACKS, POSITION_LATENCY
+from batching import BATCH_COMMAND_ID, BATCH_RESULT_ID, encode_batch, batch_results
+from clock_sync import ClockSync, CAP_TIMESTAMPS, MCU_TIME
+from position_estimator import PositionEstimator
 
-load_dotenv()
+GET_CAPABILITIES_COMMAND_ID = 0x0A  # Asks the firmware for its capability flags
+CAPABILITIES_REPORT_ID = 0x0B  # Firmware reply: one byte of capability flags
+SET_PROTOCOL_COMMAND_ID = 0x0C  # Enables the given capability flags after the ACK
+ACK_COMMAND_ID = 0x06
+STATUS_COMMAND_ID = 0x07  # Asks the firmware for a status report
+STATUS_REPORT_ID = 0x08  # State flags, error flags, uptime in seconds
+POSITION_REPORT_ID = 0x09  # Azimuth, elevation
+VELOCITY_REPORT_ID = 0x12  # Azimuth/elevation velocity in degrees/s
+MOTOR_CURRENT_REPORT_ID = 0x13  # Azimuth/elevation motor current in mA
+TEMPERATURE_REPORT_ID = 0x14  # Driver and MCU temperature in 0.1 °C
+SET_VELOCITY_COMMAND_ID = 0x04  # Velocity setpoint, see setpoint_stream.VELOCITY_SETPOINT; also commands.set_velocity
+STREAM_FLAG = 0x80  # Set on COMMAND_IDs of streamed setpoints: no ACK, MESSAGE_ID is a sequence number
+
+def wall_time(perf_time: float) -> float:
+    """
+    Converts a time.perf_counter() time to seconds since the epoch.
+    """
+    return time.time() - (time.perf_counter() - perf_time)
 
 class UARTCommunication:
     """
     Handles UART communication with the microcontroller.
     """
-    def __init__(self):
-        self.port = os.getenv('UART_PORT')
-        self.baudrate = int(os.getenv('UART_BAUDRATE', '115200'))
-        self.timeout = float(os.getenv('UART_TIMEOUT', '1'))
+    def __init__(self, port: str = None, baudrate: int = None, timeout: float = None):
+        self.port = port or os.getenv('UART_PORT')
+        self.baudrate = baudrate or int(os.getenv('UART_BAUDRATE', '115200'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('UART_TIMEOUT', '1'))
+        self.preferred_checksum = os.getenv('UART_CHECKSUM', 'xor')  # 'crc16' to negotiate CRC-16 frames
         self.ser = None
         self.lock = Lock()
         self.read_thread = None
-        self.buffer = bytearray()
+        self.parser = FrameParser()  # Only touched by the thread reading from UART
+        self.checksum = XOR  # Checksum scheme in use, see negotiate_checksum()
+        self.capabilities = None  # Capability flags reported by the firmware
+        self.capabilities_received = Event()
+        self.protocol_flags = 0  # Capability flags enabled with SET_PROTOCOL
+        self.protocol_switches = {}  # MESSAGE_ID of a SET_PROTOCOL command in flight -> its flags
+        self.mcu_timestamps = False  # Frames from the MCU end with MCU_TIME, see clock_sync.py
+        # Ask firmware with CAP_TIMESTAMPS to timestamp its frames, for clock sync and latency correction
+        self.request_timestamps = os.getenv('UART_MCU_TIMESTAMPS', '0') == '1'
+        self.clock = ClockSync()  # MCU clock offset, sampled from ACK round trips
+        self.mcu_time = None  # MCU seconds of the frame being handled, if it was timestamped
+        self.sent_times = {}  # MESSAGE_ID -> time.perf_counter() of commands transmitted once, for clock samples
         self.connected = False
-        self.pending_messages = {}  # Track messages awaiting ACKs
+        self._wakeup_r, self._wakeup_w = os.pipe()  # Interrupts the read thread's selector on close()
+        self.window_size = int(os.getenv('UART_WINDOW', '8'))  # Commands in flight before send_command queues
+        self.retransmission = RetransmissionScheduler(self._write_frame, window_size=self.window_size,
+                                                      on_transmit=self.record_transmission)
+        self.stream_sequences = {}  # command_id -> last sequence number of streamed setpoints
+        self.batch_results = {}  # MESSAGE_ID -> result codes of a batch, until send_batch() picks them up
         self.current_position = {'azimuth': 0, 'elevation': 0}  # Latest position data
         self.position_lock = Lock()  # Lock for accessing current_position
+        self.estimator = PositionEstimator()  # Latency-corrected position, see get_current_position()
+        self.position_listeners = []  # Callables notified with every position update
+        self.telemetry_listeners = []  # Callables notified with (name, values, time) of every telemetry message
+        trace_path = os.getenv('UART_FRAME_TRACE')
+        self.trace = FrameTrace(trace_path) if trace_path else None  # Binary record of every frame, see frame_trace.py
+        self.capture = self.open_capture()  # Raw RX/TX chunks for replay.py, enabled by UART_CAPTURE
+        self.received_at = 0.0  # time.perf_counter() when the chunk being parsed was read
+        self.telemetry = {}  # Latest decoded values of other telemetry messages, by name
+        self.history_size = int(os.getenv('TELEMETRY_HISTORY_SIZE', '180000'))  # Samples per channel, 1 h at 50 Hz
+        self.history = {'position': TelemetryHistory(('azimuth', 'elevation'), self.history_size)}
+        self.codecs = CodecRegistry()  # Decoders and handlers for data messages, by COMMAND_ID
+        self.codecs.register(POSITION_REPORT_ID, 'position', '>HH', ('azimuth', 'elevation'), self.update_position)
+        self.codecs.register(CAPABILITIES_REPORT_ID, 'capabilities', '>B', ('flags',), self.update_capabilities)
+        for command_id, name, layout, fields in (
+            (VELOCITY_REPORT_ID, 'velocity', '>ff', ('azimuth_velocity', 'elevation_velocity')),
+            (MOTOR_CURRENT_REPORT_ID, 'motor_current', '>HH', ('azimuth_current', 'elevation_current')),
+            (TEMPERATURE_REPORT_ID, 'temperature', '>hh', ('driver_temperature', 'mcu_temperature')),
+            (STATUS_REPORT_ID, 'status', '>BHI', ('state', 'errors', 'uptime')),
+        ):
+            self.register_telemetry(command_id, name, layout, fields)
         self.initialize_uart()
 
     def initialize_uart(self):
@@ -45,16 +109,27 @@ class UARTCommunication:
         try:
             self.ser = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=self.timeout)
             self.connected = True
-            logging.info(f"UART port {self.port} opened successfully.")
-            # Start the read thread
+            logging.info("UART port %s opened successfully.", self.port)
+            # Start the read thread and the retransmission scheduler
             self.read_thread = Thread(target=self.read_from_uart, daemon=True)
             self.read_thread.start()
+            self.retransmission.start()
+            if self.preferred_checksum != self.checksum.name:
+                self.negotiate_checksum(self.preferred_checksum)
+            if self.request_timestamps:
+                self.enable_timestamps()
         except serial.SerialException as e:
             self.connected = False
-            logging.error(f"Failed to open UART port {self.port}: {e}")
+            logging.error("Failed to open UART port %s: %s", self.port, e)
         except Exception as e:
             self.connected = False
-            logging.exception(f"Unexpected error when initializing UART: {e}")
+            logging.exception("Unexpected error when initializing UART: %s", e)
+
+    def open_capture(self):
+        """
+        Returns the recorder for raw UART traffic, or None if capturing is disabled.
+        """
+        return CaptureRecorder.from_env()
 
     def is_connected(self):
         """
@@ -62,240 +137,517 @@ class UARTCommunication:
         """
         return self.connected
 
-    def send_command(self, command_id: int, payload: bytes = b'') -> None:
+    def close(self):
+        """
+        Stops the read thread and closes the UART port.
+        """
+        if self._wakeup_w is None:
+            return
+        self.connected = False
+        os.write(self._wakeup_w, b'\0')
+        self.retransmission.stop()
+        if self.read_thread and self.read_thread.is_alive():
+            self.read_thread.join(timeout=self.timeout + 1)
+        if self.ser:
+            self.ser.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self._wakeup_r = self._wakeup_w = None
+        if self.trace is not None:
+            self.trace.close()
+        if self.capture is not None:
+            self.capture.close()
+        logging.info("UART port %s closed.", self.port)
+
+    def send_command(self, command_id: int, payload: bytes = b'') -> Future:
         """
         Constructs and sends a command to the microcontroller with retransmission logic.
+
+        MESSAGE_IDs come from a sliding window, so they never collide with a
+        command still awaiting its ACK. Returns a future that resolves once
+        the command is acknowledged, or fails with TimeoutError when the
+        retransmission attempts run out.
         """
         if not self.is_connected():
             logging.error("Attempted to send command, but UART port is not connected.")
             raise serial.SerialException("UART port is not connected.")
 
-        message_id = random.randint(0, 255)
-        command = self.construct_command(message_id, command_id, payload)
-        self.pending_messages[message_id] = {
-            'command': command,
-            'attempts': 0,
-            'last_sent': 0,
-            'ack_received': False
-        }
-
-        # Start a separate thread to handle retransmission
-        Thread(target=self._send_with_retransmission, args=(message_id,), daemon=True).start()
-
-    def _send_with_retransmission(self, message_id):
-        """
-        Sends the message and handles retransmissions if ACK is not received.
-        """
-        max_backoff = 1.0
-        base_timeout = 0.1
-        while not self.pending_messages[message_id]['ack_received']:
-            current_time = time.time()
-            last_sent = self.pending_messages[message_id]['last_sent']
-            attempts = self.pending_messages[message_id]['attempts']
-
-            # Exponential backoff
-            timeout = min(base_timeout * (2 ** attempts), max_backoff)
-
-            if current_time - last_sent >= timeout:
-                with self.lock:
-                    try:
-                        self.ser.write(self.pending_messages[message_id]['command'])
-                        self.pending_messages[message_id]['last_sent'] = current_time
-                        self.pending_messages[message_id]['attempts'] += 1
-                        logging.debug(f"Sent command with MESSAGE_ID {message_id}: {self.pending_messages[message_id]['command'].hex()}")
-                    except Exception as e:
-                        logging.exception(f"Error sending command: {e}")
-                        break
-            time.sleep(0.1)
+        if command_id != SET_PROTOCOL_COMMAND_ID:
+            return self.retransmission.submit(
+                lambda message_id: self.construct_command(message_id, command_id, payload))
+        message_ids = []
+
+        def build_frame(message_id):
+            message_ids.append(message_id)
+            self.protocol_switches[message_id] = payload[0]  # Applied by handle_ack, see apply_protocol()
+            return self.construct_command(message_id, command_id, payload)
+
+        future = self.retransmission.submit(build_frame)
+        future.add_done_callback(lambda _: self.protocol_switches.pop(message_ids[-1], None) if message_ids else None)
+        return future
+
+    def send_batch(self, commands) -> Future:
+        """
+        Sends (command_id, payload) pairs as one batch frame (see batching.py).
+
+        The batch takes one MESSAGE_ID and one ACK round trip and is
+        retransmitted as a whole. Returns a future that resolves with the
+        firmware's result code per command once the batch is acknowledged.
+        """
+        if not self.is_connected():
+            raise serial.SerialException("UART port is not connected.")
+        payload = encode_batch(commands)
+        message_ids = []
+        result = Future()
+
+        def build_frame(message_id):
+            message_ids.append(message_id)
+            return self.construct_command(message_id, BATCH_COMMAND_ID, payload)
+
+        def done(future):
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                try:
+                    result.set_result(batch_results(self.batch_results.pop(message_ids[-1], None), len(commands)))
+                except RuntimeError as e:
+                    result.set_exception(e)
+
+        self.retransmission.submit(build_frame).add_done_callback(done)
+        return result
+
+    def send_unacked(self, command_id: int, payload: bytes = b'') -> int:
+        """
+        Sends an idempotent setpoint once, without waiting for an ACK.
 
-            # Optionally, set a maximum number of attempts
-            if self.pending_messages[message_id]['attempts'] > 10:
-                logging.error(f"Failed to receive ACK for MESSAGE_ID {message_id} after multiple attempts.")
-                del self.pending_messages[message_id]
-                break
+        The COMMAND_ID carries STREAM_FLAG and the MESSAGE_ID is a per-command
+        sequence number, so the firmware can discard frames that arrive out
+        of order. Returns the sequence number used.
+        """
+        if not self.is_connected():
+            raise serial.SerialException("UART port is not connected.")
+        sequence = (self.stream_sequences.get(command_id, -1) + 1) % 256
+        self.stream_sequences[command_id] = sequence
+        self._write_frame(self.construct_command(sequence, command_id | STREAM_FLAG, payload))
+        return sequence
+
+    def record_transmission(self, message_id: int, attempt: int):
+        """
+        Notes when a command was first sent, for clock samples from its ACK.
+
+        Which transmission the ACK of a retransmitted command answers is ambiguous, so those are forgotten.
+        """
+        if attempt == 1:
+            self.sent_times[message_id] = time.perf_counter()
+        else:
+            self.sent_times.pop(message_id, None)
+
+    def _write_frame(self, frame: bytes):
+        """
+        Writes a complete frame to the UART port.
+        """
+        with self.lock:
+            # Recorded first so a fast reply can never precede its command
+            if self.capture is not None:
+                self.capture.record(TX, frame)
+            if self.trace is not None:
+                self.trace.record(TX, frame)
+            self.ser.write(frame)
+        FRAMES_SENT.inc()
 
     def construct_command(self, message_id: int, command_id: int, payload: bytes) -> bytes:
         """
         Constructs a command according to the protocol.
         """
-        START_BYTE = 0x02
-        END_BYTE = 0x03
         payload_length = len(payload)
-        header = bytes([START_BYTE, message_id, command_id, payload_length])
         checksum_data = bytes([message_id, command_id, payload_length]) + payload
-        checksum = self.calculate_checksum(checksum_data)
-        command = header + payload + bytes([checksum, END_BYTE])
-        logging.debug(f"Constructed command: {command.hex()}")
+        checksum = self.checksum.compute(checksum_data)
+        command = bytes([START_BYTE]) + checksum_data + self.checksum.pack(checksum) + bytes([END_BYTE])
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Constructed command %#04x with MESSAGE_ID %d, %d payload bytes",
+                          command_id, message_id, payload_length)
         return command
 
     def calculate_checksum(self, data: bytes) -> int:
         """
-        Calculates checksum as XOR of all bytes in data.
+        Calculates the checksum of data with the scheme currently in use.
+        """
+        return self.checksum.compute(data)
+
+    def use_checksum(self, scheme):
+        """
+        Switches the framing layer to another checksum scheme.
+        """
+        self.checksum = scheme
+        self.parser.checksum_size = scheme.size
+        logging.info("Using %s frame checksums.", scheme.name)
+
+    def negotiate_checksum(self, name: str = 'crc16', timeout: float = 1.0) -> bool:
+        """
+        Switches to the named checksum scheme if the firmware supports it.
+
+        Queries the capability flags, then enables the scheme with a
+        SET_PROTOCOL command, keeping other enabled flags. Both sides switch
+        once that command is ACKed (see apply_protocol). Returns True if the
+        scheme is in use afterwards.
         """
-        checksum = 0
-        for b in data:
-            checksum ^= b
-        logging.debug(f"Calculated checksum: {checksum:#04x}")
-        return checksum
+        scheme = SCHEMES[name]
+        if not scheme.capability:
+            self.use_checksum(scheme)
+            return True
+        try:
+            capabilities = self.query_capabilities(timeout)
+            if capabilities is None:
+                logging.warning("Firmware did not report its capabilities. Keeping current checksum.")
+                return False
+            if not capabilities & scheme.capability:
+                logging.info("Firmware does not support %s checksums.", scheme.name)
+                return False
+            flags = self.protocol_flags & ~CAP_CRC16 | scheme.capability  # Keeps other enabled capabilities
+            self.send_command(SET_PROTOCOL_COMMAND_ID, bytes([flags])).result()
+        except Exception as e:
+            logging.error("Checksum negotiation failed: %s", e)
+            return False
+        return self.checksum is scheme
+
+    def query_capabilities(self, timeout: float = 1.0):
+        """
+        Asks the firmware for its capability flags. Returns them, or None if it does not report any.
+        """
+        self.capabilities_received.clear()
+        self.send_command(GET_CAPABILITIES_COMMAND_ID).result()
+        if not self.capabilities_received.wait(timeout):
+            return None
+        return self.capabilities
+
+    def enable_timestamps(self, timeout: float = 1.0) -> bool:
+        """
+        Asks the firmware to timestamp its frames if it supports it (see clock_sync.py).
+
+        The clock offset is then estimated from the ACKs of later commands,
+        and reports are dated by when the MCU sampled them instead of when
+        they were read. Returns True if timestamps are enabled afterwards.
+        """
+        capabilities = self.capabilities
+        try:
+            if capabilities is None:
+                capabilities = self.query_capabilities(timeout)
+            if not (capabilities or 0) & CAP_TIMESTAMPS:
+                logging.info("Firmware does not timestamp its frames. Dating reports by their arrival.")
+                return False
+            self.send_command(SET_PROTOCOL_COMMAND_ID, bytes([self.protocol_flags | CAP_TIMESTAMPS])).result()
+        except Exception as e:
+            logging.error("Enabling MCU timestamps failed: %s", e)
+            return False
+        return self.mcu_timestamps
+
+    def apply_protocol(self, flags: int):
+        """
+        Switches to the framing enabled by an acknowledged SET_PROTOCOL command.
+
+        Called while handling its ACK, before any later frame is parsed, as
+        the firmware switches right after sending the ACK.
+        """
+        scheme = next((scheme for scheme in SCHEMES.values() if scheme.capability & flags), XOR)
+        if scheme is not self.checksum:
+            self.use_checksum(scheme)
+        if flags & CAP_TIMESTAMPS and not self.mcu_timestamps:
+            self.clock.reset()
+            logging.info("MCU timestamps enabled.")
+        self.mcu_timestamps = bool(flags & CAP_TIMESTAMPS)
+        self.protocol_flags = flags
+
+    def acknowledged(self, message_id: int, single: bool):
+        """
+        Bookkeeping for a command the firmware acknowledged: protocol
+        switches, and a clock sample if this frame answered it alone.
+        """
+        flags = self.protocol_switches.pop(message_id, None)
+        sent = self.sent_times.pop(message_id, None)
+        if single and sent is not None and self.mcu_time is not None:
+            self.clock.add_sample(sent, self.mcu_time, self.received_at)
+        if flags is not None:
+            self.apply_protocol(flags)
 
     def read_from_uart(self):
         """
         Continuously reads data from UART in a separate thread.
+
+        The thread blocks in a selector on the serial file descriptor, so
+        received bytes are parsed as soon as the kernel hands them over
+        instead of waiting for the next polling tick.
         """
-        while True:
-            if not self.is_connected():
-                logging.debug("UART port is not connected. Read thread exiting.")
-                break
-            try:
-                if self.ser.in_waiting:
-                    data = self.ser.read(self.ser.in_waiting)
-                    with self.lock:
-                        self.buffer.extend(data)
-                    logging.debug(f"Read {len(data)} bytes from UART: {data.hex()}")
-                    self.process_uart_data()
-                time.sleep(0.1)
-            except Exception as e:
-                logging.exception(f"Error reading from UART port: {e}")
-                self.connected = False
-                break
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        try:
+            selector.register(self.ser.fileno(), selectors.EVENT_READ)
+        except Exception:
+            # No pollable descriptor (e.g. non-POSIX ports): fall back to a
+            # blocking read bounded by the port timeout.
+            selector.unregister(self._wakeup_r)
+            selector.close()
+            selector = None
+        debug = logging.root.isEnabledFor(logging.DEBUG)
+        try:
+            while True:
+                if not self.is_connected():
+                    logging.debug("UART port is not connected. Read thread exiting.")
+                    break
+                try:
+                    if selector is not None:
+                        if not selector.select(self.timeout):
+                            continue
+                        if not self.is_connected():
+                            continue
+                    data = self.ser.read(self.ser.in_waiting or 1)
+                    if data:
+                        if self.capture is not None:
+                            self.capture.record(RX, data)
+                        if debug:
+                            logging.debug("Read %d bytes from UART", len(data))
+                        self.process_uart_data(data)
+                except Exception as e:
+                    if not self.is_connected():
+                        break
+                    logging.exception("Error reading from UART port: %s", e)
+                    self.connected = False
+                    break
+        finally:
+            if selector is not None:
+                selector.close()
 
-    def process_uart_data(self):
+    def process_uart_data(self, data: bytes):
         """
         Processes data received from UART.
-        """
-        while True:
-            message = self.parse_message()
-            if message:
-                self.handle_message(message)
-            else:
-                break
 
-    def parse_message(self):
-        """
-        Parses messages from the buffer according to the protocol.
+        Frames are handed to handle_message as memoryviews into the parser's
+        buffer and are only valid for the duration of that call.
         """
-        START_BYTE = 0x02
-        END_BYTE = 0x03
-        with self.lock:
-            buffer_length = len(self.buffer)
-            if buffer_length < 6:  # Minimum length of a message
-                return None
-            try:
-                # Find START_BYTE
-                if START_BYTE in self.buffer:
-                    start_index = self.buffer.index(START_BYTE)
-                    # Ensure there are enough bytes for header
-                    if buffer_length - start_index < 6:
-                        return None
-                    message_id = self.buffer[start_index + 1]
-                    command_id = self.buffer[start_index + 2]
-                    payload_length = self.buffer[start_index + 3]
-                    expected_length = 6 + payload_length  # Total expected length of the message
-                    if buffer_length - start_index < expected_length:
-                        logging.debug("Incomplete message received. Waiting for more data.")
-                        return None
-                    # Extract the message
-                    end_index = start_index + expected_length - 1
-                    if self.buffer[end_index] != END_BYTE:
-                        logging.error("END_BYTE not found where expected. Discarding bytes.")
-                        self.buffer = self.buffer[end_index+1:]
-                        return None
-                    message = self.buffer[start_index:end_index+1]
-                    # Remove the processed message from the buffer
-                    self.buffer = self.buffer[end_index+1:]
-                    logging.debug(f"Parsed message from buffer: {message.hex()}")
-                    return message
-                else:
-                    # START_BYTE not found, discard the buffer
-                    logging.debug("START_BYTE not found in buffer. Clearing buffer.")
-                    self.buffer.clear()
-                    return None
-            except Exception as e:
-                logging.exception(f"Error parsing message from buffer: {e}")
-                self.buffer.clear()
-                return None
+        self.received_at = time.perf_counter()
+        frames = 0
+        try:
+            for message in self.parser.feed(data):
+                frames += 1
+                self.handle_message(message)
+        except Exception as e:
+            logging.exception("Error parsing message from buffer: %s", e)
+            self.parser.clear()
+        FRAMES_RECEIVED.inc(frames)  # Once per chunk keeps the per-frame cost down
 
     def handle_message(self, message: bytes):
         """
         Handles a complete message received from UART.
         """
+        if self.trace is not None:
+            self.trace.record(RX, message)
         try:
-            START_BYTE = message[0]
-            message_id = message[1]
-            command_id = message[2]
-            payload_length = message[3]
-            payload = message[4:4+payload_length]
-            checksum = message[4+payload_length]
-            END_BYTE = message[5+payload_length]
+            _, message_id, command_id, payload_length = FRAME_HEADER.unpack_from(message)
+            checksum = int.from_bytes(message[4+payload_length:-1], 'big')
 
             # Recalculate checksum
             checksum_data = message[1:4+payload_length]
-            calculated_checksum = self.calculate_checksum(checksum_data)
+            calculated_checksum = self.checksum.compute(checksum_data)
 
             if checksum != calculated_checksum:
-                logging.error(f"Invalid checksum for received message. Expected {calculated_checksum:#04x}, got {checksum:#04x}")
+                CHECKSUM_ERRORS.inc()
+                logging.error("Invalid checksum for received message. Expected %#04x, got %#04x",
+                              calculated_checksum, checksum)
                 return
 
-            logging.info(f"Received message - MESSAGE_ID: {message_id}, COMMAND_ID: {command_id}, PAYLOAD: {payload.hex()}")
+            if self.mcu_timestamps and payload_length >= MCU_TIME.size:
+                payload_length -= MCU_TIME.size
+                self.mcu_time = self.clock.unwrap(MCU_TIME.unpack_from(message, 4 + payload_length)[0])
+            else:
+                self.mcu_time = None
+            payload = message[4:4+payload_length]
+
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug("Received message - MESSAGE_ID: %d, COMMAND_ID: %#04x, %d payload bytes",
+                              message_id, command_id, payload_length)
 
             # Handle ACK
-            if command_id == 0x06:  # ACK Command ID
-                self.handle_ack(message_id)
+            if command_id == ACK_COMMAND_ID:
+                self.handle_ack(message_id, payload)
+            elif command_id == BATCH_RESULT_ID:
+                self.handle_batch_result(message_id, payload)
             else:
                 # Handle data messages (e.g., status updates)
                 self.process_data_message(command_id, payload)
         except Exception as e:
-            logging.exception(f"Error handling message: {e}")
+            logging.exception("Error handling message: %s", e)
 
-    def handle_ack(self, message_id):
+    def handle_ack(self, message_id, payload=b''):
         """
         Handles an ACK message.
+
+        An empty payload acknowledges MESSAGE_ID - 1 only. A non-empty payload
+        marks a cumulative ACK: every command before MESSAGE_ID has arrived,
+        and the payload is a big-endian selective-ACK bitmap for the commands
+        after it (see SlidingWindow.acknowledge_cumulative).
         """
+        if payload:
+            selective = int.from_bytes(payload, 'big')
+            acked = self.retransmission.acknowledge_cumulative(message_id, selective)
+            for acked_id in acked:
+                self.acknowledged(acked_id, single=False)
+            logging.debug("Cumulative ACK up to MESSAGE_ID %d acknowledged %s", message_id, acked)
+            return
         original_message_id = (message_id - 1) % 256
-        if original_message_id in self.pending_messages:
-            self.pending_messages[original_message_id]['ack_received'] = True
-            logging.info(f"ACK received for MESSAGE_ID {original_message_id}")
-            del self.pending_messages[original_message_id]
+        if original_message_id in self.retransmission.pending:
+            self.acknowledged(original_message_id, single=True)
+        if self.retransmission.acknowledge(original_message_id):
+            logging.debug("ACK received for MESSAGE_ID %d", original_message_id)
         else:
-            logging.warning(f"Received ACK for unknown MESSAGE_ID {original_message_id}")
+            UNKNOWN_ACKS.inc()
+            logging.warning("Received ACK for unknown MESSAGE_ID %d", original_message_id)
+
+    def handle_batch_result(self, message_id, payload):
+        """
+        Handles a batch result: an ACK for MESSAGE_ID - 1 carrying one result code per sub-command.
+        """
+        original_message_id = (message_id - 1) % 256
+        if original_message_id not in self.retransmission.pending:
+            UNKNOWN_ACKS.inc()
+            logging.warning("Received batch result for unknown MESSAGE_ID %d", original_message_id)
+            return
+        self.acknowledged(original_message_id, single=True)
+        self.batch_results[original_message_id] = bytes(payload)
+        self.retransmission.acknowledge(original_message_id)
 
     def process_data_message(self, command_id, payload):
         """
         Processes data messages received from the microcontroller.
+
+        Decoding and dispatch go through self.codecs; the payload is unpacked
+        in place from the frame buffer. Returns True if the message was decoded.
         """
-        logging.info(f"Processing data message COMMAND_ID {command_id:#04x} with payload: {payload.hex()}")
-
-        # If the command is a status update (e.g., COMMAND_ID = 0x09)
-        if command_id == 0x09:
-            # Parse the payload to extract azimuth and elevation
-            if len(payload) >= 4:
-                azimuth = int.from_bytes(payload[0:2], 'big', signed=False)
-                elevation = int.from_bytes(payload[2:4], 'big', signed=False)
-                with self.position_lock:
-                    self.current_position['azimuth'] = azimuth
-                    self.current_position['elevation'] = elevation
-                logging.info(f"Updated position: Azimuth={azimuth}, Elevation={elevation}")
-            else:
-                logging.error("Payload too short for position data")
-        else:
-            # Handle other data messages if needed
-            pass
+        if self.codecs.lookup(command_id) is None:
+            logging.debug("No codec registered for COMMAND_ID %#04x", command_id)
+            return False
+        return self.codecs.dispatch(command_id, payload)
+
+    def register_telemetry(self, command_id: int, name: str, layout: str, fields):
+        """
+        Registers a telemetry message whose latest values are kept in self.telemetry
+        and whose samples are kept in self.history.
+        """
+        codec = self.codecs.register(command_id, name, layout, fields)
+        codec.handler = lambda *values: self.update_telemetry(codec, values)
+        self.history[name] = TelemetryHistory(codec.fields, self.history_size)
+        return codec
+
+    def sample_time(self) -> float:
+        """
+        time.perf_counter() when the MCU built the message being handled.
+
+        Taken from its MCU timestamp once the clock offset is known, and
+        the time it was read otherwise.
+        """
+        if self.mcu_time is None or not self.clock.synced:
+            return self.received_at
+        return min(self.clock.to_host(self.mcu_time), self.received_at)
+
+    def update_position(self, azimuth, elevation):
+        """
+        Handles a 0x09 position report.
+        """
+        sampled_at = self.sample_time()
+        if sampled_at != self.received_at:
+            POSITION_LATENCY.observe(self.received_at - sampled_at)
+        timestamp = wall_time(sampled_at)
+        with self.position_lock:
+            self.current_position['azimuth'] = azimuth
+            self.current_position['elevation'] = elevation
+            self.estimator.update(azimuth, elevation, sampled_at)
+        self.history['position'].append((azimuth, elevation), timestamp)
+        logging.debug("Updated position: Azimuth=%d, Elevation=%d", azimuth, elevation)
+        self.notify_position_listeners({'azimuth': azimuth, 'elevation': elevation, 'time': timestamp})
+
+    def update_capabilities(self, flags):
+        """
+        Handles a capability report.
+        """
+        self.capabilities = flags
+        logging.info("Firmware capabilities: %#04x", self.capabilities)
+        self.capabilities_received.set()
+
+    def update_telemetry(self, codec, values):
+        """
+        Stores the latest values of a telemetry message.
+        """
+        timestamp = wall_time(self.sample_time())
+        with self.position_lock:
+            self.telemetry[codec.name] = codec.as_dict(values)
+        self.history[codec.name].append(values, timestamp)
+        for listener in self.telemetry_listeners:
+            try:
+                listener(codec.name, values, timestamp)
+            except Exception as e:
+                logging.exception("Error in telemetry listener: %s", e)
+
+    def get_telemetry(self):
+        """
+        Retrieves the latest telemetry values in a thread-safe manner.
+        """
+        with self.position_lock:
+            return {name: values.copy() for name, values in self.telemetry.items()}
+
+    def add_position_listener(self, listener):
+        """
+        Registers a callable that receives every position report as a dict
+        of azimuth, elevation and time (seconds since the epoch, when the
+        MCU sampled it).
+
+        Listeners run on the thread that reads from UART and must not block.
+        """
+        self.position_listeners.append(listener)
+
+    def add_telemetry_listener(self, listener):
+        """
+        Registers a callable that receives (name, values, time) of every telemetry message.
+
+        Like position listeners, it runs on the thread that reads from UART.
+        """
+        self.telemetry_listeners.append(listener)
+
+    def notify_position_listeners(self, position: dict):
+        """
+        Passes a position update to all registered listeners.
+        """
+        for listener in self.position_listeners:
+            try:
+                listener(position)
+            except Exception as e:
+                logging.exception("Error in position listener: %s", e)
 
     def get_current_position(self):
         """
-        Retrieves the latest position data in a thread-safe manner.
+        Retrieves the position estimated for now in a thread-safe manner.
+
+        While the rotator moves, the latest report is extrapolated by the
+        age of its sample (see position_estimator.py); before the first
+        report, this is the initial position.
         """
         with self.position_lock:
-            return self.current_position.copy()
+            if not self.estimator.initialized:
+                return self.current_position.copy()
+            estimate = self.estimator.estimate(time.perf_counter())
+        return {'azimuth': estimate['azimuth'], 'elevation': estimate['elevation']}
 
-    def get_received_data(self):
+    def get_reported_position(self):
         """
-        Retrieves received data messages.
+        Retrieves the latest position report as sent by the MCU.
+        """
+        with self.position_lock:
+            return self.current_position.copy()
 
-        Returns:
-            A list of data messages received from the microcontroller.
+    def get_position_estimate(self):
+        """
+        Returns the estimated position and velocity, and the age of the latest report, or None before the first one.
         """
-        data_messages = []
-        while self.received_data:
-            data_messages.append(self.received_data.popleft())
-        return data_messages
+        with self.position_lock:
+            if not self.estimator.initialized:
+                return None
+            return self.estimator.estimate(time.perf_counter())
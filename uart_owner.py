@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+File: uart_owner.py
+Author: Jan Kühnemund
+Description: Single process owning the UART, and the proxy HTTP workers use to reach it.
+
+Only one process may open a serial port, so with several uvicorn workers
+a UARTOwner runs the AsyncUARTCommunication and setpoint streamer of every
+device (see devices.py) on its own event loop. It publishes position,
+telemetry and link state to one SharedState block per device and serves
+commands on a Unix socket; UARTProxy stands in for AsyncUARTCommunication
+inside each worker, one per device, all sharing an OwnerConnection.
+
+Socket messages are a struct header followed by the payload:
+
+    request: request id (u32), device index (u8), op (u8), COMMAND_ID (u8), payload length (u32)
+    reply:   request id (u32), result (u8), payload length (u32)
+
+POST and SETPOINT requests get no reply. Run an owner on its own with
+`python -m uart_owner`, or let `main.py --production` start it.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from hotplug import PortWatcher, UARTSupervisor
+from setpoint_stream import SetpointStreamer
+from shared_state import SharedState
+from metrics import REGISTRY
+from batching import encode_batch, decode_batch
+from position_estimator import PositionEstimator
+
+REQUEST = struct.Struct('<IBBBI')
+REPLY = struct.Struct('<IBI')
+ATTEMPTS = struct.Struct('<I')
+
+OP_STATE = 0x01  # Reply: JSON list of [device name, SharedState block name]
+OP_COMMAND = 0x02  # send_command(); reply: number of transmissions
+OP_POST = 0x03  # post_command()
+OP_SETPOINT = 0x04  # SetpointStreamer.update()
+OP_STATUS = 0x05  # request_status() with JSON arguments; reply: JSON status and latency
+OP_HISTORY = 0x06  # query_history() with JSON arguments; reply: JSON result
+OP_METRICS = 0x07  # Reply: JSON of the owner's metrics.REGISTRY.collect()
+OP_BATCH = 0x08  # send_batch() with a batch payload; reply: one result code per command
+
+OK = 0
+ERROR = 1  # Reply payload is the error message
+TIMEOUT = 2
+NOT_FOUND = 3
+EXCEPTIONS = {ERROR: RuntimeError, TIMEOUT: TimeoutError, NOT_FOUND: KeyError}
+
+DEFAULT_SOCKET = '/tmp/groundstation-uart.sock'
+LINK_CHANNEL = 'link'  # Shared channel with the state of a device's UART connection
+
+
+class OwnedDevice:
+    """
+    A device served by a UARTOwner: its UART and the supervisor attaching it, setpoint streamer and shared state block.
+    """
+    def __init__(self, name: str, uart, rate_hz: float):
+        self.name = name
+        self.uart = uart
+        self.supervisor = UARTSupervisor(uart)
+        self.streamer = SetpointStreamer(uart, max_rate_hz=rate_hz)
+        channels = {LINK_CHANNEL: ('connected',)}
+        channels.update((channel, history.fields) for channel, history in uart.history.items())
+        self.state = SharedState.create(channels)
+        uart.add_position_listener(lambda position: self.state.write(
+            'position', (position['azimuth'], position['elevation']), position['time']))
+        uart.add_telemetry_listener(self.state.write)
+        self.connected = False  # Link state last published to `state`
+
+    def publish_link(self):
+        connected = self.uart.is_connected()
+        if connected != self.connected or not self.state.counts[LINK_CHANNEL]:
+            self.connected = connected
+            self.state.write(LINK_CHANNEL, (connected,))
+
+
+class UARTOwner:
+    """
+    Owns the serial ports and serves them to HTTP workers.
+
+    `uarts` maps device names to AsyncUARTCommunication instances and
+    defaults to the devices of DEVICES_FILE. Position and telemetry
+    listeners write every update to the device's shared state; commands
+    from the socket run concurrently on the owner's event loop.
+    """
+    def __init__(self, socket_path: str = None, uarts: dict = None):
+        self.socket_path = socket_path or os.getenv('UART_OWNER_SOCKET', DEFAULT_SOCKET)
+        if uarts is None:
+            from devices import load_device_config, create_uart  # devices.py imports this module
+            uarts = {name: create_uart(options) for name, options in load_device_config().items()}
+        rate_hz = float(os.getenv('SETPOINT_RATE_HZ', '50'))
+        self.devices = [OwnedDevice(name, uart, rate_hz) for name, uart in uarts.items()]
+        self.server = None
+        self.clients = {}  # StreamWriter -> task serving the connection
+        self.tasks = set()
+
+    async def start(self):
+        """
+        Starts attaching the UARTs and streaming setpoints, and listens on the socket.
+
+        Workers can connect before the UARTs are open; the link channel of
+        each device tells when they are.
+        """
+        for device in self.devices:
+            device.supervisor.start()
+            device.publish_link()
+            device.streamer.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left behind by an owner that crashed
+        self.server = await asyncio.start_unix_server(self.handle_client, self.socket_path)
+        for device in self.devices:
+            self._spawn(self._follow_link(device))
+        logging.info("UART owner of %s listening on %s", ", ".join(device.name for device in self.devices),
+                     self.socket_path)
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        for writer in list(self.clients):
+            writer.close()
+        await asyncio.gather(*self.clients.values(), return_exceptions=True)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for device in self.devices:
+            device.supervisor.stop()
+            device.streamer.stop()
+            device.uart.close()
+            device.state.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _follow_link(self, device: OwnedDevice):
+        # Publishes every attach and loss of the device's port as it happens
+        while True:
+            await device.uart.wait_attached(None)
+            device.publish_link()
+            await device.uart.wait_lost()
+            device.publish_link()
+
+    async def handle_client(self, reader, writer):
+        self.clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_id, index, op, command_id, length = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                payload = await reader.readexactly(length) if length else b''
+                if op in (OP_POST, OP_SETPOINT):
+                    if index >= len(self.devices):
+                        logging.error("Dropping command %#04x for unknown device %d", command_id, index)
+                    elif op == OP_POST:
+                        self.devices[index].uart.post_command(command_id, payload)
+                    else:
+                        self.devices[index].streamer.update(command_id, payload)
+                else:
+                    self._spawn(self.answer(writer, request_id, index, op, command_id, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+
+    async def answer(self, writer, request_id: int, index: int, op: int, command_id: int, payload: bytes):
+        try:
+            result, data = OK, await self.execute(index, op, command_id, payload)
+        except (asyncio.TimeoutError, TimeoutError) as e:
+            result, data = TIMEOUT, str(e).encode()
+        except KeyError as e:
+            result, data = NOT_FOUND, str(e).encode()
+        except Exception as e:
+            result, data = ERROR, str(e).encode()
+        if not writer.is_closing():
+            writer.write(REPLY.pack(request_id, result, len(data)) + data)
+
+    async def execute(self, index: int, op: int, command_id: int, payload: bytes) -> bytes:
+        if op == OP_STATE:
+            return json.dumps([[device.name, device.state.name] for device in self.devices]).encode()
+        if op == OP_METRICS:
+            return json.dumps(REGISTRY.collect()).encode()
+        if index >= len(self.devices):
+            raise KeyError(f"Unknown device {index}")
+        uart = self.devices[index].uart
+        if op == OP_COMMAND:
+            return ATTEMPTS.pack(await uart.send_command(command_id, payload))
+        if op == OP_STATUS:
+            status, latency = await uart.request_status(**json.loads(payload))
+            return json.dumps({'status': status, 'latency': latency}).encode()
+        if op == OP_HISTORY:
+            return json.dumps(await uart.query_history(**json.loads(payload))).encode()
+        if op == OP_BATCH:
+            return bytes(await uart.send_batch(decode_batch(payload)))
+        raise ValueError(f"Unknown op {op:#04x}")
+
+
+def _number(value: float):
+    """
+    Shared values are stored as f64; integral ones go back to int like the decoded messages.
+    """
+    return int(value) if value.is_integer() else value
+
+
+class OwnerConnection:
+    """
+    Socket to a UARTOwner, shared by the UARTProxy of each of its devices.
+
+    Replies are matched to requests by id, so any number of requests may
+    be in flight at once. Once started, the connection is reopened when
+    the owner restarts: after `min_backoff` seconds, doubling up to
+    `max_backoff`, or as soon as the socket's directory changes. Requests
+    in flight when it is lost fail with ConnectionError, as do new ones
+    until it is back.
+    """
+    def __init__(self, socket_path: str = None, min_backoff: float = 0.1, max_backoff: float = None):
+        self.socket_path = socket_path or os.getenv('UART_OWNER_SOCKET', DEFAULT_SOCKET)
+        self.min_backoff = min_backoff
+        if max_backoff is None:
+            max_backoff = float(os.getenv('UART_RECONNECT_MAX_BACKOFF', '5'))
+        self.max_backoff = max_backoff
+        self.reader = None
+        self.writer = None
+        self.pending = {}  # request id -> Future resolved by the owner's reply
+        self.next_id = 0
+        self.devices = []  # [device name, SharedState block name] in the owner's order
+        self.generation = 0  # Incremented on every connect; a restarted owner has new state blocks
+        self.lock = asyncio.Lock()
+        self.task = None  # Reads replies while connected
+        self.supervisor = None  # Reconnects, see start()
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    async def connect(self, quiet: bool = False) -> bool:
+        """
+        Connects once, however many proxies ask, and fetches the owner's devices.
+        """
+        async with self.lock:
+            if self.writer is not None:
+                return True
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                if not quiet:
+                    logging.error("Cannot reach the UART owner at %s: %s", self.socket_path, e)
+                return False
+            self.task = asyncio.get_running_loop().create_task(self._read_replies())
+            try:
+                self.devices = json.loads(await self.request(0, OP_STATE))
+            except ConnectionError:
+                return False  # The owner went away again
+            self.generation += 1
+            logging.info("Connected to the UART owner at %s", self.socket_path)
+            return True
+
+    def start(self):
+        """
+        Keeps the connection open in the background from now on.
+        """
+        if self.supervisor is None:
+            self.supervisor = asyncio.get_running_loop().create_task(self._supervise())
+        return self
+
+    async def _supervise(self):
+        watcher = PortWatcher(self.socket_path)
+        watcher.start()
+        backoff = self.min_backoff
+        try:
+            while True:
+                if self.connected:
+                    await asyncio.wait([self.task])  # Ends when the connection is lost
+                    backoff = self.min_backoff
+                    continue
+                if os.path.exists(self.socket_path) and await self.connect(quiet=True):
+                    continue
+                await watcher.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            watcher.close()
+
+    def close(self):
+        if self.supervisor:
+            self.supervisor.cancel()
+            self.supervisor = None
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self._fail_pending(ConnectionError("Connection to the UART owner closed"))
+
+    def send(self, index: int, op: int, command_id: int = 0, payload: bytes = b'') -> int:
+        if self.writer is None:
+            raise ConnectionError("Not connected to the UART owner.")
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        self.writer.write(REQUEST.pack(self.next_id, index, op, command_id, len(payload)) + payload)
+        return self.next_id
+
+    async def request(self, index: int, op: int, command_id: int = 0, payload: bytes = b'') -> bytes:
+        request_id = self.send(index, op, command_id, payload)
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _read_replies(self):
+        try:
+            while True:
+                request_id, result, length = REPLY.unpack(await self.reader.readexactly(REPLY.size))
+                data = await self.reader.readexactly(length) if length else b''
+                future = self.pending.get(request_id)
+                if future is None or future.done():
+                    continue
+                if result == OK:
+                    future.set_result(data)
+                else:
+                    future.set_exception(EXCEPTIONS.get(result, RuntimeError)(data.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logging.error("Lost the connection to the UART owner: %s", e)
+            self.writer.close()
+            self.writer = None
+            self._fail_pending(ConnectionError("Lost the connection to the UART owner"))
+
+    def _fail_pending(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+
+class UARTProxy:
+    """
+    Stand-in for one device's AsyncUARTCommunication in HTTP workers, backed by a UARTOwner.
+
+    `connection` is an OwnerConnection shared with the proxies of other
+    devices, or the owner's socket path. `device` names the owner's device,
+    by default its first. Commands travel over the socket; position,
+    telemetry, link state and status ages are read from the device's shared
+    state block. Position listeners are called on the event loop by a task
+    that polls the block `poll_hz` times per second, which also feeds the
+    proxy's own PositionEstimator and attaches the new block of a
+    restarted owner once the connection is back.
+    """
+    def __init__(self, connection=None, device: str = None, poll_hz: float = None):
+        self.connection = connection if isinstance(connection, OwnerConnection) else OwnerConnection(connection)
+        self.device = device
+        self.index = 0  # Position of the device in the owner's list, sent with every request
+        self.timeout = float(os.getenv('UART_TIMEOUT', '1'))
+        self.poll_interval = 1.0 / (poll_hz or float(os.getenv('UART_OWNER_POLL_HZ', '200')))
+        self.state = None
+        self.position_listeners = []
+        self.received_at = 0.0  # time.perf_counter() equivalent of when the latest position was sampled
+        self.estimator = PositionEstimator()
+        self.generation = 0  # OwnerConnection.generation that `state` belongs to
+        self.task = None
+
+    async def connect(self):
+        """
+        Connects to the owner if no other proxy did and attaches the device's shared state.
+
+        Returns at once if the owner is not up; the connection keeps trying in the background.
+        """
+        if await self.connection.connect():
+            self._attach()
+        self.connection.start()
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._follow())
+
+    def _attach(self):
+        """
+        Attaches the device's state block of the owner the connection currently reaches.
+        """
+        self.generation = self.connection.generation
+        names = [name for name, _ in self.connection.devices]
+        if self.device is not None and self.device not in names:
+            logging.error("The UART owner does not serve device %s", self.device)
+            return
+        self.index = names.index(self.device) if self.device is not None else 0
+        if self.state:
+            self.state.close()  # Left by the previous owner; keeps serving stale values until now
+        self.state = SharedState.attach(self.connection.devices[self.index][1])
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.connection.close()
+        if self.state:
+            self.state.close()
+            self.state = None
+
+    def is_connected(self):
+        link = self._read(LINK_CHANNEL)
+        return self.connection.connected and link is not None and bool(link['connected'])
+
+    def _read(self, channel: str = None):
+        """
+        Reads the shared state, or returns None while no block is attached or it is stuck mid-write.
+        """
+        if self.state is None:
+            return None
+        try:
+            return self.state.read(channel)
+        except TimeoutError:
+            return None  # _follow() logs it
+
+    def _send(self, op: int, command_id: int = 0, payload: bytes = b'') -> int:
+        return self.connection.send(self.index, op, command_id, payload)
+
+    async def _request(self, op: int, command_id: int = 0, payload: bytes = b'') -> bytes:
+        return await self.connection.request(self.index, op, command_id, payload)
+
+    async def _follow(self):
+        state = None
+        while True:
+            if self.generation != self.connection.generation and self.connection.connected:
+                self._attach()
+            if self.state is not state:
+                state = self.state
+                index = state.indices['position']
+                count = 0
+                stuck = False
+            if state is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                values = state.snapshot()
+            except TimeoutError as e:
+                if not stuck:
+                    logging.warning("%s; reporting the device as disconnected", e)
+                    stuck = True
+                await asyncio.sleep(self.poll_interval)
+                continue
+            stuck = False
+            if values[index] != count:
+                count = values[index]
+                self.received_at = time.perf_counter() - max(0.0, time.time() - values[index + 1])
+                position = {'azimuth': _number(values[index + 2]), 'elevation': _number(values[index + 3])}
+                self.estimator.update(position['azimuth'], position['elevation'], self.received_at)
+                for listener in self.position_listeners:
+                    try:
+                        listener(position)
+                    except Exception as e:
+                        logging.exception("Error in position listener: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def send_command(self, command_id: int, payload: bytes = b'') -> int:
+        """
+        Sends a command through the owner and waits for its ACK. Returns the number of transmissions.
+        """
+        return ATTEMPTS.unpack(await self._request(OP_COMMAND, command_id, payload))[0]
+
+    async def send_batch(self, commands) -> list:
+        """
+        Sends a batch through the owner and returns the firmware's result code per command.
+        """
+        return list(await self._request(OP_BATCH, payload=encode_batch(commands)))
+
+    def post_command(self, command_id: int, payload: bytes = b''):
+        """
+        Sends a command through the owner without waiting for its ACK.
+
+        Failures are logged instead of being raised to the caller.
+        """
+        try:
+            self._send(OP_POST, command_id, payload)
+        except ConnectionError as e:
+            logging.error("Background command failed: %s", e)
+
+    def update_setpoint(self, command_id: int, payload: bytes):
+        self._send(OP_SETPOINT, command_id, payload)
+
+    async def request_status(self, timeout: float = 1.0):
+        """
+        See AsyncUARTCommunication.request_status; concurrent requests of all workers share one round trip.
+        """
+        reply = json.loads(await self._request(OP_STATUS, payload=json.dumps({'timeout': timeout}).encode()))
+        return reply['status'], reply['latency']
+
+    def status_age(self):
+        status = self._read('status')
+        return time.time() - status['time'] if status and status['count'] else None
+
+    async def query_history(self, channel: str, start: float, end: float, points: int, method: str = 'minmax') -> dict:
+        query = {'channel': channel, 'start': start, 'end': end, 'points': points, 'method': method}
+        return json.loads(await self._request(OP_HISTORY, payload=json.dumps(query).encode()))
+
+    async def collect_metrics(self) -> list:
+        return json.loads(await self._request(OP_METRICS))
+
+    def get_telemetry(self):
+        channels = self._read()
+        if channels is None:
+            return {}
+        return {name: {field: _number(values[field]) for field in self.state.channels[name]}
+                for name, values in channels.items() if name not in (LINK_CHANNEL, 'position') and values['count']}
+
+    def get_current_position(self):
+        """
+        See AsyncUARTCommunication.get_current_position.
+        """
+        if not self.estimator.initialized:
+            return self.get_reported_position()
+        estimate = self.estimator.estimate(time.perf_counter())
+        return {'azimuth': estimate['azimuth'], 'elevation': estimate['elevation']}
+
+    def get_reported_position(self):
+        position = self._read('position')
+        if position is None:
+            return None
+        return {'azimuth': _number(position['azimuth']), 'elevation': _number(position['elevation'])}
+
+    def get_position_estimate(self):
+        return self.estimator.estimate(time.perf_counter()) if self.estimator.initialized else None
+
+    def add_position_listener(self, listener):
+        self.position_listeners.append(listener)
+
+
+class RemoteSetpoints:
+    """
+    SetpointStreamer stand-in for workers.
+
+    Changed setpoints are forwarded to the owner's streamer, which
+    coalesces the updates of all workers and sends them at its rate.
+    """
+    def __init__(self, proxy: UARTProxy):
+        self.proxy = proxy
+        self.setpoints = {}  # command_id -> last payload forwarded
+
+    def update(self, command_id: int, payload: bytes):
+        if self.setpoints.get(command_id) == payload:
+            return
+        try:
+            self.proxy.update_setpoint(command_id, payload)
+        except ConnectionError as e:
+            logging.error("Failed to forward setpoint %#04x: %s", command_id, e)
+            return
+        self.setpoints[command_id] = payload
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+async def serve(socket_path: str = None, ready=None):
+    """
+    Runs a UARTOwner until SIGTERM or SIGINT; sets `ready` once it accepts connections.
+    """
+    owner = UARTOwner(socket_path)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await owner.start()
+        if ready is not None:
+            ready.set()
+        await stop.wait()
+    finally:
+        await owner.close()
+
+
+def run(socket_path: str = None, ready=None):
+    """
+    Process entry point: loads the configuration, sets up logging and runs serve() on uvloop if it is installed.
+    """
+    from utils import load_config, setup_logging
+    load_config()
+    setup_logging()
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    asyncio.run(serve(socket_path, ready))
+
+
+def start_owner_process(socket_path: str = None, timeout: float = 10.0):
+    """
+    Starts the owner in a separate process and waits until it serves.
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    process = context.Process(target=run, args=(socket_path, ready), name="uart-owner")
+    process.start()
+    if not ready.wait(timeout):
+        process.terminate()
+        raise RuntimeError("UART owner did not start")
+    return process
+
+
+if __name__ == "__main__":
+    run()
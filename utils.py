@@ -6,16 +6,64 @@ Description: Utility functions.
 """
 
 
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+from dotenv import load_dotenv
 
-def setup_logging():
+_listener = None
+_config_loaded = False
+
+
+def load_config():
+    """
+    Loads .env into the environment once per process, for entry points.
+
+    Variables already set in the environment take precedence. Library
+    modules only read the environment when they are used, so importing
+    them has no side effects.
+    """
+    global _config_loaded
+    if not _config_loaded:
+        load_dotenv()
+        _config_loaded = True
+
+
+def setup_logging(level=None):
     """
     Sets up logging configurations.
+
+    Records are handed to a QueueHandler and written by a QueueListener
+    thread, so the UART read and retransmission threads never block on
+    console I/O. The level comes from LOG_LEVEL (default INFO). Calling it
+    again only updates the level. Returns the listener.
     """
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    global _listener
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
     logging.debug("Logging configured.")
     logging.info("Starting application.")
+    return _listener
+
+
+def stop_logging():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+File: ws_protocol.py
+Author: Jan Kühnemund
+Description: Binary WebSocket subprotocol for position updates and gamepad frames.
+
+Clients that offer SUBPROTOCOL in Sec-WebSocket-Protocol get fixed-layout,
+little-endian struct frames; all others keep the JSON messages.
+
+    position (server -> client): type, azimuth f32, elevation f32, time f64 (epoch s)
+    gamepad  (client -> server): type, button bitmask u32, MAX_AXES axes i16 (-32767..32767)
+"""
+
+import struct
+
+SUBPROTOCOL = 'groundstation.bin.v1'
+POSITION_FRAME_TYPE = 0x01
+GAMEPAD_FRAME_TYPE = 0x02
+MAX_AXES = 8
+MAX_BUTTONS = 32
+AXIS_SCALE = 32767
+
+POSITION_FRAME = struct.Struct('<Bffd')
+GAMEPAD_FRAME = struct.Struct(f'<BI{MAX_AXES}h')
+
+
+def encode_position(azimuth: float, elevation: float, timestamp: float) -> bytes:
+    return POSITION_FRAME.pack(POSITION_FRAME_TYPE, azimuth, elevation, timestamp)
+
+
+def encode_gamepad(buttons: int, axes) -> bytes:
+    """
+    Packs a button bitmask and up to MAX_AXES normalized axis values (-1..1).
+    """
+    raw = [round(max(-1.0, min(1.0, value)) * AXIS_SCALE) for value in axes[:MAX_AXES]]
+    raw += [0] * (MAX_AXES - len(raw))
+    return GAMEPAD_FRAME.pack(GAMEPAD_FRAME_TYPE, buttons, *raw)
+
+
+def decode_gamepad(data: bytes):
+    """
+    Returns (buttons, axes) of a gamepad frame, axes as raw int16 values.
+
+    Raises ValueError for frames of the wrong type or size.
+    """
+    if len(data) != GAMEPAD_FRAME.size or data[0] != GAMEPAD_FRAME_TYPE:
+        raise ValueError("Not a gamepad frame")
+    values = GAMEPAD_FRAME.unpack(data)
+    return values[1], values[2:]